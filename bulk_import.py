@@ -0,0 +1,282 @@
+## Import assets in bulk from a CSV or JSONL manifest.
+#
+#  Usage: python3 bulk_import.py -c /etc/sspad.conf --auth 'Basic ...'
+#      --checkpoint import.ckpt [--workers 4] [--rate-limit lake=20] manifest.csv
+#
+#  Each manifest row describes one asset:
+#
+#  - type: 'si' (still image) or 'tx' (text).
+#  - mid: Mid-prefix of the UID.
+#  - props: Properties, as in the 'props' parameter of AssetCtrl::POST().
+#  - Datastreams: in JSONL, a 'dstreams' object; in CSV, all other
+#    columns. Names are datastream names and values are file paths on the
+#    ingest host, or URLs for names prefixed with 'ref_', e.g.
+#    'original' or 'ref_original'.
+#
+#  In CSV, 'props' holds a JSON object.
+#
+#  The checkpoint file records the UID minted for each row before the asset
+#  is created, and the outcome of each row. If the same checkpoint file is
+#  passed again, rows already imported are skipped, and rows which were
+#  interrupted are imported with the UID minted for them, unless an asset
+#  with that UID was created in the meantime.
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+
+from multiprocessing import Pool
+
+import cherrypy
+
+from sspad.config.datasources import datagrinder_rest_api, lake_rest_api, \
+        tstore_rest_api
+from sspad.models.static_image import StaticImage
+from sspad.models.text import Text
+from sspad.modules.file_io import LocalFile
+from sspad.modules.rate_limit import RateLimiter
+from sspad.modules.request_context import request_context
+
+
+## Models which can be imported, keyed by the manifest type.
+models = {
+    'si' : StaticImage,
+    'tx' : Text,
+}
+
+## Upstream services which can be rate-limited.
+upstreams = {
+    'lake' : lake_rest_api['base_url'],
+    'tstore' : tstore_rest_api['base_url'],
+    'datagrinder' : datagrinder_rest_api['base_url'],
+}
+
+# Worker process state.
+_auth = None
+_ckpt_fd = None
+
+
+def read_manifest(path):
+    '''Read manifest rows.
+
+    @param path (string) Manifest path. Files ending in '.csv' are read as
+        CSV, all others as JSONL.
+
+    @return (generator) Row numbers and row dicts with 'type', 'mid',
+        'props' and 'dstreams' keys.
+    '''
+
+    with open(path, newline='') as fh:
+        if path.endswith('.csv'):
+            for i, rec in enumerate(csv.DictReader(fh)):
+                yield i, {
+                    'type' : rec.pop('type'),
+                    'mid' : rec.pop('mid', ''),
+                    'props' : json.loads(rec.pop('props', '') or '{}'),
+                    'dstreams' : {k : v for k, v in rec.items() if v},
+                }
+        else:
+            for i, line in enumerate(fh):
+                if line.strip():
+                    rec = json.loads(line)
+                    rec.setdefault('mid', '')
+                    rec.setdefault('props', {})
+                    rec.setdefault('dstreams', {})
+                    yield i, rec
+
+
+
+def read_checkpoint(path):
+    '''Read the last recorded state of each row.
+
+    @param path (string) Checkpoint file path.
+
+    @return (dict) Last checkpoint record keyed by row number.
+    '''
+
+    state = {}
+    if os.path.exists(path):
+        with open(path) as fh:
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # Last line of an interrupted run may be truncated.
+                    continue
+                # Keep the UID of a row once it is minted.
+                if 'uid' not in rec and rec['row'] in state:
+                    rec['uid'] = state[rec['row']].get('uid')
+                state[rec['row']] = rec
+
+    return state
+
+
+
+def record(**rec):
+    '''Append a record to the checkpoint file.
+
+    Records are written with a single append, so that records of
+    concurrent workers are not interleaved.
+    '''
+
+    os.write(_ckpt_fd, (json.dumps(rec) + '\n').encode('utf-8'))
+
+
+
+def init_worker(auth, checkpoint, rates):
+    '''Set up a worker process.
+
+    @param auth (string) Authorization header for upstream services.
+    @param checkpoint (string) Checkpoint file path.
+    @param rates (dict) Requests per second per upstream base URL, for this
+        process.
+    '''
+
+    global _auth, _ckpt_fd
+    _auth = auth
+    _ckpt_fd = os.open(checkpoint, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    cherrypy.log.screen = False
+    for base_url, rate in rates.items():
+        RateLimiter.configure(base_url, rate)
+
+
+
+def import_row(task):
+    '''Import one manifest row.
+
+    @param task (tuple) Row number, row dict and UID minted in a previous
+        run, if any.
+
+    @return (tuple) Row number and error message, or None on success.
+    '''
+
+    i, row, uid = task
+    files = []
+    try:
+        with request_context({'Authorization' : _auth}):
+            model = models[row['type']]()
+            if uid and model.set_uri(uid=uid):
+                # Created by a previous run before its outcome was recorded.
+                record(row=i, status='done', uid=uid, uri=model.uri)
+                return i, None
+            if not uid:
+                uid = model.mint_uid(row['mid'])
+                record(row=i, status='minted', uid=uid)
+
+            dstreams = {}
+            for name, value in row['dstreams'].items():
+                if name.startswith('ref_'):
+                    dstreams[name] = value
+                else:
+                    dstreams[name] = LocalFile(value)
+                    files.append(dstreams[name])
+
+            model.create(row['mid'], model.convert_req_propnames(row['props']),
+                    uid=uid, **dstreams)
+        record(row=i, status='done', uid=uid, uri=model.uri)
+        return i, None
+    except Exception as e:
+        error = '{} {}'.format(e.code, e._message) \
+                if isinstance(e, cherrypy.HTTPError) else repr(e)
+        record(row=i, status='error', error=error)
+        return i, error
+    finally:
+        for f in files:
+            f.file.close()
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+            description = 'Import SSPAD assets in bulk from a CSV or JSONL manifest.')
+    parser.add_argument('-c', '--config', default='/etc/sspad.conf', help='Configuration file path.')
+    parser.add_argument('--auth', help='Authorization header for upstream services.')
+    parser.add_argument('--checkpoint', required=True,
+            help='Checkpoint file. Reuse it to resume an interrupted import.')
+    parser.add_argument('--workers', type=int, default=4, help='Number of worker processes.')
+    parser.add_argument('--rate-limit', action='append', default=[],
+            metavar='UPSTREAM=RATE',
+            help='Maximum requests per second to an upstream service ({}), '
+            'for the whole import. Can be repeated.'.format(', '.join(sorted(upstreams))))
+    parser.add_argument('--retry-errors', action='store_true',
+            help='Import again rows which failed in a previous run.')
+    parser.add_argument('--report-interval', type=float, default=10.0,
+            help='Seconds between progress reports.')
+    parser.add_argument('manifest', help='Manifest file (.csv or .jsonl).')
+    args = parser.parse_args()
+
+    rates = {}
+    for limit in args.rate_limit:
+        name, _, rate = limit.partition('=')
+        if name not in upstreams:
+            parser.error('Unknown upstream: {}.'.format(name))
+        # Each worker gets its share of the rate.
+        rates[upstreams[name]] = float(rate) / args.workers
+
+    cherrypy.log.screen = False
+    state = read_checkpoint(args.checkpoint)
+    skip = ('done', 'error') if not args.retry_errors else ('done',)
+
+    total = 0
+    todo = 0
+    for i, row in read_manifest(args.manifest):
+        total += 1
+        if state.get(i, {}).get('status') not in skip:
+            todo += 1
+    print('{} rows in manifest, {} to import.'.format(total, todo), file=sys.stderr)
+
+    # The pool reads tasks ahead in a separate thread. Bound the number of
+    # pending rows, so that the manifest is not loaded in memory at once.
+    pending = threading.BoundedSemaphore(args.workers * 16)
+    # Set on interruption, so that the task feeder thread does not block
+    # the pool termination.
+    stop = threading.Event()
+
+    def tasks():
+        for i, row in read_manifest(args.manifest):
+            if state.get(i, {}).get('status') not in skip:
+                while not pending.acquire(timeout=0.5):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                yield i, row, state.get(i, {}).get('uid')
+
+    done, failed = (0, 0)
+    start = last_report = time.time()
+    pool = Pool(args.workers, init_worker, (args.auth, args.checkpoint, rates))
+    try:
+        for i, error in pool.imap_unordered(import_row, tasks(), chunksize=4):
+            pending.release()
+            if error:
+                failed += 1
+                print('Row {} failed: {}'.format(i, error), file=sys.stderr)
+            else:
+                done += 1
+
+            now = time.time()
+            if now - last_report >= args.report_interval:
+                last_report = now
+                count = done + failed
+                rate = count / (now - start)
+                eta = (todo - count) / rate if rate else 0
+                print('{}/{} rows, {:.1f} rows/s, {:.2%} errors, ETA {}.'.format(
+                    count, todo, rate, failed / count,
+                    time.strftime('%H:%M:%S', time.gmtime(eta))
+                ), file=sys.stderr)
+        pool.close()
+    except KeyboardInterrupt:
+        stop.set()
+        pool.terminate()
+        parser.exit(130, 'Interrupted. Run again with the same checkpoint to resume.\n')
+    finally:
+        pool.join()
+
+    print('Import complete: {} imported, {} failed in {:.0f}s.'.format(
+            done, failed, time.time() - start), file=sys.stderr)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,62 @@
+## Export the metadata of all assets of a type.
+#
+#  Usage: python3 export.py -c /etc/sspad.conf --auth 'Basic ...' --type si
+#      [--format nt|jsonl] [--modified-since 2016-01-01T00:00:00Z]
+#      [-o export.nt.gz]
+
+import argparse
+import sys
+
+import cherrypy
+
+from sspad.config.local import export
+from sspad.controllers.export_ctrl import ExportCtrl
+from sspad.modules.file_io import gzip_iter
+from sspad.modules.request_context import request_context
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+            description = 'Export SSPAD asset metadata as N-Triples or JSONL.')
+    parser.add_argument('-c', '--config', default='/etc/sspad.conf', help='Configuration file path.')
+    parser.add_argument('--auth', help='Authorization header for the triplestore.')
+    parser.add_argument('--type', required=True, choices=sorted(ExportCtrl.export_models),
+            help='Asset type.')
+    parser.add_argument('--format', default='nt', choices=sorted(ExportCtrl.content_types),
+            help='Export format.')
+    parser.add_argument('--modified-since',
+            help='Only export assets modified at or after this ISO 8601 date/time.')
+    parser.add_argument('-o', '--output', default='-',
+            help='Output file. Compressed with gzip if it ends in .gz. Default: stdout.')
+    parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip.')
+    args = parser.parse_args()
+
+    cherrypy.log.screen = False
+
+    out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    count = 0
+    try:
+        with request_context({'Authorization' : args.auth}):
+            lines = ExportCtrl.export_models[args.type]().export(
+                    args.format, args.modified_since, export['page_size'])
+
+            def counted(lines):
+                global count
+                for line in lines:
+                    count += 1
+                    if not count % 1000:
+                        print('{} assets exported.'.format(count), file=sys.stderr)
+                    yield line
+
+            chunks = counted(lines)
+            if args.gzip or args.output.endswith('.gz'):
+                chunks = gzip_iter(chunks, export['gzip_level'])
+            for chunk in chunks:
+                out.write(chunk)
+    except ValueError as e:
+        parser.exit(1, '{}\n'.format(e))
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+    print('Export complete: {} assets.'.format(count), file=sys.stderr)
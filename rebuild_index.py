@@ -0,0 +1,41 @@
+## Rebuild the local identifier index from the triplestore.
+#
+#  Usage: python3 rebuild_index.py -c /etc/sspad.conf --auth 'Basic ...' [--clear]
+
+import argparse
+
+import cherrypy
+
+from sspad.config.local import id_index
+from sspad.models.asset import Asset
+from sspad.modules.id_index import get_index
+from sspad.modules.request_context import request_context
+from sspad.resources.rdf_lexicon import ns_collection as nsc
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+            description = 'Rebuild the SSPAD identifier index from the triplestore.')
+    parser.add_argument('-c', '--config', default='/etc/sspad.conf', help='Configuration file path.')
+    parser.add_argument('--auth', help='Authorization header for the triplestore.')
+    parser.add_argument('--clear', action='store_true',
+            help='Remove indexed identifiers of nodes which no longer exist.')
+    args = parser.parse_args()
+
+    if not id_index['enabled']:
+        parser.exit(1, 'The identifier index is not enabled in the configuration.\n')
+
+    cherrypy.log.screen = True
+    index = get_index()
+
+    with request_context({'Authorization' : args.auth}):
+        asset = Asset()
+        index.rebuild(asset.tsconn, nsc['aic'].uid, clear=args.clear)
+        index.rebuild(asset.tsconn, nsc['aic'].legacyUid, clear=args.clear)
+
+        # CITI primary keys are unique within a node type.
+        for scope, prop in {(r['type'], r['uid']) \
+                for r in asset.special_rels.values()}:
+            index.rebuild(asset.tsconn, prop, scope=scope, clear=args.clear)
+
+    print('Index rebuilt: {}'.format(index.stats()))
@@ -4,9 +4,15 @@ from cherrypy.process.plugins import Daemonizer, PIDFile
 
 from sspad.config import server, app
 from sspad.config.host import host
-from sspad.controllers import comment_ctrl, search_ctrl, \
-        static_image_ctrl, tag_cat_ctrl, tag_ctrl, text_ctrl
+from sspad.config.local import job_queue, legacy_uid_filter, watch_folder
+from sspad.controllers import comment_ctrl, export_ctrl, job_ctrl, \
+        metrics_ctrl, search_ctrl, static_image_ctrl, tag_cat_ctrl, tag_ctrl, \
+        text_ctrl
+from sspad.modules.bloom import LegacyUidFilterPlugin
+from sspad.modules.derivative_cache import get_cache
+from sspad.modules.job_queue import JobWorkerPool, get_queue
 from sspad.modules.negotiable import Negotiable
+from sspad.modules.watch_folder import WatchFolder
 from sspad.resources.rdf_lexicon import ns_collection as nsc
 
 
@@ -20,6 +26,9 @@ class Webapp(Negotiable):
 
     routes = {
         'comment' : comment_ctrl.CommentCtrl,
+        'export' : export_ctrl.ExportCtrl,
+        'job' : job_ctrl.JobCtrl,
+        'metrics' : metrics_ctrl.MetricsCtrl,
         'search' : search_ctrl.SearchCtrl,
         'si' : static_image_ctrl.StaticImageCtrl,
         'tag' : tag_ctrl.TagCtrl,
@@ -61,6 +70,24 @@ if __name__ == '__main__':
     Daemonizer(cherrypy.engine).subscribe()
     PIDFile(cherrypy.engine, host['pidfile']).subscribe()
 
+    # Set up local caches before accepting requests.
+    get_cache()
+
+    if job_queue['enabled']:
+        JobWorkerPool(
+            cherrypy.engine, get_queue(),
+            job_queue['workers'], job_queue['poll_interval']
+        ).subscribe()
+
+    if legacy_uid_filter['enabled']:
+        LegacyUidFilterPlugin(
+            cherrypy.engine, legacy_uid_filter['refresh_interval'],
+            legacy_uid_filter['auth']
+        ).subscribe()
+
+    if watch_folder['enabled']:
+        WatchFolder(cherrypy.engine, watch_folder).subscribe()
+
     # Set routes as class members as expected by Cherrypy
     for r in Webapp.routes:
         setattr(Webapp, r, Webapp.routes[r]())
@@ -1,11 +1,42 @@
 import cherrypy
+
+# Register custom tools.
+import sspad.modules.admission
+import sspad.modules.conditional
+
 rest_conf = {
     '/': {
         #'tools.json_out.on': True,
         'request.dispatch': cherrypy.dispatch.MethodDispatcher(),
         'request.methods_with_bodies': ('POST', 'PUT', 'PATCH'),
         'tools.encode.on': True,
-        'tools.encode.encoding': 'utf-8'
+        'tools.encode.encoding': 'utf-8',
+        # Resource documentation only changes on deployment.
+        'tools.conditional.on': True,
+        'tools.conditional.methods': ('OPTIONS',),
+        'tools.conditional.cache_control': 'public, max-age=3600',
+    },
+    # Tag lists and search terms are validated against the content version.
+    '/tag': {
+        'tools.conditional.methods': ('GET', 'OPTIONS'),
+        'tools.conditional.cache_control': 'private, max-age=60',
+    },
+    '/tagCat': {
+        'tools.conditional.methods': ('GET', 'OPTIONS'),
+        'tools.conditional.cache_control': 'private, max-age=300',
+    },
+    '/search': {
+        'tools.conditional.methods': ('GET',),
+        'tools.conditional.params': {'result' : 'terms'},
+        'tools.conditional.cache_control': 'private, max-age=300',
+    },
+    # Asset ingestion is subject to memory admission control.
+    '/si': {
+        'tools.admission.on': True,
+        'tools.admission_image.on': True,
+    },
+    '/tx': {
+        'tools.admission.on': True,
+        'tools.admission_image.on': True,
     },
 }
-
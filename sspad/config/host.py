@@ -5,7 +5,8 @@ import configparser
 
 parser = argparse.ArgumentParser(description = 'SSPAD - Shared Service Provider for the AIC DAMS')
 parser.add_argument('-c', '--config', default='/etc/sspad.conf', help='Configuration file path.')
-args = parser.parse_args()
+# Command line tools add their own arguments, which are ignored here.
+args, _ = parser.parse_known_args()
 #print('Args: {}'.format(args))
 config_file = args.config
 
@@ -24,3 +25,30 @@ host = {
 app_path = sys.argv[0]
 
 
+
+def get_section(name, defaults):
+    '''Read an optional config section and merge it with default values.
+
+    Values found in the config file are cast to the type of the
+    corresponding default value. Keys not present in @p defaults are
+    passed through as strings.
+
+    @param name (string) Section name.
+    @param defaults (dict) Default values.
+
+    @return dict
+    '''
+
+    ret = dict(defaults)
+    if not config.has_section(name):
+        return ret
+
+    for k, v in config[name].items():
+        if k in defaults and isinstance(defaults[k], bool):
+            ret[k] = config[name].getboolean(k)
+        elif k in defaults and defaults[k] is not None:
+            ret[k] = type(defaults[k])(v)
+        else:
+            ret[k] = v
+
+    return ret
@@ -0,0 +1,213 @@
+## Config file for services run locally by SSPAD: queues, caches and indices.
+#
+#  This file is under source control. DO NOT PUT ANY HOST-SPECIFIC AND LESS THAN EVER SENSITIVE DATA HERE!
+#  All host-dependent settings should be imported from host.conf.
+
+from sspad.config.host import get_section
+
+
+## Asynchronous ingest job queue.
+#
+#  When enabled, Asset POST and PUT requests carrying a
+#  'Prefer: respond-async' header are spooled and processed by a pool of
+#  background workers.
+job_queue = get_section('job_queue', {
+    'enabled' : False,
+    'db_path' : '/var/lib/sspad/jobs.sqlite',
+    'spool_dir' : '/var/lib/sspad/spool',
+    'workers' : 4,
+    'poll_interval' : 1.0,
+})
+
+
+## Rendition profile for generated derivatives.
+#
+#  Keys are instance names, values are the maximum width and height in
+#  pixels. The 'master' rendition is always generated; smaller ones are
+#  derived from it by successive downscaling.
+renditions = {k : int(v) for k, v in \
+        get_section('renditions', {'master' : 4096}).items()}
+
+
+## Instance ingestion.
+ingest = get_section('ingest', {
+    'workers' : 4,
+})
+
+
+## Disk cache of generated derivatives.
+#
+#  Derivatives are keyed by the digest of the source datastream and the
+#  target geometry and format. Least recently used entries are evicted
+#  once the total size exceeds max_size (in bytes).
+derivative_cache = get_section('derivative_cache', {
+    'enabled' : False,
+    'cache_dir' : '/var/cache/sspad/derivatives',
+    'max_size' : 10 * 1024**3,
+})
+
+
+## Memory-budget admission control for requests with bodies.
+#
+#  The memory cost of a request is estimated as its Content-Length times
+#  body_factor, plus the decoded size of the largest rendition. Once the
+#  budget is used up, requests wait up to 'timeout' seconds and are then
+#  rejected with 503 Service Unavailable.
+admission = get_section('admission', {
+    'enabled' : False,
+    'budget' : 4 * 1024**3,
+    'body_factor' : 3.0,
+    'timeout' : 30.0,
+    'retry_after' : 60,
+})
+
+
+## Node existence cache.
+#
+#  Existence of LAKE nodes is cached for the duration of a request or
+#  transaction. Existence of external references (ref_* datastreams) is
+#  cached process-wide for ref_ttl seconds.
+node_cache = get_section('node_cache', {
+    'ref_ttl' : 60.0,
+    'ref_max_entries' : 10000,
+})
+
+
+## Cache of external identifiers (e.g. CITI primary keys) resolved to node URIs.
+rel_cache = get_section('rel_cache', {
+    'ttl' : 3600.0,
+    'max_entries' : 100000,
+    'batch_size' : 500,
+})
+
+
+## Local identifier index.
+#
+#  Maps aic:uid, aic:legacyUid and CITI primary keys to node URIs. It is
+#  written through on every asset creation and consulted before the
+#  triplestore. Rebuild it from the triplestore with rebuild_index.py.
+id_index = get_section('id_index', {
+    'enabled' : False,
+    'db_path' : '/var/lib/sspad/id_index.sqlite',
+})
+
+
+## In-memory Bloom filter of all legacy UIDs.
+#
+#  Used to skip the triplestore duplicate check for legacy UIDs which are
+#  certainly new, e.g. during bulk loads. The filter is built when the
+#  server starts and rebuilt every refresh_interval seconds, using 'auth'
+#  as the Authorization header for the triplestore query. It is sized for
+#  'capacity' items at the given false positive rate.
+legacy_uid_filter = get_section('legacy_uid_filter', {
+    'enabled' : False,
+    'capacity' : 1000000,
+    'error_rate' : 0.001,
+    'refresh_interval' : 3600.0,
+    'auth' : '',
+})
+
+
+## Ingest of files on the ingest host.
+#
+#  Datastreams can be given as path_<name> parameters pointing to files
+#  under one of the comma-separated mount points, e.g. shared NAS volumes.
+#  Such files are memory-mapped and sent without being uploaded.
+path_ingest = get_section('path_ingest', {
+    'enabled' : False,
+    'mounts' : '',
+})
+
+
+## Watch-folder ingest.
+#
+#  Files dropped in the comma-separated 'dirs' are ingested as new assets
+#  of type 'model' once they have not changed for settle_time seconds.
+#  Asset properties are read from sidecar JSON files. Processed files are
+#  moved to the done_dir or error_dir subdirectories of their directory.
+#  Failed ingests are retried up to 'retries' times, waiting retry_delay
+#  seconds, doubled at each attempt.
+watch_folder = get_section('watch_folder', {
+    'enabled' : False,
+    'dirs' : '',
+    'model' : 'sspad.models.static_image.StaticImage',
+    'mid' : '',
+    'auth' : '',
+    'workers' : 4,
+    'settle_time' : 5.0,
+    'poll_interval' : 2.0,
+    'rescan_interval' : 60.0,
+    'retries' : 3,
+    'retry_delay' : 10.0,
+    'done_dir' : 'done',
+    'error_dir' : 'error',
+})
+
+
+## Cache of resource documents returned by GET requests.
+#
+#  Documents are invalidated by writes made through SSPAD. Since the
+#  triplestore is updated asynchronously, documents are not cached for
+#  settle_time seconds after they are invalidated, and ttl should stay short.
+doc_cache = get_section('doc_cache', {
+    'enabled' : False,
+    'ttl' : 30.0,
+    'max_entries' : 10000,
+    'settle_time' : 10.0,
+})
+
+
+## CONSTRUCT queries.
+#
+#  Results larger than max_triples are not read to the end.
+construct = get_section('construct', {
+    'max_triples' : 1000000,
+})
+
+
+## Conditional requests for read endpoints.
+#
+#  Validators are derived from a content version bumped by each write.
+#  For settle_time seconds after a write, responses are not cached, to
+#  leave time for the triplestore to index it.
+conditional = get_section('conditional', {
+    'settle_time' : 10.0,
+})
+
+
+## Cache of search facet counts.
+#
+#  Entries are also dropped when the content version changes.
+facet_cache = get_section('facet_cache', {
+    'ttl' : 60.0,
+    'max_entries' : 1000,
+})
+
+
+## Bulk metadata export.
+#
+#  Assets are read from the triplestore page_size at a time. Gzip-encoded
+#  output is compressed at gzip_level.
+export = get_section('export', {
+    'page_size' : 500,
+    'gzip_level' : 6,
+})
+
+
+## Group commit of small LAKE writes.
+#
+#  Property updates and comments submitted with the same credentials within
+#  window seconds are applied in one transaction of up to max_batch writes.
+write_batcher = get_section('write_batcher', {
+    'enabled' : False,
+    'window' : 0.005,
+    'max_batch' : 50,
+})
+
+
+## Node deletion.
+#
+#  Up to 'workers' nodes are deleted concurrently.
+node_delete = get_section('node_delete', {
+    'workers' : 8,
+})
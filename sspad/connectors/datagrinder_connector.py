@@ -2,6 +2,8 @@ import cherrypy, io
 
 from sspad.config.datasources import datagrinder_rest_api
 from sspad.connectors.http_connector import HttpConnector
+from sspad.modules.derivative_cache import DerivativeCache, get_cache
+from sspad.modules.file_io import MultipartBody, file_view
 
 
 class DatagrinderConnector(HttpConnector):
@@ -74,25 +76,44 @@ class DatagrinderConnector(HttpConnector):
     def resizeImageFromData(self, image, fname, w=0, h=0):
         '''Resizes an image downloaded from a provided datastream.
 
-        @param image (BytesIO) Image datastream.
+        If the derivative cache is enabled, a derivative previously
+        generated from identical data with the same geometry is returned
+        without calling Datagrinder.
+
+        @param image (file-like) Image datastream.
+        @param fname (string) File name sent to Datagrinder.
         @param w (int) Maximum width in pixels.
         @param h (int) Maximum height in pixels.
 
         @return BytesIO The resized image stream.
         '''
 
-        data = {'width': w, 'height': h}
-        files = {'file': (fname, image)}
-
-        res = self.request('post',
-            self._base_url + '/resize.jpg',
-            files = files,
-            data = data
-        )
+        cache = get_cache()
+        if cache:
+            key = DerivativeCache.key(DerivativeCache.digest(image), w, h, 'jpg')
+            cached = cache.get(key)
+            if cached is not None:
+                cherrypy.log('Image resize: cache hit for {}.'.format(key))
+                return io.BytesIO(cached)
+
+        # The image is memory-mapped if possible and sent without copying.
+        with file_view(image) as content:
+            body = MultipartBody(
+                fields = {'width': w, 'height': h},
+                files = {'file': (fname, content, None)}
+            )
+            res = self.request('post',
+                self._base_url + '/resize.jpg',
+                data = body,
+                headers = {'Content-Type': body.content_type}
+            )
 
         cherrypy.log('Image resize response: ' + str(res.status_code))
         res.raise_for_status()
         #print('Returned image:', res.content[:256])
+        if cache:
+            cache.put(key, res.content)
+
         return io.BytesIO(res.content)
 
 
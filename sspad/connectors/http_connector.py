@@ -1,6 +1,9 @@
 import cherrypy
 import requests
 
+from sspad.modules.rate_limit import RateLimiter
+
+
 class HttpConnector:
 
     def request(self, method, url, **kwargs):
@@ -11,10 +14,14 @@ class HttpConnector:
         @param url (string) URL to be requested.
         @param **kwargs Further arguments to be passed to the requests::request() method.
 
+        Requests to rate-limited services wait for their turn.
+        @sa RateLimiter
+
         @return requests.Response
         @throw HTTPError if response code is > 399.
         '''
 
+        RateLimiter.acquire(url)
         cherrypy.log('HttpConnector: {} {}'.format(method.upper(), url))
 
         ret = requests.request(method.lower(), url, **kwargs)
@@ -1,16 +1,22 @@
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from itertools import chain
 
 from os.path import basename
 
 import cherrypy
 
-from rdflib import Graph, URIRef, Literal
-from rdflib.plugins.sparql.processor import prepareQuery
+from rdflib import URIRef, Literal
 
 from sspad.config.datasources import lake_rest_api
+from sspad.config.local import node_delete
 from sspad.connectors.http_connector import HttpConnector
-from sspad.resources.rdf_lexicon import ns_collection, ns_mgr
+from sspad.modules.conditional import ContentVersion
+from sspad.modules.doc_cache import DocCache
+from sspad.modules.file_io import buffer_digest, file_view
+from sspad.modules.node_cache import NodeCache
+from sspad.modules.rdf_writer import sparql_update_body, turtle_body
+from sspad.resources.rdf_lexicon import ns_collection
 
 class LakeConnector(HttpConnector):
     '''@package sspad.connectors
@@ -48,6 +54,9 @@ class LakeConnector(HttpConnector):
     def assert_node_exists(self, uri):
         '''Check if a node exists already.
 
+        The result is cached for the current request or transaction.
+        @sa NodeCache
+
         @param uri (string) URI to check.
 
         @return (boolean) Whether node exists.
@@ -56,14 +65,24 @@ class LakeConnector(HttpConnector):
         error than 404)
         '''
 
+        exists = NodeCache.get(uri)
+        if exists is not None:
+            cherrypy.log('Node existence cache hit for {}: {}'.format(uri, exists))
+            return exists
+
         try:
-            res = self.request('head', uri, headers=self.headers)
+            self.request('head', uri, headers=self.headers)
+            exists = True
         except requests.exceptions.HTTPError as e:
-            if str(e)[:3] == '404':
-                return False
+            if e.response is not None and e.response.status_code == 404:
+                exists = False
             else:
                 raise
 
+        NodeCache.set(uri, exists)
+
+        return exists
+
 
 
     def open_transaction(self):
@@ -106,12 +125,8 @@ class LakeConnector(HttpConnector):
         @return (string) New node URI.
         '''
         if props:
-            g = Graph(namespace_manager = ns_mgr)
             cherrypy.log('Received prop tuples: {}'.format(props))
-            for t in props['tuples'][1]:
-                g.add((URIRef(''), t[0], t[1]))
-
-            body = g.serialize(format='turtle')
+            body = turtle_body(props['tuples'][1]).encode('utf-8')
         else:
             body = ''
 
@@ -137,54 +152,74 @@ class LakeConnector(HttpConnector):
             cherrypy.log('HTTP Error: {}'.format(res.text))
         res.raise_for_status()
 
+        NodeCache.set(res.headers['location'])
+        DocCache.invalidate(res.headers['location'])
+        ContentVersion.bump()
+
         return res.headers['location']
 
 
 
     def create_or_update_datastream(
             self, uri, file_name, ds=None, path=None,
-            mimetype='application/octet-stream'):
+            mimetype='application/octet-stream', digest=None):
         '''Create a datastream under an existing container
             node if it does not exist, or update it if it exists already.
 
         @param uri (string) URI of the datastream node to be created or updated.
         @param file_name (string) Name of the datastream as a downloaded file.
-        @param ds (BytesIO, optional) Datastream to be ingested.
+        @param ds (file-like, optional) Datastream to be ingested.
             Alternative to \p path.
-        @param path (string, optional) Path to the datastream.
+        @param path (string, optional) Path to the datastream on the local
+            filesystem.
             Alternative to \p ds.
         @param mimetype (string, optional) MIME type of the datastream.
             Default: application/octet-stream
+        @param digest (string, optional) Hexadecimal SHA-1 digest of the
+            datastream, if already known. It is sent in the Digest header,
+            so that LAKE rejects content corrupted in transfer. If not
+            given, it is computed from the datastream.
 
         @return (string | None) New node URI if a new node is created.
         '''
 
-        # @TODO Optimize with with
         if not ds and not path:
             raise cherrypy.HTTPError(
                 '500 Internal Server Error', "No datastream or file path given."
             )
 
         data = ds or open(path, 'rb')
-        #cherrypy.log('Data peek: {}'.format(data))
 
         cherrypy.log('Ingesting datastream from class type: {}'\
                 .format(data.__class__.__name__))
-        res = self.request('put',
-            uri,
-            data = data.read(),
-            headers = dict(chain(
-                self.headers.items(),
-                [
-                    ('content-disposition', 'inline; filename="' + file_name + '"'),
-                    ('content-type', mimetype),
-                ]
-            ))
-        )
+        # Files are memory-mapped and sent without being read into memory.
+        try:
+            with file_view(data) as body:
+                if not digest:
+                    digest = buffer_digest(body, 'sha1')
+                res = self.request('put',
+                    uri,
+                    data = body,
+                    headers = dict(chain(
+                        self.headers.items(),
+                        [
+                            ('content-disposition', 'inline; filename="' + file_name + '"'),
+                            ('content-type', mimetype),
+                            ('digest', 'sha1=' + digest),
+                        ]
+                    ))
+                )
+        finally:
+            if not ds:
+                data.close()
         #cherrypy.log('Request headers: {}'.format(res.request.headers))
         #cherrypy.log('Response headers: {}'.format(res.headers))
         res.raise_for_status()
 
+        NodeCache.set(uri)
+        DocCache.invalidate(uri)
+        ContentVersion.bump()
+
         if 'location' in res.headers:
             return res.headers['location']
 
@@ -200,9 +235,11 @@ class LakeConnector(HttpConnector):
         '''
 
         cherrypy.log('Creating an externally referenced node: ' + uri)
-        # Check that external reference exists
-        check = self.request('head',ref, headers=self.headers)
-        check.raise_for_status()
+        # Check that external reference exists, unless it was checked recently.
+        if not NodeCache.refs.get(ref):
+            check = self.request('head',ref, headers=self.headers)
+            check.raise_for_status()
+            NodeCache.refs.set(ref, True)
 
         res = self.request('put',
             uri,
@@ -213,6 +250,10 @@ class LakeConnector(HttpConnector):
         )
         res.raise_for_status()
 
+        NodeCache.set(uri)
+        DocCache.invalidate(uri)
+        ContentVersion.bump()
+
         #cherrypy.log('Create/update datastream response:' + str(res.status_code))
 
         if 'location' in res.headers:
@@ -244,22 +285,7 @@ class LakeConnector(HttpConnector):
         cherrypy.log("URI: {}\nDelete props: {}\nInsert props: {}\nwhere props: {}".format(
             uri, delete_props, insert_props, where_props
         ))
-        insert_triples, delete_triples = ('','')
-        where_triples_list = [];
-
-        for d in delete_props:
-            delete_triples += '\n\t<> {} {} .'.format(d[0].n3(), d[1].n3())
-
-        for i in insert_props:
-            insert_triples += '\n\t<> {} {} .'.format(i[0].n3(), i[1].n3())
-
-        for w in where_props:
-            where_triples_list.append('\n\t{{<> {} {}}}'.\
-                    format(w[0].n3(), w[1].n3()))
-        where_triples = '\n\tUNION'.join(where_triples_list)
-
-        body = 'DELETE {{{}\n}} INSERT {{{}\n}} WHERE {{{}\n}}'\
-            .format(delete_triples, insert_triples, where_triples)
+        body = sparql_update_body(delete_props, insert_props, where_props)
         cherrypy.log.error('Executing SPARQL update: ' + body)
 
         res = self.request('patch',
@@ -273,10 +299,86 @@ class LakeConnector(HttpConnector):
         #    cherrypy.log('HTTP Error: {}'.format(res.text))
         res.raise_for_status()
 
+        DocCache.invalidate(uri)
+        ContentVersion.bump()
+
         return True
 
 
 
+    def delete_node(self, uri, tombstone=True):
+        '''Delete a node.
+
+        @sa #delete_nodes()
+
+        @return None
+        '''
+
+        self.delete_nodes([uri], tombstone)
+
+
+
+    def delete_nodes(self, uris, tombstone=True):
+        '''Delete nodes concurrently.
+
+        If the URIs are within a transaction, nodes are only removed when
+        it is committed.
+
+        @param uris (list) Node URIs.
+        @param tombstone (boolean, optional) Whether to also delete the
+            tombstones left by deleted nodes, so that their paths can be
+            reused. Default: True.
+
+        @return None
+
+        @throw HTTPError The first error raised by a deletion, after all
+            deletions have completed, e.g. 404 Not Found if a node does not
+            exist.
+        '''
+
+        uris = list(uris)
+        if not uris:
+            return
+
+        with ThreadPoolExecutor(
+                max_workers=min(node_delete['workers'], len(uris))) as pool:
+            futures = [pool.submit(self._delete, uri, tombstone) for uri in uris]
+            # Caches are bound to the calling thread's request.
+            error = None
+            for uri, f in zip(uris, futures):
+                try:
+                    f.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                NodeCache.set(uri, False)
+                DocCache.invalidate(uri)
+
+        ContentVersion.bump()
+        if error:
+            raise error
+
+
+
+    def _delete(self, uri, tombstone):
+        '''Delete a node and optionally its tombstone.
+
+        @return None
+        '''
+
+        self.request('delete', uri, headers=self.headers)
+        if tombstone:
+            try:
+                self.request('delete', uri + '/fcr:tombstone',
+                        headers=self.headers)
+            except requests.exceptions.HTTPError as e:
+                # No tombstone is left e.g. within a transaction.
+                if e.response is None \
+                        or e.response.status_code not in (404, 405, 410):
+                    raise
+
+
+
     def commit_transaction(self, tx_uri):
         '''Commit an open transaction.
 
@@ -292,6 +394,9 @@ class LakeConnector(HttpConnector):
             headers=self.headers
         )
         res.raise_for_status()
+        NodeCache.end_tx(tx_uri)
+        DocCache.end_tx(tx_uri)
+        ContentVersion.bump()
 
         return True
 
@@ -311,6 +416,8 @@ class LakeConnector(HttpConnector):
             tx_uri + '/fcr:tx/fcr:rollback',
             headers=self.headers
         )
+        NodeCache.end_tx(tx_uri)
+        DocCache.end_tx(tx_uri)
         res.raise_for_status()
 
         return True
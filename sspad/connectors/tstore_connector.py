@@ -1,14 +1,18 @@
 import cherrypy
+import io
 import xml.etree.ElementTree as ET
 
 from itertools import chain
 from os.path import basename
-from rdflib import Graph, URIRef, Literal, Variable
-from rdflib.plugins.sparql.processor import prepareQuery
+from rdflib import Graph, URIRef, Literal, Variable, XSD
 from urllib.parse import quote, unquote
 
 from sspad.config.datasources import tstore_rest_api
+from sspad.config.local import construct as construct_conf
 from sspad.connectors.http_connector import HttpConnector
+from sspad.modules.rdf_reader import iter_ntriples
+from sspad.modules.rdf_writer import term_n3
+from sspad.modules.sparql_templates import Raw, register
 from sspad.resources.rdf_lexicon import ns_collection
 
 
@@ -31,6 +35,19 @@ class TstoreConnector(HttpConnector):
 
 
 
+    ## Query templates.
+
+    _q_ask_by_prop = register('tstore.ask_by_prop',
+            'ASK { ?r $prop $value . }')
+
+    _q_uri_by_prop = register('tstore.uri_by_prop',
+            'SELECT ?u WHERE { ?u $prop $value . } LIMIT 1')
+
+    _q_uri_by_props = register('tstore.uri_by_props',
+            'SELECT ?u WHERE {\n$where } LIMIT 1')
+
+
+
     ## METHODS ##
 
     def __init__(self):
@@ -59,17 +76,17 @@ class TstoreConnector(HttpConnector):
             output format. It is one of 'ask', 'select', 'construct'. Defaults to 'select'
             for unspecified or unrecognized values.
 
-        @return Depending on the value of \p action: if 'select' or 'construct', it is
-            a dict of bound values. If 'ask', it is a boolean value.
-
-        @TODO Return rdflib.Graph instance for \p action == 'construct'
+        @return Depending on the value of \p action: if 'select', it is a
+            list of dicts of bound values. If 'construct', it is a
+            rdflib.Graph. If 'ask', it is a boolean value.
         '''
 
+        if action == 'construct':
+            return self.construct(q)
+
         cherrypy.log('Querying tstore: {}'.format(q))
         if action == 'ask':
             accept = 'text/boolean'
-        elif action == 'construct':
-            accept = 'application/rdf+xml'
         else: # select
             accept = 'application/sparql-results+xml'
 
@@ -90,15 +107,86 @@ class TstoreConnector(HttpConnector):
         if action == 'ask':
             return True if res.text == 'true' or res.text == 'True' else False
         else:
-            ret = []
-            root = ET.fromstring(res.text)
-            for result in root.find('{http://www.w3.org/2005/sparql-results#}results'):
-                row = {}
-                for binding in result:
-                    row[binding.attrib['name']] = binding[0].text
-                cherrypy.log('Query result row: {}.'.format(row))
-                ret.append(row)
-            return ret
+            return list(self._iter_results(io.BytesIO(res.content)))
+
+
+
+    def query_iter(self, q):
+        '''Sends a SPARQL SELECT query and yields result rows as they are
+        received.
+
+        The query is sent right away, so that errors are raised before any
+        result is consumed; the response is then parsed incrementally, so
+        that memory use does not depend on the size of the result set.
+
+        @param q (string) SPARQL query string.
+
+        @return (generator) Dicts of bound values.
+        '''
+
+        cherrypy.log('Querying tstore (streaming): {}'.format(q))
+        res = self.request(
+            'get',
+            self.conf['base_url'],
+            headers = dict(chain(self.headers.items(),
+                [('Accept', 'application/sparql-results+xml, */*;q=0.5')]
+            )),
+            params = {'query': q},
+            stream = True
+        )
+        res.raw.decode_content = True
+
+        return self._stream_results(res)
+
+
+
+    def construct(self, q, max_triples=None):
+        '''Sends a SPARQL CONSTRUCT query and returns the resulting graph.
+
+        @sa #construct_iter()
+
+        @return (rdflib.Graph)
+        '''
+
+        g = Graph()
+        for triple in self.construct_iter(q, max_triples):
+            g.add(triple)
+
+        return g
+
+
+
+    def construct_iter(self, q, max_triples=None):
+        '''Sends a SPARQL CONSTRUCT query and yields triples as they are
+        received.
+
+        Results are requested as N-Triples and parsed line by line. As for
+        #query_iter(), the query is sent right away.
+
+        @param q (string) SPARQL query string.
+        @param max_triples (int, optional) Maximum number of triples.
+            Default is the configured limit.
+
+        @return (generator) Subject, predicate, object 3-tuples of rdflib
+            terms.
+
+        @throw cherrypy.HTTPError 502 Bad Gateway while iterating, if the
+            result exceeds \p max_triples.
+        '''
+
+        cherrypy.log('Querying tstore (construct): {}'.format(q))
+        res = self.request(
+            'get',
+            self.conf['base_url'],
+            headers = dict(chain(self.headers.items(),
+                [('Accept', 'application/n-triples, text/plain;q=0.9')]
+            )),
+            params = {'query': q},
+            stream = True
+        )
+        res.raw.decode_content = True
+
+        return self._stream_triples(res, max_triples or construct_conf['max_triples'])
 
 
 
@@ -111,7 +199,8 @@ class TstoreConnector(HttpConnector):
         @return (boolean) Whether a node with the requested property value exists.
         '''
 
-        q = 'ASK {{ ?r <{}> "{}"^^<http://www.w3.org/2001/XMLSchema#string> . }}'.format(prop, value)
+        q = self._q_ask_by_prop.render(
+                prop=URIRef(prop), value=Literal(value, datatype=XSD.string))
 
         return self.query(q, 'ask')
 
@@ -127,7 +216,8 @@ class TstoreConnector(HttpConnector):
         @return string
         '''
 
-        q = 'SELECT ?u WHERE {{ ?u <{}> "{}"^^<http://www.w3.org/2001/XMLSchema#string> . }} LIMIT 1'.format(prop, value)
+        q = self._q_uri_by_prop.render(
+                prop=URIRef(prop), value=Literal(value, datatype=XSD.string))
 
         res = self.query(q)
 
@@ -145,16 +235,11 @@ class TstoreConnector(HttpConnector):
         @return string
         '''
 
-        #where_graph = Graph()
-        where_str = ''
-        for prop in props:
-            cherrypy.log('Prop: {}'.format(prop))
-            where_str += '?u {} {} .\n'.format(
-                prop[0].n3(),
-                prop[1].n3()
-            )
+        where_str = ''.join(['?u {} {} .\n'.format(
+            term_n3(prop[0]), term_n3(prop[1])
+        ) for prop in props])
 
-        q = 'SELECT ?u WHERE {{\n{} }} LIMIT 1'.format(where_str)
+        q = self._q_uri_by_props.render(where=Raw(where_str))
 
         res = self.query(q)
 
@@ -162,3 +247,59 @@ class TstoreConnector(HttpConnector):
         return res[0]['u'] if res else False
 
 
+
+    def _stream_results(self, res):
+        '''Yield result rows from a streamed response and close it when done.
+
+        @param res (requests.Response) Streamed query response.
+
+        @return (generator) Dicts of bound values.
+        '''
+
+        try:
+            for row in self._iter_results(res.raw):
+                yield row
+        finally:
+            res.close()
+
+
+
+    def _stream_triples(self, res, max_triples):
+        '''Yield triples from a streamed N-Triples response and close it
+        when done.
+
+        @param res (requests.Response) Streamed query response.
+        @param max_triples (int) Maximum number of triples.
+
+        @return (generator) Triples.
+        '''
+
+        try:
+            for i, triple in enumerate(iter_ntriples(res.iter_lines())):
+                if i >= max_triples:
+                    raise cherrypy.HTTPError('502 Bad Gateway',
+                        'Query result exceeds {} triples.'.format(max_triples))
+                yield triple
+        finally:
+            res.close()
+
+
+
+    def _iter_results(self, stream):
+        '''Parse a SPARQL XML result document incrementally.
+
+        @param stream (file-like) Result document.
+
+        @return (generator) Dicts of bound values.
+        '''
+
+        result_tag = '{http://www.w3.org/2005/sparql-results#}result'
+        for event, elem in ET.iterparse(stream, events=('end',)):
+            if elem.tag != result_tag:
+                continue
+            row = {}
+            for binding in elem:
+                row[binding.attrib['name']] = binding[0].text
+            #cherrypy.log('Query result row: {}.'.format(row))
+            elem.clear()
+            yield row
@@ -29,11 +29,16 @@ class AnnotationCtrl(SspadController):
     def GET(self, subject):
         '''Lists all annotations for the given subject URI.
 
-        @param uri (string) Subject URI.
+        @param subject (string | list) Subject URI. The parameter can be
+            repeated to list annotations of several subjects at once.
 
-        @return (list) List of annotation dicts.
+        @return (list | dict) List of annotation dicts, or lists keyed by
+            subject URI if several subjects are given.
         '''
 
+        if isinstance(subject, list):
+            return self._output(self.model().list_many(subject))
+
         return self._output(self.model().list(subject))
 
 
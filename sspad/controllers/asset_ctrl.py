@@ -1,9 +1,13 @@
 import json
 
+from urllib.parse import urlencode
+
 import cherrypy
 
 from sspad.controllers.sspad_controller import SspadController
 from sspad.models.asset import Asset
+from sspad.modules.file_io import LocalFile, resolve_local_path
+from sspad.modules.job_queue import get_queue
 
 
 class AssetCtrl(SspadController):
@@ -14,6 +18,9 @@ class AssetCtrl(SspadController):
     @package sspad.controllers
     '''
 
+    ## Maximum number of assets listed per page.
+    max_page_size = 1000
+
 
     @property
     def model(self):
@@ -23,37 +30,68 @@ class AssetCtrl(SspadController):
 
 
 
-    def GET(self, uid=None, legacy_uid=None):
+    def GET(self, uid=None, legacy_uid=None, sort='uid', limit='100',
+            cursor=None, batch_uid=None, created_after=None,
+            created_before=None):
         '''GET method.
 
-        Lists all Assets or shows properties for an asset with given uid.
+        Lists Assets or shows an asset with given UID or legacy UID,
+        including its instances and comments.
+
+        The response for a single asset carries an ETag. If it matches the
+        If-None-Match request header, a 304 Not Modified response is
+        returned.
 
         @param uid (string) UID of Asset to display.
+        @param legacy_uid (string) Legacy UID of Asset to display.
+        @param sort (string) Sort key of the list: 'uid' or 'created'.
+        @param limit (int) Page size of the list, up to #max_page_size.
+        @param cursor (string) Cursor of the list page to display, as
+            returned with the previous page.
+        @param batch_uid (string) Only list assets with this batch UID.
+        @param created_after (string) Only list assets created at or after
+            this ISO 8601 date/time.
+        @param created_before (string) Only list assets created before
+            this ISO 8601 date/time.
 
         @return string
 
-        @TODO stub
+        @sa Asset::list()
         '''
 
         model = self.model()
 
-        if uid:
-            return {'message': '*stub* This is Asset #{}.'.format(uid)}
-        elif legacy_uid:
-            if model.tsconn.assert_node_exists_by_prop(
-                ns_collection['aic'] + 'legacyUid', legacy_uid
-            ):
-                return {
-                    'message': '*stub* This is Asset with legacy UID #{}.'\
-                            .format(legacy_uid)
-                }
-            else:
+        if uid or legacy_uid:
+            if not model.set_uri(uid=uid, legacy_uid=legacy_uid):
                 raise cherrypy.HTTPError(
                     '404 Not Found',
-                    'An asset with this legacy UID does not exist.'
+                    'An asset with this UID or legacy UID does not exist.'
                 )
+            doc, etag = model.get()
+
+            cherrypy.response.headers['ETag'] = etag
+            cherrypy.response.headers['Vary'] = 'Accept'
+            if etag in [t.strip() for t in \
+                    cherrypy.request.headers.get('If-None-Match', '').split(',')]:
+                cherrypy.response.status = 304
+                return b''
+
+            return self._output(doc)
         else:
-            return self._output({'message': '*stub* This is a list of Assets.'})
+            try:
+                ret = model.list(
+                    sort, max(1, min(int(limit), self.max_page_size)),
+                    cursor, batch_uid, created_after, created_before
+                )
+            except ValueError as e:
+                raise cherrypy.HTTPError('400 Bad Request', str(e))
+
+            if ret['next']:
+                cherrypy.response.headers['Link'] = '<{}>; rel="next"'.format(
+                    cherrypy.url(qs=urlencode(dict(
+                        cherrypy.request.params, cursor=ret['next']))))
+
+            return self._output(ret)
 
 
 
@@ -71,12 +109,29 @@ class AssetCtrl(SspadController):
             If the datastream is in an external URL and must be a reference,
             the variable name is prefixed with ref_ and the value is a URL
             (e.g. 'ref_source' will ingest a reference ds called 'source').
+            If the datastream is a file on a mount point of the ingest host
+            allowed for path ingest, the variable name is prefixed with
+            path_ and the value is the absolute file path.
             Only the 'source' datastream is mandatory (or 'ref_source'
             if it is a reference).
 
+        If the request carries a 'Prefer: respond-async' header and
+        asynchronous ingest is enabled, the request is queued and a
+        202 Accepted response is returned with the job status URL.
+
         @return (dict) Message with new node information.
         '''
 
+        if 'uid' in dstreams:
+            raise cherrypy.HTTPError(
+                '400 Bad Request', 'The UID of a new asset cannot be set.')
+
+        queue = self._async_queue()
+        if queue:
+            return self._enqueue(queue, 'create', {
+                'mid' : mid, 'props' : json.loads(props),
+            }, self._local_paths(dstreams))
+
         cherrypy.log('\n')
         cherrypy.log('************************')
         cherrypy.log('Begin ingestion process.')
@@ -87,11 +142,14 @@ class AssetCtrl(SspadController):
 
         props_dict = model.convert_req_propnames(json.loads(props))
 
+        dstreams = self._local_dstreams(dstreams)
         try:
             ret = model.create(mid, props_dict, **dstreams)
         except:
             # @TODO Diffrentiate exceptions
             raise
+        finally:
+            self._close_local(dstreams)
 
         cherrypy.response.status = 201
         cherrypy.response.headers['Location'] = model.uri
@@ -117,11 +175,19 @@ class AssetCtrl(SspadController):
             Name of the parameter is the datastream name.
             Only the 'source' datastream is mandatory. @sa POST
 
+        Asynchronous processing can be requested as for POST.
+
         @return (dict) Message with node information.
 
         @TODO Replacing property set is not supported yet.
         '''
 
+        queue = self._async_queue()
+        if queue:
+            return self._enqueue(queue, 'create_or_update', {
+                'uri' : uri, 'uid' : uid, 'props' : json.loads(props),
+            }, self._local_paths(dstreams))
+
         cherrypy.log('\n')
         cherrypy.log('*********************')
         cherrypy.log('Begin update process.')
@@ -132,29 +198,17 @@ class AssetCtrl(SspadController):
 
         props_dict = model.convert_req_propnames(json.loads(props))
 
-        legacy_uid = props_dict['legacy_uid'] if 'legacy_uid' in props_dict else None
-
-        if not model.set_uri(uri, uid, legacy_uid):
-            # If no URI could be set from given parameters, create new node.
-            try:
-                ret = model.create('', props_dict, **dstreams)
-            except:
-                # @TODO Diffrentiate exceptions
-                raise
-
-            cherrypy.response.status = 201
-            cherrypy.response.headers['Location'] = model.uri
-
-        else:
-
-            # If a URI is found, update the node.
-            try:
-                ret = model.update(props=props_dict, **dstreams)
-            except:
-                raise
+        dstreams = self._local_dstreams(dstreams)
+        try:
+            ret, created = model.create_or_update(uri, uid, props_dict, **dstreams)
+        except:
+            # @TODO Diffrentiate exceptions
+            raise
+        finally:
+            self._close_local(dstreams)
 
-            cherrypy.response.status = 204
-            cherrypy.response.headers['Location'] = model.uri
+        cherrypy.response.status = 201 if created else 204
+        cherrypy.response.headers['Location'] = model.uri
 
         return self._output(ret)
 
@@ -195,3 +249,105 @@ class AssetCtrl(SspadController):
 
         return self._output({"message": "Asset updated."})
 
+
+
+    def _local_dstreams(self, dstreams):
+        '''Replace path_* datastream parameters with the files they point to.
+
+        @param dstreams (dict) Datastreams as received by the controller.
+
+        @return (dict) Datastreams with local files opened. The files must
+            be closed with _close_local().
+
+        @throw cherrypy.HTTPError 403 Forbidden if a path is not allowed;
+            404 Not Found if a file does not exist. Files opened before the
+            error are closed.
+        '''
+
+        ret = {}
+        try:
+            for dsname, ds in dstreams.items():
+                if dsname[:5] == 'path_':
+                    ret[dsname[5:]] = LocalFile(resolve_local_path(ds))
+                else:
+                    ret[dsname] = ds
+        except:
+            self._close_local(ret)
+            raise
+
+        return ret
+
+
+
+    def _local_paths(self, dstreams):
+        '''Resolve and check path_* datastream parameters without opening
+        the files they point to.
+
+        @param dstreams (dict) Datastreams as received by the controller.
+
+        @return (dict) Datastreams with resolved paths.
+
+        @throw cherrypy.HTTPError @sa resolve_local_path()
+        '''
+
+        return {dsname : resolve_local_path(ds) if dsname[:5] == 'path_' else ds \
+                for dsname, ds in dstreams.items()}
+
+
+
+    def _close_local(self, dstreams):
+        '''Close the local files opened by _local_dstreams().
+
+        @param dstreams (dict) Datastreams returned by _local_dstreams().
+
+        @return None
+        '''
+
+        for ds in dstreams.values():
+            if isinstance(ds, LocalFile):
+                ds.file.close()
+
+
+
+    def _async_queue(self):
+        '''Get the job queue if the client requested asynchronous processing.
+
+        The preference is ignored if asynchronous ingest is disabled.
+
+        @return (JobQueue | None)
+        '''
+
+        prefer = cherrypy.request.headers.get('Prefer', '')
+        if 'respond-async' in [p.strip() for p in prefer.split(',')]:
+            return get_queue()
+
+
+
+    def _enqueue(self, queue, action, params, dstreams):
+        '''Spool a request in the job queue.
+
+        @param queue (JobQueue) Job queue.
+        @param action (string) Model method to be run by the job.
+        @param params (dict) Model method arguments.
+        @param dstreams (dict) Datastreams.
+
+        @return (string) Message with job status URL.
+        '''
+
+        job_id = queue.enqueue(
+            action,
+            '{}.{}'.format(self.model.__module__, self.model.__name__),
+            params,
+            dstreams,
+            cherrypy.request.headers.get('Authorization')
+        )
+        job_url = cherrypy.url('/job/' + job_id)
+
+        cherrypy.response.status = 202
+        cherrypy.response.headers['Location'] = job_url
+        cherrypy.response.headers['Preference-Applied'] = 'respond-async'
+
+        return self._output({
+            'message' : 'Request queued.',
+            'data' : {'job' : job_id, 'location' : job_url},
+        })
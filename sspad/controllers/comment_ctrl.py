@@ -29,13 +29,19 @@ class CommentCtrl(AnnotationCtrl):
     def GET(self, subject, cat=None):
         '''GET method.
 
-        Lists all annotations for the given subject URI.
+        Lists all comments for the given subject URI.
 
-        @param uri (string) Subject URI.
+        @param subject (string | list) Subject URI. The parameter can be
+            repeated to list comments of several subjects at once.
+        @param cat (string, optional) Only list comments of this category.
 
-        @return (list) List of annotation dicts.
+        @return (list | dict) List of comment dicts, or lists keyed by
+            subject URI if several subjects are given.
         '''
 
+        if isinstance(subject, list):
+            return self._output(self.model().list_many(subject, cat))
+
         return self._output(self.model().list(subject, cat))
 
 
@@ -0,0 +1,99 @@
+from itertools import chain
+
+import cherrypy
+
+from sspad.config.local import export as export_conf
+from sspad.controllers.sspad_controller import SspadController
+from sspad.models.static_image import StaticImage
+from sspad.models.text import Text
+from sspad.modules.file_io import gzip_iter
+
+
+class ExportCtrl(SspadController):
+    '''Export Controller class.
+
+    Streams the metadata of all assets of a type for bulk consumers.
+
+    @package sspad.controllers
+    '''
+
+
+    exposed = True
+
+    ## Models which can be exported, keyed by the name of their endpoint.
+    export_models = {
+        'si' : StaticImage,
+        'tx' : Text,
+    }
+
+    ## MIME types of export formats.
+    content_types = {
+        'nt' : 'application/n-triples',
+        'jsonl' : 'application/x-ndjson',
+    }
+
+
+    @property
+    def model(self):
+        '''@sa SspadController::model'''
+
+        return None
+
+
+
+    def _options_docs(self):
+        '''@sa SspadController::_options_docs()
+
+        Asset types and formats which can be exported are listed.
+        '''
+
+        docs = super()._options_docs()
+        docs['types'] = sorted(self.export_models)
+        docs['formats'] = sorted(self.content_types)
+
+        return docs
+
+
+
+    def GET(self, type, format='nt', modified_since=None):
+        '''Export the metadata of all assets of a type.
+
+        The export is streamed while it is read from the triplestore. If the
+        request accepts the gzip encoding, the response is compressed.
+
+        @param type (string) Asset type, one of #export_models.
+        @param format (string) 'nt' for N-Triples or 'jsonl' for one JSON
+            document per asset and line.
+        @param modified_since (string) Only export assets last modified at
+            or after this ISO 8601 date/time.
+
+        @return (generator) Response chunks.
+
+        @sa Asset::export()
+        '''
+
+        if type not in self.export_models:
+            raise cherrypy.HTTPError(
+                '400 Bad Request',
+                'Assets of type \'{}\' cannot be exported.'.format(type)
+            )
+
+        lines = self.export_models[type]().export(
+                format, modified_since, export_conf['page_size'])
+        # Read the first page before sending headers, so that errors are
+        # reported with a proper status.
+        try:
+            first = next(lines, b'')
+        except ValueError as e:
+            raise cherrypy.HTTPError('400 Bad Request', str(e))
+        body = chain([first], lines)
+
+        resp = cherrypy.response
+        resp.headers['Content-Type'] = self.content_types[format]
+        resp.headers['Vary'] = 'Accept-Encoding'
+        resp.stream = True
+        if 'gzip' in cherrypy.request.headers.get('Accept-Encoding', ''):
+            resp.headers['Content-Encoding'] = 'gzip'
+            return gzip_iter(body, export_conf['gzip_level'])
+
+        return body
@@ -0,0 +1,57 @@
+import cherrypy
+
+from sspad.controllers.sspad_controller import SspadController
+from sspad.modules.job_queue import get_queue
+
+
+class JobCtrl(SspadController):
+    '''Job Controller class.
+
+    Reports the status of asynchronous ingest jobs.
+
+    @package sspad.controllers
+    '''
+
+
+    exposed = True
+
+
+    @property
+    def model(self):
+        '''@sa SspadController::model'''
+
+        return None
+
+
+
+    def GET(self, job_id=None):
+        '''Get the status of a job or of the whole queue.
+
+        @param job_id (string, optional) Job ID. If empty (default), queue
+            depth and lag are returned.
+
+        @return (dict) Job or queue status. When a job is done, its result
+            contains the HTTP status and location of the ingested resource.
+        '''
+
+        queue = get_queue()
+        if not queue:
+            raise cherrypy.HTTPError(
+                '404 Not Found', 'Asynchronous ingest is not enabled.'
+            )
+
+        if not job_id:
+            return self._output(queue.stats())
+
+        job = queue.get(job_id)
+        if not job:
+            raise cherrypy.HTTPError(
+                '404 Not Found', 'No job with ID {}.'.format(job_id)
+            )
+
+        if job['status'] == 'done':
+            cherrypy.response.headers['Link'] = \
+                    '<{}>; rel="related"'.format(job['result']['location'])
+
+        return self._output(job)
+
@@ -0,0 +1,32 @@
+from sspad.controllers.sspad_controller import SspadController
+from sspad.modules.metrics import Metrics
+
+
+class MetricsCtrl(SspadController):
+    '''Metrics Controller class.
+
+    Exposes figures reported by local services such as queues and caches.
+
+    @package sspad.controllers
+    '''
+
+
+    exposed = True
+
+
+    @property
+    def model(self):
+        '''@sa SspadController::model'''
+
+        return None
+
+
+
+    def GET(self):
+        '''Get metrics from all local services.
+
+        @return (dict) Metrics keyed by service name.
+        '''
+
+        return self._output(Metrics.collect())
+
@@ -1,3 +1,4 @@
+import cherrypy
 import json
 
 from sspad.controllers.sspad_controller import SspadController
@@ -24,7 +25,8 @@ class SearchCtrl(SspadController):
 
 
 
-    def GET(self, result, ent=None, subj=None, prop=None, conditions=[]):
+    def GET(self, result, ent=None, subj=None, prop=None, conditions=[],
+            facets=None, projection=None):
         '''GET method.
 
         Gets terms for building queries or performs query
@@ -49,19 +51,49 @@ class SearchCtrl(SspadController):
             the query. when @p result is 'items'. Each condition line is a
             dict where keys are: subj, prop, comp, value. All of them
             must be non-null except for value (when a null value is searched).
+        @param facets (string | list) Properties to count matching items by
+            when @p result is 'items', e.g. 'rdf:type' or 'aic:hasTag'. The
+            parameter can be repeated or hold a comma-separated list. Counts
+            are returned along with the items.
+        @param projection (string | list) Fields to return for each item
+            when @p result is 'items', e.g. 'label', 'uid', 'tags' or
+            'master'. The parameter can be repeated or hold a
+            comma-separated list. @sa Search::projection_fields
         '''
 
         if result == 'terms':
-            ret = Search().get_terms(ent, subj, prop)
+            return self._output(Search().get_terms(ent, subj, prop))
         elif result == 'items':
-            ret = Search().query(ent, json.loads(conditions))
+            projection = self._param_list(projection)
+            if facets:
+                return self._output(Search().query(
+                        ent, json.loads(conditions), self._param_list(facets),
+                        projection))
+            return self._output_stream(
+                    Search().query(ent, json.loads(conditions), projection=projection))
         else:
             raise cherrypy.HTTPError(
                 '400 Bad Request',
                 'Search for \'{}\' is not supported.'.format(result)
             )
 
-        return self._output(ret)
 
 
 
+
+
+    def _param_list(self, value):
+        '''Normalize a parameter which may be repeated or hold a
+        comma-separated list.
+
+        @param value (string | list | None) Parameter value.
+
+        @return (list)
+        '''
+
+        if not value:
+            return []
+        if not isinstance(value, list):
+            value = value.split(',')
+
+        return [v.strip() for v in value if v.strip()]
@@ -35,10 +35,21 @@ class SspadController(Negotiable, metaclass=ABCMeta):
         '''OPTIONS method.
 
         Display HTTP methods, model properties and types(mixins) available.
+        Properties and types are omitted for controllers without a model.
 
         @return string JSON-encoded dict.
         '''
 
+        return self._output(self._options_docs())
+
+
+
+    def _options_docs(self):
+        '''Build the resource description returned by OPTIONS.
+
+        @return dict
+        '''
+
         exp_methods = [m for m in dir(self) \
                 if callable(getattr(self, m)) \
                 and re.match('^[A-Z]+$', m)]
@@ -49,12 +60,13 @@ class SspadController(Negotiable, metaclass=ABCMeta):
             method_doc.append(getattr(self, method).__doc__)
         #cherrypy.log('Method docs: {}'.format(method_doc))
 
-        docs = {
-            'methods' : method_doc,
-            'props' : [{'prop' : i[0], 'type' : i[1], 'data_type' : str(i[2]) \
-                    if len(i)>2 else None} for i in self.model().ns_props],
-        }
+        docs = {'methods' : method_doc}
+        if self.model is None:
+            return docs
+
+        docs['props'] = [{'prop' : i[0], 'type' : i[1], 'data_type' : str(i[2]) \
+                if len(i)>2 else None} for i in self.model().ns_props]
         if hasattr(self.model, 'mixins'):
             docs['types'] = self.model().mixins
 
-        return self._output(docs)
+        return docs
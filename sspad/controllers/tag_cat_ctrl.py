@@ -32,11 +32,10 @@ class TagCatCtrl(SspadController):
         @return (string | list) Category URI or list of categories.
         '''
 
-        ret = self.model().get_uri(label) \
-                if label \
-                else self.model().list()
-
-        return self._output(ret)
+        if label:
+            return self._output(self.model().get_uri(label))
+        else:
+            return self._output_stream(self.model().list())
 
 
 
@@ -40,11 +40,9 @@ class TagCtrl(SspadController):
 
         if label:
             cat_uri = TagCat().get_uri(cat_label)
-            ret = self.model().get_uri(label, cat_label)
+            return self._output(self.model().get_uri(label, cat_label))
         else:
-            ret = self.model().list(cat_label)
-
-        return self._output(ret)
+            return self._output_stream(self.model().list(cat_label))
 
 
 
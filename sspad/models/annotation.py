@@ -6,6 +6,8 @@ import requests
 from rdflib import URIRef, Literal, XSD
 
 from sspad.models.sspad_model import SspadModel
+from sspad.modules.rdf_writer import term_n3
+from sspad.modules.sparql_templates import Raw, register
 from sspad.resources.rdf_lexicon import ns_collection as nsc
 
 
@@ -53,13 +55,75 @@ class Annotation(SspadModel):
 
 
 
+    ## Query templates.
+
+    _q_list = register('annotation.list', '''
+        SELECT ?subj ?uri ?content ?cat ?created ?createdBy WHERE {
+            VALUES ?subj { $subjects }
+            ?uri $subject_path ?subj .
+            ?uri a $type .
+            OPTIONAL { ?uri aic:content ?content . }
+            OPTIONAL { ?uri aic:category ?cat . }
+            OPTIONAL { ?uri fcrepo:created ?created . }
+            OPTIONAL { ?uri fcrepo:createdBy ?createdBy . }
+            $conditions
+        } ORDER BY ?subj ?created
+        ''')
+
+    ## Property path from an annotation to its subject.
+    subject_path = 'fcrepo:hasParent/fcrepo:hasParent'
+
+    ## Maximum number of subjects looked up in one query.
+    batch_size = 200
+
+
     def list(self, subject):
         '''Lists all annotations for the given subject URI.
 
         @sa AnnotationCtrl::GET()
+
+        @param subject (string) Subject URI.
+
+        @return (list) Annotation dicts with URI, content and creation info,
+            oldest first.
         '''
 
-        pass
+        return self.list_many([subject])[subject]
+
+
+
+    def list_many(self, subjects, cat=None):
+        '''Lists annotations for several subjects.
+
+        Subjects are looked up in batches of #batch_size, with one query
+        per batch.
+
+        @param subjects (list) Subject URIs.
+        @param cat (string, optional) Category name. If specified, only
+            annotations of the given category are returned.
+
+        @return (dict) Lists of annotation dicts keyed by subject URI. Every
+            requested subject has an entry, even if it has no annotations.
+        '''
+
+        ret = {s : [] for s in subjects}
+        conditions = ''
+        if cat:
+            conditions = 'FILTER(STR(?cat) = {}) .'.format(term_n3(Literal(cat)))
+
+        for i in range(0, len(subjects), self.batch_size):
+            batch = subjects[i:i + self.batch_size]
+            q = self._q_list.render(
+                subjects = Raw(' '.join([term_n3(URIRef(s)) for s in batch])),
+                subject_path = Raw(self.subject_path),
+                type = self.node_type,
+                conditions = Raw(conditions),
+            )
+            for row in self.tsconn.query(q):
+                subj = row.pop('subj')
+                ret.setdefault(subj, []).append(row)
+
+        return ret
 
 
 
@@ -78,7 +142,7 @@ class Annotation(SspadModel):
             uri = uri,
             props = self._build_prop_tuples(
                 insert_props = {
-                    'content' : [content],
+                    nsc['aic'].content : [content],
                 },
                 delete_props = {},
                 init_insert_tuples = self.base_prop_tuples
@@ -1,7 +1,12 @@
+import base64
 import mimetypes
 import io
 import json
 import os
+import re
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 import cherrypy
 import requests
@@ -9,9 +14,16 @@ import requests
 from rdflib import URIRef, Literal, XSD
 
 from sspad.config.datasources import lake_rest_api
+from sspad.config.local import ingest, renditions
 from sspad.connectors.uidminter_connector import UidminterConnector
 from sspad.models.instance import Instance
 from sspad.models.resource import Resource
+from sspad.modules.bloom import LegacyUidFilter
+from sspad.modules.doc_cache import DocCache
+from sspad.modules.id_index import get_index
+from sspad.modules.request_context import current_headers, request_context
+from sspad.modules.rdf_writer import term_n3
+from sspad.modules.sparql_templates import Raw, register
 from sspad.resources.rdf_lexicon import ns_collection as nsc, ns_mgr
 
 
@@ -75,45 +87,47 @@ class Asset(Resource):
 
     @property
     def special_rels(self):
+        '''@sa SspadModel::special_rels'''
+
         return {
             nsc['aic'].citiAgentPKey : {
-                'type' : nsc['aic'].Object,
-                'uid' : 'citi_pkey',
+                'type' : nsc['aic'].Actor,
+                'uid' : nsc['aic'].citiPkey,
                 'rel' : nsc['aic'].represents,
             },
             nsc['aic'].citiExhibPKey : {
-                'type' : nsc['aic'].Object,
-                'uid' : 'citi_pkey',
+                'type' : nsc['aic'].Event,
+                'uid' : nsc['aic'].citiPkey,
                 'rel' : nsc['aic'].represents,
             },
             nsc['aic'].citiObjPKey : {
-                'type' : nsc['aic'].Actor,
-                'uid' : 'citi_pkey',
+                'type' : nsc['aic'].Object,
+                'uid' : nsc['aic'].citiPkey,
                 'rel' : nsc['aic'].represents,
             },
             nsc['aic'].citiPlacePKey : {
-                'type' : nsc['aic'].Actor,
-                'uid' : 'citi_pkey',
+                'type' : nsc['aic'].Place,
+                'uid' : nsc['aic'].citiPkey,
                 'rel' : nsc['aic'].represents,
             },
             nsc['aic'].citiPrefAgentPKey : {
-                'type' : nsc['aic'].Place,
-                'uid' : 'citi_pkey',
+                'type' : nsc['aic'].Actor,
+                'uid' : nsc['aic'].citiPkey,
                 'rel' : nsc['aic'].isPrimaryRepresentationOf,
             },
             nsc['aic'].citiPrefExhibPKey : {
-                'type' : nsc['aic'].Place,
-                'uid' : 'citi_pkey',
+                'type' : nsc['aic'].Event,
+                'uid' : nsc['aic'].citiPkey,
                 'rel' : nsc['aic'].isPrimaryRepresentationOf,
             },
             nsc['aic'].citiPrefObjPKey  : {
-                'type' : nsc['aic'].Event,
-                'uid' : 'citi_pkey',
+                'type' : nsc['aic'].Object,
+                'uid' : nsc['aic'].citiPkey,
                 'rel' : nsc['aic'].isPrimaryRepresentationOf,
             },
             nsc['aic'].citiPrefPlacePKey : {
-                'type' : nsc['aic'].Event,
-                'uid' : 'citi_pkey',
+                'type' : nsc['aic'].Place,
+                'uid' : nsc['aic'].citiPkey,
                 'rel' : nsc['aic'].isPrimaryRepresentationOf,
             },
         }
@@ -132,6 +146,49 @@ class Asset(Resource):
 
 
 
+    ## Query templates.
+
+    _q_get = register('asset.get', '''
+        CONSTRUCT {
+            $uri ?p ?o .
+            ?inst ?ip ?io .
+            ?comment ?cp ?co .
+        } WHERE {
+            {
+                $uri ?p ?o .
+            } UNION {
+                $uri aic:hasInstance|aic:hasMasterInstance|aic:hasOriginalInstance ?inst .
+                ?inst ?ip ?io .
+            } UNION {
+                $uri aic:hasComment ?comment .
+                ?comment ?cp ?co .
+            }
+        }
+        ''')
+
+    _q_list = register('asset.list', '''
+        SELECT ?uri ?key WHERE {
+            ?uri a $type .
+            ?uri $sort_prop ?key .
+            $conditions
+        } ORDER BY ?key ?uri LIMIT $limit
+        ''')
+
+    _q_export = register('asset.export', '''
+        CONSTRUCT { ?uri ?p ?o . } WHERE {
+            VALUES ?uri { $uris }
+            ?uri ?p ?o .
+        }
+        ''')
+
+    ## Properties assets can be listed by. They must have one value per asset.
+    list_sort_props = {
+        'uid' : (nsc['aic'].uid, XSD.string),
+        'created' : (nsc['aic'].created, XSD.dateTime),
+    }
+
+
+
     @property
     def path(self):
         '''Path between the repo root and the asset node.
@@ -144,11 +201,15 @@ class Asset(Resource):
 
 
 
-    def create(self, mid, props={}, **dstreams):
+    def create(self, mid, props={}, uid=None, **dstreams):
         '''Create an asset.
 
         @sa AssetCtrl::POST()
 
+        @param uid (string, optional) UID minted beforehand, e.g. by an
+            interrupted bulk import which is being resumed. By default a
+            new UID is minted.
+
         @return (dict) Message with new asset node information.
         '''
 
@@ -163,10 +224,13 @@ class Asset(Resource):
 
         # Before anything else, check if any of the legacy UIDs given has a duplicate.
         # If that is the case, throw a 409 Conflict HTTP error.
-        if 'legacy_uid' in props:
-            for legacy_uid in props['legacy_uid']:
-                check_uri = self.tsconn.get_node_uri_by_prop(
-                    nsc['aic'] + 'legacyUid', legacy_uid
+        # Legacy UIDs not in the Bloom filter are certainly new to the
+        # triplestore, but may be in the local index if just created.
+        if nsc['aic'].legacyUid in props:
+            for legacy_uid in props[nsc['aic'].legacyUid]:
+                check_uri = self.find_uri_by_prop(
+                    nsc['aic'].legacyUid, legacy_uid,
+                    tstore = not LegacyUidFilter.definitely_new(legacy_uid)
                 )
                 if check_uri:
                     cherrypy.response.headers['link'] = check_uri
@@ -175,9 +239,12 @@ class Asset(Resource):
                         'A node with legacy UID \'{}\' exists already.'.\
                                 format(legacy_uid)
                     )
+        # Record the legacy UIDs before they are written, so that concurrent
+        # creations check them.
+        self._filter_legacy_uids(props)
 
         # Create a new UID
-        self.uid = self.mint_uid(mid)
+        self.uid = uid or self.mint_uid(mid)
 
         # Generate master if not existing
         dstreams = self._generate_master(dstreams)
@@ -221,10 +288,212 @@ class Asset(Resource):
         # Commit transaction
         self._commit_transaction()
 
+        self._index_identifiers(props)
+
         return {"message": "Asset created.", "data": {"location": self.uri}}
 
 
 
+    def get(self):
+        '''Get an asset with its instances and comments.
+
+        The asset node, its instances and its comments are fetched with a
+        single CONSTRUCT query. Documents are cached until the asset or any
+        of its child nodes is written. @sa DocCache
+
+        #uri must be set before calling this method. @sa #set_uri()
+
+        @return (tuple) Asset document and its ETag.
+
+        @throw cherrypy.HTTPError 404 Not Found if the asset is not indexed.
+        '''
+
+        cached = DocCache.get(self.uri)
+        if cached:
+            return cached
+
+        g = self.tsconn.construct(self._q_get.render(uri=URIRef(self.uri)))
+        if not (URIRef(self.uri), None, None) in g:
+            raise cherrypy.HTTPError('404 Not Found',
+                    'No asset with URI {}.'.format(self.uri))
+
+        doc = {
+            'uri' : self.uri,
+            'props' : self._node_props(g, self.uri),
+            'instances' : {},
+            'comments' : [],
+        }
+        content_path = Instance().content_path
+        for rel in (nsc['aic'].hasOriginalInstance,
+                nsc['aic'].hasMasterInstance, nsc['aic'].hasInstance):
+            for inst in g.objects(URIRef(self.uri), rel):
+                doc['instances'].setdefault(os.path.basename(inst), {
+                    'uri' : str(inst),
+                    'content' : '{}/{}'.format(inst, content_path),
+                    'props' : self._node_props(g, inst),
+                })
+        for comment in sorted(g.objects(URIRef(self.uri), nsc['aic'].hasComment)):
+            doc['comments'].append({
+                'uri' : str(comment),
+                'props' : self._node_props(g, comment),
+            })
+
+        return doc, DocCache.set(self.uri, doc)
+
+
+
+    def list(self, sort='uid', limit=100, cursor=None, batch_uid=None,
+            created_after=None, created_before=None, modified_since=None):
+        '''List assets of this type, one page at a time.
+
+        Pages are delimited by the sort key and URI of the last asset of the
+        previous page rather than by an offset, so that every page costs the
+        same to compute and no asset is skipped or repeated when assets are
+        added while paging.
+
+        @param sort (string, optional) Sort key, one of #list_sort_props.
+        @param limit (int, optional) Page size.
+        @param cursor (string, optional) Cursor returned with the previous
+            page. Sort key and filters must not change between pages.
+        @param batch_uid (string, optional) Only list assets of this batch.
+        @param created_after (string, optional) Only list assets created
+            at or after this ISO 8601 date/time.
+        @param created_before (string, optional) Only list assets created
+            before this ISO 8601 date/time.
+        @param modified_since (string, optional) Only list assets last
+            modified at or after this ISO 8601 date/time.
+
+        @return (dict) Page items with URI and sort key, and the cursor of
+            the next page, or None if this is the last page.
+
+        @throw ValueError if the sort key, the cursor or a date are invalid.
+        '''
+
+        if sort not in self.list_sort_props:
+            raise ValueError('Invalid sort key: {}.'.format(sort))
+        sort_prop, sort_type = self.list_sort_props[sort]
+
+        conditions = []
+        if batch_uid:
+            conditions.append('?uri aic:batchUid {} .'.format(term_n3(
+                    Literal(batch_uid, datatype=XSD.string))))
+        if created_after or created_before:
+            conditions.append('?uri aic:created ?created .')
+        if created_after:
+            conditions.append('FILTER(?created >= {}) .'.format(term_n3(
+                    self._datetime_literal(created_after, 'created_after'))))
+        if created_before:
+            conditions.append('FILTER(?created < {}) .'.format(term_n3(
+                    self._datetime_literal(created_before, 'created_before'))))
+        if modified_since:
+            conditions.append('?uri fcrepo:lastModified ?modified .')
+            conditions.append('FILTER(?modified >= {}) .'.format(term_n3(
+                    self._datetime_literal(modified_since, 'modified_since'))))
+        if cursor:
+            try:
+                cursor_sort, last_key, last_uri = json.loads(
+                        base64.urlsafe_b64decode(cursor.encode()).decode())
+            except Exception:
+                raise ValueError('Invalid cursor.')
+            if cursor_sort != sort:
+                raise ValueError('Cursor does not match sort key.')
+            last_key = term_n3(Literal(last_key, datatype=sort_type))
+            conditions.append(
+                'FILTER(?key > {0} || (?key = {0} && STR(?uri) > {1})) .'.format(
+                    last_key, term_n3(Literal(last_uri))))
+
+        # Fetch one more item to know whether there is a next page.
+        rows = self.tsconn.query(self._q_list.render(
+            type = self.node_type,
+            sort_prop = sort_prop,
+            conditions = Raw('\n'.join(conditions)),
+            limit = Raw(str(int(limit) + 1)),
+        ))
+
+        items = [{'uri' : r['uri'], sort : r['key']} for r in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = base64.urlsafe_b64encode(json.dumps(
+                    [sort, rows[limit - 1]['key'], rows[limit - 1]['uri']]).encode()
+            ).decode()
+
+        return {'items' : items, 'next' : next_cursor}
+
+
+
+    def _datetime_literal(self, value, name):
+        '''Validate an ISO 8601 date/time filter value.
+
+        @param value (string) Date/time, e.g. '2016-01-31T12:00:00Z'.
+        @param name (string) Parameter name, for the error message.
+
+        @return (rdflib.Literal) xsd:dateTime literal.
+
+        @throw ValueError if the value is not a valid date/time.
+        '''
+
+        if re.match(r'^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?'
+                r'(Z|[+-]\d\d:\d\d)?$', value):
+            try:
+                datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+                return Literal(value, datatype=XSD.dateTime)
+            except ValueError:
+                pass
+
+        raise ValueError('Invalid {}: {}. An ISO 8601 date/time is expected, '
+                'e.g. 2016-01-31T12:00:00Z.'.format(name, value))
+
+
+
+    def export(self, fmt='nt', modified_since=None, page_size=500):
+        '''Export the metadata of all assets of this type.
+
+        Assets are listed by UID with #list() and their properties are
+        fetched with one CONSTRUCT query per page, so that the export
+        is written while it is being read and only one page is held in
+        memory at a time.
+
+        @param fmt (string, optional) Output format: 'nt' for N-Triples, or
+            'jsonl' for one JSON document per line with the asset URI and
+            its properties keyed by prefixed name.
+        @param modified_since (string, optional) Only export assets last
+            modified at or after this ISO 8601 date/time.
+        @param page_size (int, optional) Number of assets per query.
+
+        @return (generator) Lines of the export, as UTF-8 encoded bytes.
+
+        @throw ValueError if the format or the date are invalid.
+        '''
+
+        if fmt not in ('nt', 'jsonl'):
+            raise ValueError('Invalid export format: {}.'.format(fmt))
+
+        cursor = None
+        while True:
+            page = self.list('uid', page_size, cursor,
+                    modified_since=modified_since)
+            uris = [URIRef(i['uri']) for i in page['items']]
+            if uris:
+                g = self.tsconn.construct(self._q_export.render(
+                    uris = Raw(' '.join([term_n3(u) for u in uris]))))
+                for uri in uris:
+                    if fmt == 'nt':
+                        lines = ['{} {} {} .\n'.format(term_n3(uri),
+                                term_n3(p), term_n3(o)) \
+                                for p, o in sorted(g.predicate_objects(uri))]
+                        yield ''.join(lines).encode('utf-8')
+                    else:
+                        yield (json.dumps({
+                            'uri' : str(uri),
+                            'props' : self._node_props(g, uri),
+                        }) + '\n').encode('utf-8')
+
+            cursor = page['next']
+            if not cursor:
+                break
+
+
+
     def update(self, props={}, **dstreams):
         '''Updates an asset.
 
@@ -234,6 +503,7 @@ class Asset(Resource):
         '''
 
         if props:
+            self._filter_legacy_uids(props)
             # @TODO Replace all props
             self.replace_props(props)
 
@@ -248,8 +518,13 @@ class Asset(Resource):
             self.tx_uri = self.lconn.open_transaction()
             self.uri_in_tx = self.uri.replace(lake_rest_api['base_url'], self.tx_uri + '/')
 
-            # Loop over all datastreams and ingest them
-            self._ingest_instances(dstreams, dsmeta)
+            try:
+                # Loop over all datastreams and ingest them
+                self._ingest_instances(dstreams, dsmeta)
+            except:
+                # Roll back transaction if something goes wrong
+                self._rollback_transaction()
+                raise
 
             # Commit transaction
             self._commit_transaction()
@@ -259,6 +534,45 @@ class Asset(Resource):
 
 
 
+    def patch(self, insert_props={}, delete_props={}):
+        '''@sa SspadModel::patch()
+
+        Inserted legacy UIDs are added to the legacy UID filter. Once the
+        patch is committed, inserted and deleted legacy UIDs are updated in
+        the identifier index.
+        '''
+
+        self._filter_legacy_uids(insert_props)
+
+        ret = super().patch(insert_props, delete_props)
+        self._reindex_legacy_uids(insert_props, delete_props)
+
+        return ret
+
+
+
+    def create_or_update(self, uri=None, uid=None, props={}, **dstreams):
+        '''Updates an asset if it can be found, or creates a new one.
+
+        @sa AssetCtrl::PUT()
+
+        @return (tuple) Message with asset node information and a boolean
+            indicating whether a new asset was created.
+        '''
+
+        legacy_uid = props.get(nsc['aic'].legacyUid)
+        if isinstance(legacy_uid, list):
+            legacy_uid = legacy_uid[0] if legacy_uid else None
+
+        if not self.set_uri(uri, uid, legacy_uid):
+            # If no URI could be set from given parameters, create new node.
+            return self.create('', props, **dstreams), True
+        else:
+            # If a URI is found, update the node.
+            return self.update(props=props, **dstreams), False
+
+
+
     def replace_props(self, props):
         '''Replace the whole property set of a node.
 
@@ -316,14 +630,14 @@ class Asset(Resource):
 
         # If no URI is provided, check UID and legacy UID, in that order.
         if uid:
-            check_prop = nsc['aic'] + 'uid'
+            check_prop = nsc['aic'].uid
             check_uid = uid
             self.uid = uid
         else:
-            check_prop = nsc['aic'] + 'legacyUid'
+            check_prop = nsc['aic'].legacyUid
             check_uid = legacy_uid
 
-        check_uri = self.tsconn.get_node_uri_by_prop(check_prop, check_uid)
+        check_uri = self.find_uri_by_prop(check_prop, check_uid)
 
         if check_uri:
             self.uri = check_uri
@@ -347,21 +661,91 @@ class Asset(Resource):
             raise ValueError('Neither uid or legacy_uid were provided. Cannot check for duplicates.')
 
         if uid:
-            uri_uid = self.tsconn.find_node_uri_by_prop(nsc['aic'] + 'uid', uid)
-            if not self.uri == uri_uid:
+            uri_uid = self.find_uri_by_prop(nsc['aic'].uid, uid)
+            if uri_uid and not self.uri == uri_uid:
                 return {'uid' : uri_uid}
         if legacy_uid:
-            uri_legacy_uid = self.tsconn.get_node_uri_by_prop(nsc['aic'] + 'legacyUid', legacy_uid)
-            if not self.uri == uri_legacy_uid:
-                return {'legacy_uid' : uri_uid}
+            uri_legacy_uid = self.find_uri_by_prop(nsc['aic'].legacyUid, legacy_uid)
+            if uri_legacy_uid and not self.uri == uri_legacy_uid:
+                return {'legacy_uid' : uri_legacy_uid}
 
         return False
 
 
 
+    def _index_identifiers(self, props):
+        '''Add the identifiers of a newly created asset to the local index.
+
+        @param props (dict) Asset properties.
+
+        @return None
+        '''
+
+        index = get_index()
+        if not index:
+            return
+
+        rows = [(nsc['aic'].uid, '', self.uid, self.uri)]
+        for legacy_uid in props.get(nsc['aic'].legacyUid, []):
+            rows.append((nsc['aic'].legacyUid, '', legacy_uid, self.uri))
+        index.put_many(rows)
+
+
+
+    def _reindex_legacy_uids(self, insert_props, delete_props):
+        '''Update the legacy UIDs of the asset in the identifier index.
+
+        Deleted values are removed first, so that a stale mapping does not
+        cause false conflicts when assets are created.
+
+        @param insert_props (dict) Inserted properties.
+        @param delete_props (dict) Deleted properties. An empty string
+            deletes all values of a property.
+
+        @return None
+        '''
+
+        index = get_index()
+        prop = nsc['aic'].legacyUid
+        if not index:
+            return
+
+        deleted = delete_props.get(prop)
+        if deleted == '':
+            index.remove(prop, self.uri)
+        elif deleted:
+            index.remove(prop, self.uri,
+                    deleted if isinstance(deleted, list) else [deleted])
+
+        inserted = insert_props.get(prop) or []
+        if not isinstance(inserted, list):
+            inserted = [inserted]
+        index.put_many([(prop, '', v, self.uri) for v in inserted if v])
+
+
+
+    def _filter_legacy_uids(self, props):
+        '''Add the legacy UIDs being written to the legacy UID filter.
+
+        @param props (dict) Properties being written.
+
+        @return None
+        '''
+
+        legacy_uids = props.get(nsc['aic'].legacyUid) or []
+        if not isinstance(legacy_uids, list):
+            legacy_uids = [legacy_uids]
+        for legacy_uid in legacy_uids:
+            LegacyUidFilter.add(legacy_uid)
+
+
+
     def _generate_master(self, dstreams):
         '''Generates master datastream from original if missing and returns the complete list of datastreams.
 
+        Further renditions defined in the rendition profile are derived from
+        the master, unless they are provided.
+
         @param dstreams (dict) Dict of datastreams where keys are datastream names and values are datastreams.
 
         @return (dict) Updated list of datastreams.
@@ -386,10 +770,33 @@ class Asset(Resource):
         else:
             cherrypy.log('Master file provided.')
 
+        missing = [name for name in renditions if name != 'master' \
+                and name not in dstreams and 'ref_' + name not in dstreams]
+        if 'master' in dstreams.keys() and missing:
+            dstreams.update(self._generate_renditions(
+                self._get_iostream_from_req(dstreams['master']), missing
+            ))
+
         return dstreams
 
 
 
+    def _generate_renditions(self, master, names):
+        '''Derive smaller renditions from a master datastream.
+
+        Override this method for asset types which support renditions.
+
+        @param master (BytesIO) Master datastream.
+        @param names (list) Names of renditions to generate, as defined in
+            the rendition profile.
+
+        @return (dict) Rendition datastreams keyed by name.
+        '''
+
+        return {}
+
+
+
     def _validate_dstreams(self, dstreams):
         '''Ensures that provided datastreams are valid and conform to a set of conditions.
         This methiod is overridden for each asset type.
@@ -448,7 +855,11 @@ class Asset(Resource):
 
     def _ingest_instances(self, dstreams, dsmeta):
         '''Loops over datastreams and ingests them by
-            calling #_create_or_update_instance() iteratively within a transaction.
+            calling #_ingest_instance() in parallel within a transaction.
+
+        The asset node is linked to the new instances in a single update once
+        all instances are ingested, so that worker threads do not update the
+        same node concurrently.
 
         @param dstreams (dict) Dict of datastreams. Keys are datastream names and values are datastreams.
         @param dsmeta (dict) Dict of datastream metadata.
@@ -458,31 +869,69 @@ class Asset(Resource):
         '''
 
         cherrypy.log('DSmeta: {}'.format(dsmeta))
-        for dsname in dstreams.keys():
+        headers = current_headers()
+        with ThreadPoolExecutor(max_workers=ingest['workers']) as pool:
+            futures = [
+                pool.submit(self._ingest_instance,
+                    dsname, dstreams[dsname], dsmeta.get(dsname), headers)
+                for dsname in dstreams.keys()
+            ]
+            # Raise the first error, if any.
+            links = [f.result() for f in futures]
+
+        insert_props = {}
+        for rel_name, inst_uri in filter(None, links):
+            insert_props.setdefault(rel_name, []).append(inst_uri)
+        if insert_props:
+            self.update_node(self.temp_uri, {
+                'insert_props' : insert_props,
+                'init_insert_tuples' : [],
+            })
+
+        return True
+
+
+
+    def _ingest_instance(self, dsname, ds, meta, headers):
+        '''Ingest a single datastream as an instance of the Asset.
+
+        This method runs in a worker thread, so the request headers of the
+        calling thread are bound to it.
 
+        @param dsname (string) Datastream name.
+        @param ds Datastream, or reference URL if dsname starts with 'ref_'.
+        @param meta (dict) Datastream metadata from validation.
+        @param headers (dict) Request headers to bind.
+
+        @return (tuple | None) Relationship and URI linking the asset to the
+            instance, if it was created. @sa Instance::asset_link
+        '''
+
+        with request_context(headers):
+            inst = Instance()
             if dsname[:4] == 'ref_':
                 # Create a reference node.
                 in_dsname = dsname [4:]
                 cherrypy.log('Creating a reference ds with name: aic:ds_{}'.format(in_dsname))
-                inst_uri = Instance().create_or_update(
+                inst.create_or_update(
                     asset_uri = self.temp_uri,
                     name = in_dsname,
                     type = in_dsname.capitalize(),
-                    ref = dstreams[dsname]
+                    ref = ds,
+                    link_asset = False
                 )
             else:
-                in_dsname = dsname
-                #cherrypy.log('Ingestion round (' + in_dsname + '): class name: ' + dstreams[dsname].__class__.__name__)
+                #cherrypy.log('Ingestion round (' + dsname + '): class name: ' + ds.__class__.__name__)
                 # Create an actual datastream.
-                ds = self._get_iostream_from_req(dstreams[dsname])
+                ds = self._get_iostream_from_req(ds)
                 ds.seek(0)
-                inst_uri = Instance().create_or_update(
+                inst.create_or_update(
                     asset_uri = self.temp_uri,
-                    name = in_dsname,
-                    type = in_dsname.capitalize(),
+                    name = dsname,
+                    type = dsname.capitalize(),
                     ds = ds,
-                    mimetype = dsmeta[dsname]['mimetype']
+                    mimetype = meta['mimetype'],
+                    link_asset = False
                 )
 
-
-
+        return inst.asset_link
@@ -1,3 +1,4 @@
+import re
 import uuid
 
 import cherrypy
@@ -5,7 +6,9 @@ import requests
 
 from rdflib import URIRef, Literal, XSD
 
+from sspad.config.datasources import lake_rest_api
 from sspad.models.annotation import Annotation
+from sspad.modules.write_batcher import get_batcher
 from sspad.resources.rdf_lexicon import ns_collection as nsc
 
 
@@ -44,34 +47,62 @@ class Comment(Annotation):
 
 
 
+    ## Comments are linked from their subject.
+    subject_path = '^aic:hasComment'
+
+
     def list(self, subject, cat=None):
         '''Lists all comments for the given subject URI.
 
-        @param uri (string) Subject URI.
+        @param subject (string) Subject URI.
         @param cat (string, optional) Category name. If specified,
             only comments of the given category will be returned.
 
         @return list List of comment dicts.
         '''
 
-        pass
+        return self.list_many([subject], cat)[subject]
 
 
 
     def create(self, subject_uri, content, cat=None):
         '''Create a comment.
 
+        If group commit is enabled, the comment is created in a transaction
+        shared with concurrent writes, unless the subject URI is already
+        within a transaction. @sa WriteBatcher
+
         @sa CommentCtrl::POST()
 
         @return (dict) Message with new comment node information.
         '''
 
-        # Avoiding circular reference
-        from sspad.models.resource import Resource
-
         if not cat:
             cat = self.default_cat
 
+        batcher = get_batcher()
+        if batcher and not re.search(r'/tx:[^/]+/', subject_uri):
+            return batcher.submit(lambda tx_uri: self._tx_uri_to_notx_uri(
+                self._create(
+                    subject_uri.replace(lake_rest_api['base_url'], tx_uri + '/'),
+                    content, cat
+                )
+            ))
+
+        return self._create(subject_uri, content, cat)
+
+
+
+    def _create(self, subject_uri, content, cat):
+        '''Create a comment node and link it from its subject.
+
+        @param subject_uri (string) Subject URI, possibly within a transaction.
+        @param content (string) Comment text.
+        @param cat (string) Category name.
+
+        @return (string) Comment URI.
+        '''
+
         req_uri = '{}/{}/{}'.format(
             subject_uri, self.cont_name, uuid.uuid4()
         )
@@ -90,12 +121,21 @@ class Comment(Annotation):
         )
 
         # Add relationship to comment.
-        self.lconn.update_node_properties(
-            subject_uri,
-            insert_props=[(
-                URIRef(nsc['aic'].hasComment),
-                URIRef(comment_uri)
-            )],
-        )
+        try:
+            self.lconn.update_node_properties(
+                subject_uri,
+                insert_props=[(
+                    URIRef(nsc['aic'].hasComment),
+                    URIRef(comment_uri)
+                )],
+            )
+        except:
+            # Do not leave an orphan comment behind.
+            try:
+                self.delete_nodes([comment_uri])
+            except Exception as e:
+                cherrypy.log.error('Cannot delete orphan comment {}: {}'.format(
+                        comment_uri, e))
+            raise
 
         return comment_uri
@@ -6,11 +6,12 @@ import os
 import cherrypy
 import requests
 
-from rdflib import URIRef, Literal, XSD
+from rdflib import URIRef, Literal, Variable, XSD
 
 from sspad.config.datasources import lake_rest_api
 from sspad.connectors.uidminter_connector import UidminterConnector
 from sspad.models.resource import Resource
+from sspad.modules.file_io import file_digest
 from sspad.resources.rdf_lexicon import ns_collection as nsc, ns_mgr
 
 
@@ -26,6 +27,11 @@ class Instance(Resource):
     @date 12/29/2014
     '''
 
+    ## Relationship and URI linking the asset to the instance created by
+    #  the last call to #create() or #create_or_update(), or None.
+    asset_link = None
+
+
     @property
     def node_type(self):
         return nsc['laketype'].Instance
@@ -68,7 +74,8 @@ class Instance(Resource):
 
     def create(
             self, asset_uri, name, type='Instance', ref=None, file_name=None,
-            ds=None, path=None, mimetype='application/octet-stream'
+            ds=None, path=None, mimetype='application/octet-stream',
+            link_asset=True
             ):
         '''Create an instance.
 
@@ -83,6 +90,9 @@ class Instance(Resource):
         @param path (string, optional) Reference path for source file in current filesystem.
         @param mimetype (string, optional) MIME type of provided datastream.
                 Default is 'application/octet-stream'.
+        @param link_asset (boolean, optional) Whether to link the instance
+                from the asset node. If False, the link is stored in
+                #asset_link and must be written by the caller.
 
         @return (string) New instance URI.
 
@@ -95,17 +105,19 @@ class Instance(Resource):
             raise cherrypy.HTTPError('409 Conflict', 'Node with URI {} already exists.'\
                     .format(self.uri))
 
-        self._create_container(asset_uri, name, type)
+        self._create_container(asset_uri, name, type, link_asset)
 
         self._create_or_update_content(
-                name, ref, file_name, ds, path, mimetype
+                os.path.basename(asset_uri), name, ref, file_name, ds, path,
+                mimetype
                 )
 
 
 
     def create_or_update(
             self, asset_uri, name, type='Instance', ref=None, file_name=None,
-            ds=None, path=None, mimetype='application/octet-stream'
+            ds=None, path=None, mimetype='application/octet-stream',
+            link_asset=True
             ):
         '''Update an instance or creates it if not existing.
 
@@ -117,23 +129,27 @@ class Instance(Resource):
         cherrypy.log('Updating instance \'{}\' of Asset {}'.format(name, asset_uri))
         self.uri = '{}/{}/{}'.format(asset_uri, self.inst_path, name)
 
-        if not self.lconn.assert_node_exists(self.uri):
-            self._create_container(asset_uri, name, type)
+        exists = self.lconn.assert_node_exists(self.uri)
+        if not exists:
+            self._create_container(asset_uri, name, type, link_asset)
 
         self._create_or_update_content(
-                os.path.basename(asset_uri), name, ref, file_name, ds, path, mimetype
+                os.path.basename(asset_uri), name, ref, file_name, ds, path,
+                mimetype, replace_digest=exists
                 )
 
 
 
     # # # PRIVATE METHODS # # #
 
-    def _create_container(self, asset_uri, name, type):
+    def _create_container(self, asset_uri, name, type, link_asset=True):
         '''Create the instance container.
 
         @param asset_uri (string) URI of the container Asset node for the instance.
         @param name (string) Name of the datastream, e.g. 'master' or 'source'.
         @param type (string) The instance type. It corresponds to a RDF type.
+        @param link_asset (boolean, optional) Whether to link the instance
+            from the asset node, or only set #asset_link.
         '''
 
         # Avoid circular dependencies.
@@ -162,6 +178,10 @@ class Instance(Resource):
         )
         #cherrypy.log('Created instance: {}'.format(self.uri))
 
+        self.asset_link = (rel_name, self.uri)
+        if not link_asset:
+            return
+
         return Asset().update_node(
             uri = asset_uri,
             props = {
@@ -174,10 +194,17 @@ class Instance(Resource):
 
 
     def _create_or_update_content(
-            self, asset_uid, name, ref, file_name, ds, path, mimetype
+            self, asset_uid, name, ref, file_name, ds, path, mimetype,
+            replace_digest=False
             ):
         '''Create or replace content datastream.
 
+        The SHA-1 digest of an uploaded datastream is sent to LAKE for
+        verification and recorded in the instance node, so that fixity can
+        be audited without reading the datastream again. The digest is not
+        computed for reference datastreams, and a digest recorded for
+        previous content is removed.
+
         @param name (string) Name of the datastream, e.g. 'master' or 'original'.
         @param ref (string, optional) Reference URI for remote source.
         @param file_name (string, optional) File name for the downloaded datastream.
@@ -186,6 +213,8 @@ class Instance(Resource):
         @param path (string, optional) Reference path for source file in current filesystem.
         @param mimetype (string, optional) MIME type of provided datastream.
                 Default is 'application/octet-stream'.
+        @param replace_digest (boolean, optional) Whether a digest may have
+                been recorded for previous content.
 
         @return (string) instance content URI.
         '''
@@ -199,13 +228,50 @@ class Instance(Resource):
             content_uri = self.lconn.create_or_update_ref_datastream(
                 uri = self.uri + '/aic:content', ref = ref
             )
+            # The digest of previous content does not apply to the reference.
+            if replace_digest:
+                self._record_digest(None, True)
         else:
+            if ds:
+                digest = file_digest(ds)
+            else:
+                with open(path, 'rb') as fh:
+                    digest = file_digest(fh)
             content_uri = self.lconn.create_or_update_datastream(
                 uri = self.uri + '/aic:content',
-                file_name=file_name, ds=ds, path=path, mimetype=mimetype
+                file_name=file_name, ds=ds, path=path, mimetype=mimetype,
+                digest=digest
             )
+            self._record_digest(digest, replace_digest)
 
         # Add relationship in parent node.
 
         return content_uri
 
+
+
+    def _record_digest(self, digest, replace=False):
+        '''Record the SHA-1 digest of the instance content.
+
+        The digest is stored as a URN, as LAKE does for its own checksums.
+
+        @param digest (string | None) Hexadecimal SHA-1 digest. If None,
+            no digest is recorded.
+        @param replace (boolean, optional) Whether to remove a previously
+            recorded digest.
+
+        @return None
+        '''
+
+        prop = nsc['premis'].hasMessageDigest
+        if replace:
+            self.lconn.update_node_properties(
+                self.uri,
+                delete_props = [(prop, Variable('digest'))],
+                where_props = [(prop, Variable('digest'))]
+            )
+        if digest:
+            self.lconn.update_node_properties(
+                self.uri,
+                insert_props = [(prop, URIRef('urn:sha1:' + digest))]
+            )
@@ -11,6 +11,9 @@ from sspad.config.datasources import lake_rest_api
 from sspad.connectors.datagrinder_connector import DatagrinderConnector
 from sspad.connectors.lake_connector import LakeConnector
 from sspad.connectors.tstore_connector import TstoreConnector
+from sspad.modules.id_index import get_index
+from sspad.modules.rel_resolver import RelResolver
+from sspad.modules.write_batcher import get_batcher
 from sspad.resources.rdf_lexicon import ns_collection as nsc
 
 
@@ -69,10 +72,12 @@ class SspadModel(metaclass=ABCMeta):
         Dict keys correspond to keys in SspadModel::props.
         Values are dicts containing the following keys:
             - 'type' is a rdf:type that uniquely identifies the group of nodes searched.
-            - 'uid' is the property name of the external identifier that should be unique
+            - 'uid' is the property URI of the external identifier that should be unique
                 within the 'type' parameter above.
             - 'rel' is the name of the actual relationship that is created.
 
+        All identifiers in a request are resolved at once. @sa RelResolver
+
         @return dict
         '''
 
@@ -213,9 +218,10 @@ class SspadModel(metaclass=ABCMeta):
         delete_nodes, insert_nodes = tuples['nodes']
         delete_tuples, insert_tuples, where_tuples = tuples['tuples']
 
-        for node_type in delete_nodes.keys():
-            for del_uri in delete_nodes[node_type]:
-                self.lconn.delete_node(del_uri)
+        # Related nodes are deleted in the same transaction as the node.
+        self.delete_nodes([self._uri_in_tx_of(del_uri, uri) \
+                for node_type in delete_nodes.keys() \
+                for del_uri in delete_nodes[node_type]])
 
         for node_type in insert_nodes.keys():
             insert_tuples += self._insert_nodes_in_tuples(
@@ -230,9 +236,37 @@ class SspadModel(metaclass=ABCMeta):
 
 
 
+    def delete_nodes(self, uris):
+        '''Delete nodes concurrently, along with their tombstones.
+
+        Deleted nodes are removed from the identifier index right away, so
+        that lookups fall back to the triplestore until the deletion is
+        committed, if it is made in a transaction.
+
+        @param uris (list) Node URIs, possibly within a transaction.
+
+        @return None
+        '''
+
+        uris = [str(u) for u in uris]
+        if not uris:
+            return
+
+        self.lconn.delete_nodes(uris)
+
+        index = get_index()
+        if index:
+            for uri in uris:
+                index.remove_uri(self._tx_uri_to_notx_uri(uri))
+
+
+
     def patch(self, insert_props={}, delete_props={}):
         '''Adds or removes properties and mixins in a node.
 
+        If group commit is enabled, the update is applied in a transaction
+        shared with concurrent updates. @sa WriteBatcher
+
         @param uid (string) Node UID.
         @param insert_props (dict) Properties to be inserted.
         @param delete_props (dict) Properties to be deleted.
@@ -243,23 +277,25 @@ class SspadModel(metaclass=ABCMeta):
         #cherrypy.log('Insert props:' + str(insert_props))
         #cherrypy.log('Delete props:' + str(delete_props))
 
+        batcher = get_batcher()
+        if batcher:
+            def op(tx_uri):
+                try:
+                    return self._patch_in_tx(tx_uri, insert_props, delete_props)
+                finally:
+                    # The batcher commits or rolls back the transaction.
+                    self.tx_uri, self.uri_in_tx = (None, None)
+
+            return batcher.submit(op)
+
         # Open Fedora transaction
         self.tx_uri = self.lconn.open_transaction()
-        self.uri_in_tx = self.uri.replace(
-                lake_rest_api['base_url'], self.tx_uri + '/')
 
         # Collect properties
         try:
-            self.update_node(
-                self.temp_uri,
-                props = {
-                    'insert_props' : insert_props,
-                    'delete_props' : delete_props,
-                    'init_insert_tuples' : [],
-                }
-            )
+            self._patch_in_tx(self.tx_uri, insert_props, delete_props)
         except:
-            self._rollback_tansaction()
+            self._rollback_transaction()
             raise
 
         self._commit_transaction()
@@ -268,6 +304,35 @@ class SspadModel(metaclass=ABCMeta):
 
 
 
+    def _patch_in_tx(self, tx_uri, insert_props, delete_props):
+        '''Adds or removes properties and mixins in a node within an open
+        transaction.
+
+        @param tx_uri (string) Transaction URI.
+        @param insert_props (dict) Properties to be inserted.
+        @param delete_props (dict) Properties to be deleted.
+
+        @return (boolean) True.
+        '''
+
+        # Related nodes, e.g. comments, are created within the transaction
+        # from #temp_uri.
+        self.tx_uri = tx_uri
+        self.uri_in_tx = self.uri.replace(
+                lake_rest_api['base_url'], tx_uri + '/')
+        self.update_node(
+            self.temp_uri,
+            props = {
+                'insert_props' : insert_props,
+                'delete_props' : delete_props,
+                'init_insert_tuples' : [],
+            }
+        )
+
+        return True
+
+
+
     def convert_req_propnames(self, props):
         '''Converts all property names passed in request as
         namespaced string to fully-qualified URIRefs.'''
@@ -281,8 +346,57 @@ class SspadModel(metaclass=ABCMeta):
 
 
 
+    def find_uri_by_prop(self, prop, value, tstore=True):
+        '''Find a node URI by a unique identifier property.
+
+        The local identifier index is consulted first, then the
+        triplestore. URIs found in the triplestore are added to the index.
+
+        @param prop (rdflib.URIRef) Identifier property, e.g. aic:uid.
+        @param value (string) Identifier value.
+        @param tstore (boolean, optional) Whether to query the triplestore
+            if the value is not in the index.
+
+        @return (string | boolean) Node URI, or False if not found.
+        '''
+
+        index = get_index()
+        if index:
+            uri = index.get(prop, value)
+            if uri:
+                return uri
+
+        if not tstore:
+            return False
+
+        uri = self.tsconn.get_node_uri_by_prop(prop, value)
+        if uri and index:
+            index.put(prop, value, uri)
+
+        return uri
+
+
+
     ## PRIVATE METHODS ##
 
+    def _uri_in_tx_of(self, uri, ref_uri):
+        '''Map a URI into the transaction that another URI is in.
+
+        @param uri (string) URI outside of any transaction.
+        @param ref_uri (string) URI possibly within a transaction.
+
+        @return (string) @p uri within the transaction of @p ref_uri, or
+            @p uri unchanged if @p ref_uri is not in a transaction.
+        '''
+
+        m = re.search(r'/tx:[^\/]+/', ref_uri)
+        if not m or m.group(0) in uri:
+            return uri
+
+        return uri.replace(lake_rest_api['base_url'], ref_uri[:m.end()], 1)
+
+
+
     def _tx_uri_to_notx_uri(self, tx_uri):
         '''Converts node URI inside transaction to URI outside transaction.'''
 
@@ -318,9 +432,9 @@ class SspadModel(metaclass=ABCMeta):
             @param init_insert_tuples (list, optional) Initial properties
             coming from default settings, already formatted as tuples.
             @param ignore_broken_rels (boolean, optional) If set to True
-            (default), the application throws an exception if a realtionship
-            with a CITI object is broken.
-            If False, the property is skipped and the process goes forward.
+            (default), a relationship with a CITI object that cannot be
+            found is skipped and the process goes forward.
+            If False, the application throws an exception.
             WARNING: DO NOT SET TO TRUE IN PRODUCTION ENVIRONMENT!
 
             @return (dict) Dict containing two elements:
@@ -332,10 +446,13 @@ class SspadModel(metaclass=ABCMeta):
 
         cherrypy.log('Insert props received: {}.'.format(insert_props))
         #cherrypy.log('Self props: {}.'.format(self.props))
-        insert_tuples = init_insert_tuples
+        insert_tuples = list(init_insert_tuples)
         delete_tuples, where_tuples = ([],[])
         insert_nodes, delete_nodes = ({},{})
 
+        # Resolve all relationships given by external identifiers at once.
+        rel_uris = self._resolve_special_rels(insert_props)
+
         for ns_prop in self.ns_props:
             #cherrypy.log('Converting to fq prop: {}'.format(ns_prop))
             prop = (self._build_fquri_from_prefixed(ns_prop[0]), ns_prop[1], \
@@ -349,9 +466,10 @@ class SspadModel(metaclass=ABCMeta):
                     # Delete one or more values from property
                     for value in delete_props[prop_name]:
                         if prop_name == nsc['aic'].hasComment:
-                            delete_nodes['comments'] = value
+                            delete_nodes.setdefault('comments', []).append(value)
                         delete_tuples.append(
-                                (prop, self._build_rdf_object(value, prop[1])))
+                                (prop_name, self._build_rdf_object(
+                                    value, prop[1], prop[2])))
 
                 elif delete_props[prop_name] == '':
                     # Delete the whole property
@@ -368,23 +486,21 @@ class SspadModel(metaclass=ABCMeta):
                         continue
 
                     # Check if property is a relationship
-                    #if prop_name in self.special_rels.keys():
-                    #    rel_type = self.special_rels[prop_name]
-                    #    ref_uri = self.tsconn.get_node_uri_by_props({
-                    #        (nsc['rdf'].type, URIRef(rel_type['rel'])),
-                    #    })
-                    #    if not ref_uri:
-                    #        if ignore_broken_rels:
-                    #            continue
-                    #        else:
-                    #            raise cherrypy.HTTPError(
-                    #                '404 Not Found',
-                    #                '''Referenced CITI resource with
-                    #                CITI Pkey {} does not exist. Cannot
-                    #                create relationship.
-                    #                '''.format(value)
-                    #            )
-                    #    value = ref_uri
+                    if prop_name in self.special_rels.keys():
+                        rel_type = self.special_rels[prop_name]
+                        ref_uri = rel_uris.get(self._special_rel_key(
+                                prop_name, value))
+                        if ref_uri:
+                            insert_tuples.append(
+                                    (rel_type['rel'], URIRef(ref_uri)))
+                        elif not ignore_broken_rels:
+                            raise cherrypy.HTTPError(
+                                '404 Not Found',
+                                '''Referenced CITI resource with
+                                CITI Pkey {} does not exist. Cannot
+                                create relationship.
+                                '''.format(value)
+                            )
                     if prop_name == nsc['aic'].hasTag:
                         insert_nodes['tags'] = insert_props[prop_name]
                         #value = lake_rest_api['tags_base_url'] + value
@@ -406,6 +522,42 @@ class SspadModel(metaclass=ABCMeta):
         }
 
 
+    def _special_rel_key(self, prop_name, value):
+        '''Build the key used to resolve an external identifier.
+
+        @param prop_name (rdflib.URIRef) Property listed in #special_rels.
+        @param value (string) External identifier.
+
+        @return (tuple) Key. @sa RelResolver
+        '''
+
+        rel_type = self.special_rels[prop_name]
+        return (
+            URIRef(rel_type['type']),
+            URIRef(rel_type['uid']),
+            Literal(value, datatype=XSD.string)
+        )
+
+
+
+    def _resolve_special_rels(self, insert_props):
+        '''Resolve all external identifiers in a set of properties with
+        a single lookup.
+
+        @param insert_props (dict) Properties to be inserted.
+
+        @return (dict) Node URIs keyed by #_special_rel_key().
+        '''
+
+        keys = [self._special_rel_key(prop_name, value) \
+                for prop_name in self.special_rels.keys() \
+                if prop_name in insert_props \
+                for value in insert_props[prop_name] if value]
+
+        return RelResolver(self.tsconn).resolve(keys) if keys else {}
+
+
+
     def _build_rdf_object(self, value, type, datatype=None):
         '''Returns an RDF object from a value and a type.
 
@@ -473,6 +625,46 @@ class SspadModel(metaclass=ABCMeta):
 
 
 
+    def _build_prefixed_from_fquri(self, uri):
+        '''Shorten a fully qualified URI to a namespace prefixed name.
+
+        The longest matching namespace is used. URIs not in any known
+        namespace are returned unchanged.
+
+        @param uri (string) The fully qualified URI.
+
+        @return string
+        '''
+
+        uri = str(uri)
+        match = max([p for p in nsc if uri.startswith(str(nsc[p]))],
+                key=lambda p: len(str(nsc[p])), default=None)
+
+        return '{}:{}'.format(match, uri[len(str(nsc[match])):]) \
+                if match else uri
+
+
+
+    def _node_props(self, g, uri):
+        '''Collect the properties of a node from a graph.
+
+        @param g (rdflib.Graph) Graph containing the node.
+        @param uri (string) Node URI.
+
+        @return (dict) Lists of values as strings, keyed by namespace
+            prefixed property names.
+        '''
+
+        ret = {}
+        for p, o in sorted(g.predicate_objects(URIRef(uri))):
+            ret.setdefault(self._build_prefixed_from_fquri(p), []).append(
+                    self._build_prefixed_from_fquri(o) \
+                    if p == nsc['rdf'].type else str(o))
+
+        return ret
+
+
+
     def _open_transaction(self):
         '''Opens a transaction in LAKE and sets the #tx_uri property.
 
@@ -1,9 +1,12 @@
+import io
+
 import cherrypy
 
 from rdflib import XSD
 from wand import image
 
 from sspad.config.datasources import lake_rest_api, datagrinder_rest_api
+from sspad.config.local import renditions
 from sspad.models.asset import Asset
 from sspad.resources.rdf_lexicon import ns_collection as nsc
 
@@ -50,8 +53,32 @@ class StaticImage(Asset):
 
         @return (BytesIO) master file.
         '''
-        # @TODO put these values in constants
-        ret = self.dgconn.resizeImageFromData(file, fname, 4096, 4096)
+        size = renditions['master']
+        ret = self.dgconn.resizeImageFromData(file, fname, size, size)
+        return ret
+
+
+
+    def _generate_renditions(self, master, names):
+        '''Derive smaller renditions from the master image.
+
+        The master is decoded once and downscaled successively from the
+        largest to the smallest rendition, so that each step works on the
+        output of the previous one.
+
+        @sa Asset::_generate_renditions()
+        '''
+
+        ret = {}
+        master.seek(0)
+        with image.Image(file=master) as img:
+            for name in sorted(names, key=lambda n: renditions[n], reverse=True):
+                size = renditions[name]
+                img.transform(resize='{0}x{0}>'.format(size))
+                ret[name] = io.BytesIO(img.make_blob('jpeg'))
+                cherrypy.log('Generated rendition {}: {}.'.format(name, img.size))
+        master.seek(0)
+
         return ret
 
 
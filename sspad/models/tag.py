@@ -6,6 +6,7 @@ from rdflib import URIRef, Literal, XSD
 
 from sspad.models.sspad_model import SspadModel
 from sspad.models.tag_cat import TagCat
+from sspad.modules.sparql_templates import register
 from sspad.resources.rdf_lexicon import ns_collection as nsc
 
 
@@ -36,6 +37,30 @@ class Tag(SspadModel):
 
 
 
+    ## Query templates.
+
+    _q_list = register('tag.list', '''
+        SELECT ?uri ?label ?cat WHERE {
+            ?uri a $type .
+            ?uri skos:prefLabel ?label .
+            ?uri fcrepo:hasParent ?cat .
+            ?cat a laketype:TagCat .
+        }
+        ''')
+
+    _q_list_by_cat = register('tag.list_by_cat', '''
+        SELECT ?uri ?label ?cat WHERE {
+            ?uri a $type .
+            ?uri skos:prefLabel ?label .
+            ?uri fcrepo:hasParent ?cat .
+            ?cat a laketype:TagCat .
+            ?cat skos:prefLabel ?cl .
+            FILTER(STR(?cl)=$cat_label) .
+        }
+        ''')
+
+
+
     def list(self, cat_label=None):
         '''Lists all tags, optionally narrowing down the selection to
         a category.
@@ -44,34 +69,17 @@ class Tag(SspadModel):
             a list of all tags is returned. Otherwise, a list of all tags for
             the category bearing that label is returned.
 
-        @return (list) List of dicts containing tag URI, label
+        @return (generator) Dicts containing tag URI, label
         and category URI.
         '''
 
-        cat_cond = '''
-        ?cat <{}> ?cl .
-        FILTER(STR(?cl="{}")) .
-        '''.format(nsc['skos'].prefLabel, cat_label) \
-                if cat_label \
-                else ''
-
-        q = '''
-        SELECT ?uri ?label ?cat WHERE {{
-            ?uri a <{}> .
-            ?uri <{}> ?label .
-            ?uri <{}> ?cat .
-            ?cat a <{}> .
-            {} }}
-        '''.format(
-            self.node_type,
-            nsc['skos'].prefLabel,
-            nsc['fcrepo'].hasParent,
-            nsc['laketype'].TagCat, cat_cond
-        )
-        res = self.tsconn.query(q)
-        cherrypy.log('Res: {}'.format(res))
+        if cat_label:
+            q = self._q_list_by_cat.render(
+                    type=self.node_type, cat_label=cat_label)
+        else:
+            q = self._q_list.render(type=self.node_type)
 
-        return res
+        return self.tsconn.query_iter(q)
 
 
     def get_uri(self, label, cat_uri):
@@ -6,6 +6,7 @@ from rdflib import URIRef, Literal, XSD
 
 from sspad.config.datasources import lake_rest_api
 from sspad.models.sspad_model import SspadModel
+from sspad.modules.sparql_templates import register
 from sspad.resources.rdf_lexicon import ns_collection as nsc
 
 
@@ -47,6 +48,17 @@ class TagCat(SspadModel):
 
 
 
+    ## Query templates.
+
+    _q_list = register('tag_cat.list', '''
+        SELECT ?cat ?label WHERE {
+            ?cat a $type .
+            ?cat skos:prefLabel ?label .
+        }
+        ''')
+
+
+
     def get_uri(self, label):
         '''Return the URI of a category by label.
 
@@ -66,22 +78,12 @@ class TagCat(SspadModel):
     def list(self):
         '''Lists all categories and their labels.
 
-        @return (list) List of all category URIs.
+        @return (generator) Dicts of category URIs and labels.
         '''
 
-        q = '''
-        SELECT ?cat ?label WHERE {{
-            ?cat a <{}> .
-            ?cat <{}> ?label .
-        }}
-        '''.format(
-            self.node_type,
-            nsc['skos'].prefLabel,
-        )
-        res = self.tsconn.query(q)
-        #cherrypy.log('Res: {}'.format(res))
+        q = self._q_list.render(type=self.node_type)
 
-        return res
+        return self.tsconn.query_iter(q)
 
 
     def assert_exists(self, label):
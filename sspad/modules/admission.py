@@ -0,0 +1,216 @@
+import threading
+import time
+
+import cherrypy
+
+from PIL import Image
+
+from sspad.config.local import admission as admission_conf, renditions
+from sspad.modules.metrics import Metrics
+
+
+## Raised by PIL for images over its pixel limit (Pillow >= 5.0). Older
+#  versions only warn, and nothing is caught.
+_DecompressionBombError = getattr(Image, 'DecompressionBombError', ())
+
+
+class AdmissionController():
+    '''@package sspad.modules
+
+    Memory-budget admission controller.
+
+    Requests reserve an estimated amount of memory before their body is
+    read and release it when they end. When the budget is used up, new
+    requests wait for memory to be released and are eventually rejected.
+    '''
+
+    def __init__(self, budget, timeout, retry_after):
+        '''Class constructor.
+
+        @param budget (int) Memory budget in bytes.
+        @param timeout (float) Maximum wait time in seconds.
+        @param retry_after (int) Seconds suggested to rejected clients.
+
+        @return None
+        '''
+
+        self.budget = budget
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.in_use = 0
+        self.waiting = 0
+        self.admitted, self.rejected = (0, 0)
+        self._cond = threading.Condition()
+
+
+
+    def acquire(self, cost):
+        '''Reserve memory, waiting if necessary.
+
+        A request costing more than the whole budget is admitted once no
+        other reservation is held.
+
+        @param cost (int) Memory to reserve, in bytes.
+
+        @return (int) Memory actually reserved.
+
+        @throw cherrypy.HTTPError 503 if no memory is freed in time.
+        '''
+
+        return self.acquire_more(0, cost)
+
+
+
+    def acquire_more(self, held, extra):
+        '''Extend a reservation, waiting if necessary.
+
+        The reservation held by the caller counts towards its own total, so
+        that a request does not wait for itself: the total is capped at the
+        budget, and is admitted once no other reservation is held.
+
+        @param held (int) Memory already reserved by the caller.
+        @param extra (int) Additional memory to reserve, in bytes.
+
+        @return (int) Additional memory actually reserved.
+
+        @throw cherrypy.HTTPError 503 if no memory is freed in time.
+        '''
+
+        total = min(held + extra, self.budget)
+        deadline = time.time() + self.timeout
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.in_use - held + total > self.budget:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        cherrypy.response.headers['Retry-After'] = \
+                                str(self.retry_after)
+                        raise cherrypy.HTTPError(
+                            '503 Service Unavailable',
+                            'Server is busy with other ingests. Please retry later.'
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+            self.in_use += total - held
+            if not held:
+                self.admitted += 1
+
+        return total - held
+
+
+
+    def release(self, cost):
+        '''Release reserved memory.
+
+        @param cost (int) Memory to release, as returned by #acquire().
+
+        @return None
+        '''
+
+        with self._cond:
+            self.in_use -= cost
+            self._cond.notify_all()
+
+
+
+    def stats(self):
+        '''Admission metrics.
+
+        @return dict
+        '''
+
+        with self._cond:
+            return {
+                'budget' : self.budget,
+                'in_use' : self.in_use,
+                'waiting' : self.waiting,
+                'admitted' : self.admitted,
+                'rejected' : self.rejected,
+            }
+
+
+
+_controller = AdmissionController(
+    admission_conf['budget'],
+    admission_conf['timeout'],
+    admission_conf['retry_after']
+)
+if admission_conf['enabled']:
+    Metrics.register('admission', _controller.stats)
+
+
+def _raster_size(w, h):
+    '''Decoded size of an RGBA image in bytes.'''
+
+    return w * h * 4
+
+
+
+def _admit():
+    '''Reserve memory for a request before its body is read.
+
+    Only requests with bodies are charged; reads bypass admission.
+    '''
+
+    req = cherrypy.request
+    if not admission_conf['enabled'] \
+            or req.method not in req.methods_with_bodies:
+        return
+
+    length = int(req.headers.get('Content-Length') or 0)
+    cost = int(length * admission_conf['body_factor']) \
+            + _raster_size(renditions['master'], renditions['master'])
+
+    req.admission_cost = _controller.acquire(cost)
+    req.hooks.attach('on_end_request', _release)
+    cherrypy.log('Admitted request with estimated cost: {}'.format(cost))
+
+
+
+def _admit_image():
+    '''Reserve additional memory once image dimensions are known.
+
+    The image header of uploaded datastreams is read without decoding the
+    image. If the decoded size exceeds the initial estimate, the difference
+    is reserved as well.
+    '''
+
+    req = cherrypy.request
+    if not hasattr(req, 'admission_cost'):
+        return
+
+    decoded = 0
+    for part in req.params.values():
+        if not hasattr(part, 'file'):
+            continue
+        try:
+            part.file.seek(0)
+            decoded = max(decoded, _raster_size(*Image.open(part.file).size))
+        except _DecompressionBombError:
+            # Too large for PIL to open: reserve the whole budget.
+            decoded = max(decoded, _controller.budget)
+        except Exception:
+            # Not an image, or a format unknown to PIL.
+            pass
+        finally:
+            part.file.seek(0)
+
+    extra = decoded - _raster_size(renditions['master'], renditions['master'])
+    if extra > 0:
+        req.admission_cost += _controller.acquire_more(req.admission_cost, extra)
+
+
+
+def _release():
+    '''Release memory reserved by the current request.'''
+
+    _controller.release(cherrypy.request.admission_cost)
+
+
+
+cherrypy.tools.admission = cherrypy.Tool('before_request_body', _admit)
+cherrypy.tools.admission_image = cherrypy.Tool('before_handler', _admit_image)
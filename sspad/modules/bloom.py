@@ -0,0 +1,290 @@
+import collections
+import hashlib
+import math
+import threading
+import time
+
+import cherrypy
+
+from cherrypy.process import plugins
+
+from sspad.config.local import legacy_uid_filter as filter_conf
+from sspad.modules.metrics import Metrics
+from sspad.modules.request_context import request_context
+from sspad.modules.sparql_templates import register
+
+
+class BloomFilter():
+    '''@package sspad.modules
+
+    Bloom filter of strings.
+
+    Membership tests may return false positives at a rate depending on
+    the capacity and on the number of items added, but never false
+    negatives.
+    '''
+
+    def __init__(self, capacity, error_rate=0.001):
+        '''Class constructor.
+
+        The filter is sized to keep the false positive rate at
+        @p error_rate when @p capacity items are added.
+
+        @param capacity (int) Expected number of items.
+        @param error_rate (float, optional) Target false positive rate.
+
+        @return None
+        '''
+
+        capacity = max(capacity, 1)
+        self.num_bits = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.num_hashes = max(int(round(self.num_bits / capacity * math.log(2))), 1)
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+
+
+    def add(self, item):
+        '''Add an item.
+
+        @param item (string) Item.
+
+        @return None
+        '''
+
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+
+
+    def __contains__(self, item):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) \
+                for pos in self._positions(item))
+
+
+
+    @property
+    def memory(self):
+        '''Size of the bit array in bytes.
+
+        @return int
+        '''
+
+        return len(self._bits)
+
+
+
+    @property
+    def error_rate(self):
+        '''Estimated false positive rate for the current number of items.
+
+        @return float
+        '''
+
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) \
+                ** self.num_hashes
+
+
+
+    def _positions(self, item):
+        '''Bit positions of an item, by double hashing.'''
+
+        digest = hashlib.sha256(item.encode('utf-8')).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:16], 'little') | 1
+
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+
+
+class LegacyUidFilter():
+    '''@package sspad.modules
+
+    Set of all known legacy UIDs, used to skip duplicate checks in the
+    triplestore for legacy UIDs which are certainly new.
+
+    The filter is rebuilt from the triplestore periodically. Legacy UIDs
+    written in the meantime are added as they are written. Since the
+    triplestore may index writes with a delay, legacy UIDs added within a
+    refresh interval before a rebuild are carried over to the new filter.
+    '''
+
+    _filter = None
+    ## Recently added legacy UIDs, as (time, legacy UID) tuples.
+    _recent = collections.deque()
+    _lock = threading.Lock()
+    skipped = 0
+    last_build, build_time = (None, None)
+
+    _q_legacy_uids = register('legacy_uid_filter.build', '''
+        SELECT ?v WHERE {
+            ?u aic:legacyUid ?v .
+        }
+        ''')
+
+
+    @classmethod
+    def definitely_new(cls, legacy_uid):
+        '''Check whether a legacy UID is certainly not used by any node.
+
+        @param legacy_uid (string) Legacy UID.
+
+        @return (boolean) True if the legacy UID is not in the filter;
+            False if it may be in use, or if the filter is not built yet.
+        '''
+
+        f = cls._filter
+        if f is None or legacy_uid in f:
+            return False
+
+        with cls._lock:
+            cls.skipped += 1
+        return True
+
+
+
+    @classmethod
+    def add(cls, legacy_uid):
+        '''Add a legacy UID written to a node.
+
+        @param legacy_uid (string) Legacy UID.
+
+        @return None
+        '''
+
+        now = time.time()
+        with cls._lock:
+            if cls._filter is not None:
+                cls._filter.add(legacy_uid)
+            cls._recent.append((now, legacy_uid))
+            # Entries older than two intervals cannot be needed by a build.
+            cls._prune(now - 2 * filter_conf['refresh_interval'])
+
+
+
+    @classmethod
+    def build(cls, tsconn):
+        '''Build a new filter from the triplestore and replace the current one.
+
+        The filter is sized for twice the larger of the configured capacity
+        and the number of legacy UIDs found in the previous build.
+
+        @param tsconn (TstoreConnector) Triplestore connection.
+
+        @return None
+        '''
+
+        start = time.time()
+        with cls._lock:
+            prev_count = cls._filter.count if cls._filter else 0
+
+        f = BloomFilter(
+            max(filter_conf['capacity'], prev_count * 2),
+            filter_conf['error_rate']
+        )
+        for row in tsconn.query_iter(cls._q_legacy_uids.render()):
+            f.add(row['v'])
+
+        with cls._lock:
+            # Carry over legacy UIDs added during the build, and shortly
+            # before it in case the triplestore has not indexed them yet.
+            cls._prune(start - filter_conf['refresh_interval'])
+            for t, legacy_uid in cls._recent:
+                f.add(legacy_uid)
+            cls._filter = f
+            cls.last_build = time.time()
+            cls.build_time = cls.last_build - start
+
+        cherrypy.log('Built legacy UID filter with {} items in {:.1f}s.'.format(
+                f.count, cls.build_time))
+
+
+
+    @classmethod
+    def _prune(cls, before):
+        '''Drop recent additions older than a time. Call with the lock held.
+
+        @param before (float) Timestamp.
+
+        @return None
+        '''
+
+        while cls._recent and cls._recent[0][0] < before:
+            cls._recent.popleft()
+
+
+
+    @classmethod
+    def stats(cls):
+        '''Filter metrics.
+
+        @return dict
+        '''
+
+        f = cls._filter
+        return {
+            'ready' : f is not None,
+            'items' : f.count if f else 0,
+            'memory' : f.memory if f else 0,
+            'hashes' : f.num_hashes if f else 0,
+            'error_rate' : f.error_rate if f else None,
+            'skipped_checks' : cls.skipped,
+            'last_build' : cls.last_build,
+            'build_time' : cls.build_time,
+        }
+
+
+
+class LegacyUidFilterPlugin(plugins.SimplePlugin):
+    '''@package sspad.modules
+
+    Builds the legacy UID filter when the server starts and rebuilds it
+    at a configured interval.
+    '''
+
+    def __init__(self, bus, interval, auth=None):
+        plugins.SimplePlugin.__init__(self, bus)
+        self.interval = interval
+        self.auth = auth
+        self._thread = None
+        self._stop = threading.Event()
+
+
+
+    def start(self):
+        '''Start the build thread.'''
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+                target=self._run, name='sspad-legacy-uid-filter')
+        self._thread.daemon = True
+        self._thread.start()
+
+
+
+    def stop(self):
+        '''Stop the build thread.'''
+
+        self._stop.set()
+
+
+
+    def _run(self):
+        '''Build loop.'''
+
+        # Avoid circular dependencies.
+        from sspad.connectors.tstore_connector import TstoreConnector
+
+        while not self._stop.is_set():
+            try:
+                with request_context({'Authorization' : self.auth}):
+                    LegacyUidFilter.build(TstoreConnector())
+            except Exception as e:
+                self.bus.log('Building legacy UID filter failed: {}'.format(e))
+            self._stop.wait(self.interval)
+
+
+
+if filter_conf['enabled']:
+    Metrics.register('legacy_uid_filter', LegacyUidFilter.stats)
@@ -0,0 +1,110 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class TtlCache():
+    '''@package sspad.modules
+
+    In-memory cache with a time-to-live and a maximum number of entries.
+
+    Entries expire after a fixed time. When the cache is full, the least
+    recently used entry is evicted. The cache is thread-safe.
+    '''
+
+    ## Sentinel for missing entries.
+    _missing = object()
+
+
+    def __init__(self, ttl, max_entries=10000):
+        '''Class constructor.
+
+        @param ttl (float) Time to live of entries, in seconds.
+        @param max_entries (int, optional) Maximum number of entries.
+
+        @return None
+        '''
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits, self.misses = (0, 0)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+
+
+    def get(self, key, default=None):
+        '''Get a value from the cache.
+
+        @param key Cache key.
+        @param default (optional) Value returned on a cache miss.
+
+        @return Cached value or @p default.
+        '''
+
+        with self._lock:
+            value, expires = self._data.get(key, (self._missing, 0))
+            if value is self._missing or expires < time.time():
+                self._data.pop(key, None)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+
+            return value
+
+
+
+    def set(self, key, value):
+        '''Store a value in the cache.
+
+        @param key Cache key.
+        @param value Value to store.
+
+        @return None
+        '''
+
+        with self._lock:
+            self._data[key] = (value, time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+
+    def invalidate(self, key):
+        '''Remove an entry from the cache.
+
+        @param key Cache key.
+
+        @return None
+        '''
+
+        with self._lock:
+            self._data.pop(key, None)
+
+
+
+    def clear(self):
+        '''Remove all entries.'''
+
+        with self._lock:
+            self._data.clear()
+
+
+
+    def stats(self):
+        '''Cache metrics.
+
+        @return dict
+        '''
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries' : len(self._data),
+                'hits' : self.hits,
+                'misses' : self.misses,
+                'hit_rate' : self.hits / lookups if lookups else 0.0,
+            }
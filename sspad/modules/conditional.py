@@ -0,0 +1,113 @@
+import hashlib
+import threading
+import time
+import uuid
+
+from email.utils import parsedate_to_datetime
+
+import cherrypy
+
+from cherrypy.lib import httputil
+
+from sspad.config.local import conditional as conditional_conf
+
+
+class ContentVersion():
+    '''@package sspad.modules
+
+    Content version counter.
+
+    The version is bumped by every write made through LakeConnector. Read
+    responses which only depend on LAKE content and on request parameters
+    are identified by the current version, so that they can be validated
+    without querying the triplestore.
+    '''
+
+    ## Identifies this process, since the counter starts over on restart.
+    _boot_id = uuid.uuid4().hex
+    _version = 0
+    _modified = time.time()
+    _lock = threading.Lock()
+
+
+    @classmethod
+    def bump(cls):
+        '''Record a write.
+
+        @return None
+        '''
+
+        with cls._lock:
+            cls._version += 1
+            cls._modified = time.time()
+
+
+
+    @classmethod
+    def current(cls):
+        '''Current version.
+
+        @return (tuple) Version ID string and last modification time.
+        '''
+
+        with cls._lock:
+            return '{}-{}'.format(cls._boot_id, cls._version), cls._modified
+
+
+
+def _conditional(cache_control='no-cache', methods=('GET',), params={}):
+    '''Answer conditional requests from the content version.
+
+    Responses get an ETag derived from the content version and the request
+    URL, method and Accept header, and a Last-Modified date. If the
+    request validators match, a 304 Not Modified response is returned
+    before the handler is called.
+
+    For a while after a write, no validators are sent and the response is
+    not cached, since the triplestore may not have indexed the write yet.
+
+    @param cache_control (string) Cache-Control header value.
+    @param methods (tuple) HTTP methods the tool applies to.
+    @param params (dict) Request parameter values the tool applies to,
+        e.g. {'result' : 'terms'}.
+    '''
+
+    req = cherrypy.serving.request
+    resp = cherrypy.serving.response
+    if req.method not in methods or any(req.params.get(k) != v \
+            for k, v in params.items()):
+        return
+
+    version, modified = ContentVersion.current()
+    if time.time() - modified < conditional_conf['settle_time']:
+        resp.headers['Cache-Control'] = 'no-cache'
+        return
+
+    etag = 'W/"{}"'.format(hashlib.sha1('\n'.join([
+        version, req.method, req.path_info, req.query_string,
+        req.headers.get('Accept', ''),
+    ]).encode('utf-8')).hexdigest())
+
+    resp.headers['ETag'] = etag
+    resp.headers['Last-Modified'] = httputil.HTTPDate(modified)
+    resp.headers['Cache-Control'] = cache_control
+    resp.headers['Vary'] = 'Accept'
+
+    if_none_match = req.headers.get('If-None-Match')
+    if if_none_match:
+        if etag in [t.strip() for t in if_none_match.split(',')] \
+                or if_none_match.strip() == '*':
+            raise cherrypy.HTTPRedirect([], 304)
+        return
+
+    since = req.headers.get('If-Modified-Since')
+    if since:
+        try:
+            if int(modified) <= parsedate_to_datetime(since).timestamp():
+                raise cherrypy.HTTPRedirect([], 304)
+        except (TypeError, ValueError):
+            pass
+
+
+
+cherrypy.tools.conditional = cherrypy.Tool('before_handler', _conditional)
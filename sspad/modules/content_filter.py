@@ -30,3 +30,38 @@ class ContentFilter():
             return dom.toprettyxml().encode('utf8')
         else:
             return data.__repr__().encode('utf8')
+
+
+
+    def filter_output_iter(items, mimetype):
+        '''Filter a sequence of items incrementally based on mimetype.
+
+        Each item is serialized as soon as it is produced by @p items, so
+        that output can be streamed to the client.
+
+        @param items An iterable of python dicts or other serializable objects.
+        @param mimetype (string) MIME type of the output format.
+
+        @return (generator) Encoded chunks of the serialized sequence.
+        '''
+
+        if mimetype == 'application/json':
+            yield b'['
+            sep = b'\n'
+            for item in items:
+                yield sep + json.dumps(item, indent=4).encode('utf8')
+                sep = b',\n'
+            yield b'\n]'
+        elif mimetype == 'application/xml':
+            yield b'<?xml version="1.0" encoding="UTF-8" ?>\n<response type="list">'
+            for item in items:
+                yield b'\n<item type="dict">' \
+                        + dicttoxml.dicttoxml(item, root=False) + b'</item>'
+            yield b'\n</response>\n'
+        else:
+            yield b'['
+            sep = b''
+            for item in items:
+                yield sep + item.__repr__().encode('utf8')
+                sep = b', '
+            yield b']'
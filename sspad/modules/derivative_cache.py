@@ -0,0 +1,210 @@
+import hashlib
+import os
+import threading
+
+from collections import OrderedDict
+
+import cherrypy
+
+from sspad.config.local import derivative_cache as cache_conf
+from sspad.modules.metrics import Metrics
+
+
+class DerivativeCache():
+    '''@package sspad.modules
+
+    Disk-backed LRU cache of derivative images.
+
+    Entries are keyed by the digest of the source datastream and the target
+    geometry and format, so that resubmitting an unchanged original does
+    not require resizing it again. The LRU order is kept in memory and
+    persisted through file modification times.
+    '''
+
+    def __init__(self, cache_dir, max_size):
+        '''Class constructor.
+
+        Scans the cache directory to restore the LRU order.
+
+        @param cache_dir (string) Cache directory.
+        @param max_size (int) Size budget in bytes.
+
+        @return None
+        '''
+
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self.hits, self.misses, self.evictions = (0, 0, 0)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        files = []
+        for fname in os.listdir(cache_dir):
+            if fname.endswith('.tmp'):
+                os.remove(os.path.join(cache_dir, fname))
+                continue
+            st = os.stat(os.path.join(cache_dir, fname))
+            files.append((st.st_mtime, fname, st.st_size))
+
+        for mtime, fname, size in sorted(files):
+            self._entries[fname] = size
+            self._size += size
+        self._evict()
+
+
+
+    @staticmethod
+    def key(digest, w, h, fmt):
+        '''Build a cache key.
+
+        @param digest (string) Hex digest of the source datastream.
+        @param w (int) Target width.
+        @param h (int) Target height.
+        @param fmt (string) Target format, e.g. 'jpg'.
+
+        @return string
+        '''
+
+        return '{}_{}x{}.{}'.format(digest, w, h, fmt)
+
+
+
+    @staticmethod
+    def digest(data):
+        '''Compute the digest of a datastream.
+
+        Streams are read in chunks and rewound to their initial position.
+
+        @param data (bytes | file-like) Datastream.
+
+        @return (string) Hex digest.
+        '''
+
+        h = hashlib.sha256()
+        if isinstance(data, (bytes, bytearray)):
+            h.update(data)
+        else:
+            pos = data.tell()
+            for chunk in iter(lambda: data.read(1024**2), b''):
+                h.update(chunk)
+            data.seek(pos)
+
+        return h.hexdigest()
+
+
+
+    def get(self, key):
+        '''Get a cached derivative.
+
+        @param key (string) Cache key.
+
+        @return (bytes | None) Derivative data, or None on a cache miss.
+        '''
+
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        path = os.path.join(self.cache_dir, key)
+        try:
+            with open(path, 'rb') as fh:
+                data = fh.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+            return None
+
+        return data
+
+
+
+    def put(self, key, data):
+        '''Store a derivative and evict old entries if needed.
+
+        @param key (string) Cache key.
+        @param data (bytes) Derivative data.
+
+        @return None
+        '''
+
+        if len(data) > self.max_size:
+            return
+
+        path = os.path.join(self.cache_dir, key)
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(tmp_path, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+
+
+    def stats(self):
+        '''Cache metrics.
+
+        @return dict
+        '''
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries' : len(self._entries),
+                'size' : self._size,
+                'max_size' : self.max_size,
+                'hits' : self.hits,
+                'misses' : self.misses,
+                'hit_rate' : self.hits / lookups if lookups else 0.0,
+                'evictions' : self.evictions,
+            }
+
+
+
+    def _evict(self):
+        '''Remove least recently used entries until the size budget is met.
+
+        Must be called with the lock held.
+        '''
+
+        while self._size > self.max_size and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.cache_dir, key))
+            except FileNotFoundError:
+                pass
+            cherrypy.log('Evicted derivative from cache: {}'.format(key))
+
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    '''Get the shared derivative cache, creating it on first use.
+
+    @return (DerivativeCache | None) The cache, or None if disabled.
+    '''
+
+    global _cache
+
+    if not cache_conf['enabled']:
+        return None
+
+    with _cache_lock:
+        if not _cache:
+            _cache = DerivativeCache(
+                    cache_conf['cache_dir'], cache_conf['max_size'])
+            Metrics.register('derivative_cache', _cache.stats)
+
+    return _cache
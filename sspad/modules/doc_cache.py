@@ -0,0 +1,134 @@
+import hashlib
+import json
+import re
+import threading
+
+from sspad.config.local import doc_cache as doc_cache_conf
+from sspad.modules.cache import TtlCache
+from sspad.modules.metrics import Metrics
+
+
+## Matches the transaction segment of a node URI.
+_tx_re = re.compile(r'/(tx:[^/]+)/')
+
+
+class DocCache():
+    '''@package sspad.modules
+
+    Cache of resource documents, e.g. assets with their instances and
+    comments, keyed by node URI.
+
+    Documents are invalidated when LAKE nodes are written through
+    LakeConnector: a write to a node invalidates the documents of that node
+    and of all its ancestors, since documents include child nodes. Writes
+    within a transaction are invalidated again when the transaction ends,
+    so that documents read in the meantime are not kept.
+
+    Since the triplestore indexes writes asynchronously, documents read
+    within a settle time after they are invalidated may be stale and are
+    not cached. Changes made to LAKE by other clients are picked up when
+    entries expire.
+    '''
+
+    _cache = TtlCache(doc_cache_conf['ttl'], doc_cache_conf['max_entries'])
+    # Recently invalidated URIs.
+    _settling = TtlCache(doc_cache_conf['settle_time'], doc_cache_conf['max_entries'])
+    _tx_writes = {}
+    _lock = threading.Lock()
+
+
+    @classmethod
+    def get(cls, uri):
+        '''Get a cached document.
+
+        @param uri (string) Node URI.
+
+        @return (tuple | None) Document and ETag, or None if not cached.
+        '''
+
+        if not doc_cache_conf['enabled']:
+            return None
+
+        return cls._cache.get(uri)
+
+
+
+    @classmethod
+    def set(cls, uri, doc):
+        '''Cache a document and compute its ETag.
+
+        @param uri (string) Node URI.
+        @param doc (dict) JSON-serializable document.
+
+        The document is not cached if it was invalidated within the settle
+        time.
+
+        @return (string) ETag.
+        '''
+
+        etag = cls.etag(doc)
+        if doc_cache_conf['enabled'] and not cls._settling.get(uri):
+            cls._cache.set(uri, (doc, etag))
+
+        return etag
+
+
+
+    @classmethod
+    def invalidate(cls, uri):
+        '''Invalidate the documents of a node and its ancestors.
+
+        @param uri (string) Node URI, possibly within a transaction.
+
+        @return None
+        '''
+
+        m = _tx_re.search(uri)
+        if m:
+            with cls._lock:
+                cls._tx_writes.setdefault(m.group(1), set()).add(uri)
+            uri = _tx_re.sub('/', uri, count=1)
+
+        uri = uri.rstrip('/')
+        while '/' in uri and not uri.endswith(':/'):
+            cls._cache.invalidate(uri)
+            cls._settling.set(uri, True)
+            uri = uri.rsplit('/', 1)[0]
+
+
+
+    @classmethod
+    def end_tx(cls, tx_uri):
+        '''Invalidate the documents written in a transaction.
+
+        @param tx_uri (string) Transaction URI.
+
+        @return None
+        '''
+
+        m = _tx_re.search(tx_uri + '/')
+        if not m:
+            return
+        with cls._lock:
+            written = cls._tx_writes.pop(m.group(1), set())
+        for uri in written:
+            cls.invalidate(_tx_re.sub('/', uri, count=1))
+
+
+
+    @staticmethod
+    def etag(doc):
+        '''Compute a weak ETag for a document.
+
+        @param doc (dict) JSON-serializable document.
+
+        @return (string)
+        '''
+
+        return 'W/"{}"'.format(hashlib.sha1(
+                json.dumps(doc, sort_keys=True).encode('utf-8')).hexdigest())
+
+
+
+if doc_cache_conf['enabled']:
+    Metrics.register('doc_cache', DocCache._cache.stats)
@@ -0,0 +1,229 @@
+import hashlib
+import io
+import mimetypes
+import mmap
+import os
+import uuid
+import zlib
+
+from contextlib import contextmanager
+
+import cherrypy
+
+from sspad.config.local import path_ingest
+
+
+class LocalFile():
+    '''@package sspad.modules
+
+    Datastream read from a file on a mount point of the ingest host.
+
+    Like the request body parts handed over by CherryPy, it exposes a
+    'file' member, so that models can treat it as an uploaded datastream.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.content_type = mimetypes.guess_type(path)[0] \
+                or 'application/octet-stream'
+        self.file = open(path, 'rb')
+
+
+
+def resolve_local_path(path):
+    '''Resolve a path on the ingest host and check that it is allowed.
+
+    Symbolic links are resolved before the path is checked against the
+    configured mount points.
+
+    @param path (string) Absolute file path.
+
+    @return (string) Resolved path.
+
+    @throw cherrypy.HTTPError 403 Forbidden if path ingest is disabled or
+        the path is outside of the allowed mount points; 404 Not Found if
+        the file does not exist.
+    '''
+
+    mounts = [os.path.realpath(m.strip()) \
+            for m in path_ingest['mounts'].split(',') if m.strip()]
+    real_path = os.path.realpath(path)
+
+    if not path_ingest['enabled'] or not os.path.isabs(path) or not any(
+            os.path.commonpath([m, real_path]) == m for m in mounts):
+        raise cherrypy.HTTPError(
+            '403 Forbidden', 'Ingest from path {} is not allowed.'.format(path)
+        )
+    if not os.path.isfile(real_path):
+        raise cherrypy.HTTPError(
+            '404 Not Found', 'File {} does not exist.'.format(path)
+        )
+
+    return real_path
+
+
+
+@contextmanager
+def file_view(data):
+    '''Expose the content of a datastream as a buffer without copying it.
+
+    Files on disk are memory-mapped, and in-memory streams expose their
+    buffer, so that the content can be handed to a socket as is. The view
+    is released on exit.
+
+    @param data (bytes | file-like) Datastream.
+
+    @return (memoryview | bytes) Read-only content.
+    '''
+
+    if isinstance(data, (bytes, bytearray)):
+        yield data
+    elif isinstance(data, io.BytesIO):
+        with data.getbuffer() as view:
+            yield view
+    else:
+        try:
+            fileno = data.fileno()
+            size = os.fstat(fileno).st_size
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            data.seek(0)
+            yield data.read()
+            return
+
+        if not size:
+            yield b''
+            return
+
+        with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mm, \
+                memoryview(mm) as view:
+            yield view
+
+
+
+def buffer_digest(view, algorithm='sha1', chunk_size=1048576):
+    '''Compute the digest of a buffer one chunk at a time.
+
+    Chunks are slices of the buffer, so that memory-mapped files are hashed
+    without being copied into memory.
+
+    @param view (memoryview | bytes) Content, e.g. as exposed by #file_view().
+    @param algorithm (string, optional) hashlib algorithm name.
+    @param chunk_size (int, optional) Chunk size in bytes.
+
+    @return (string) Hexadecimal digest.
+    '''
+
+    h = hashlib.new(algorithm)
+    with memoryview(view) as mv:
+        for i in range(0, len(mv), chunk_size):
+            with mv[i:i + chunk_size] as chunk:
+                h.update(chunk)
+
+    return h.hexdigest()
+
+
+
+def file_digest(data, algorithm='sha1'):
+    '''Compute the digest of a datastream.
+
+    @param data (bytes | file-like) Datastream.
+    @param algorithm (string, optional) hashlib algorithm name.
+
+    @return (string) Hexadecimal digest.
+    '''
+
+    with file_view(data) as view:
+        return buffer_digest(view, algorithm)
+
+
+
+def gzip_iter(chunks, level=6, buffer_size=65536):
+    '''Compress a stream of chunks in gzip format as it is consumed.
+
+    Small chunks are buffered, so that each compressed chunk is written
+    from about @p buffer_size bytes of input.
+
+    @param chunks (iterable) Uncompressed chunks as bytes.
+    @param level (int, optional) Compression level.
+    @param buffer_size (int, optional) Input buffer size.
+
+    @return (generator) Compressed chunks.
+    '''
+
+    # wbits=31 writes a gzip header and trailer.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    buf = []
+    size = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= buffer_size:
+            out = compressor.compress(b''.join(buf))
+            buf, size = ([], 0)
+            if out:
+                yield out
+
+    yield compressor.compress(b''.join(buf)) + compressor.flush()
+
+
+
+class MultipartBody():
+    '''@package sspad.modules
+
+    multipart/form-data request body.
+
+    The body is sent part by part. File contents are passed to the socket
+    as the buffers they are provided as, e.g. memory maps obtained with
+    #file_view(). Since its length is known in advance, the body is not
+    sent with chunked transfer encoding.
+    '''
+
+    def __init__(self, fields={}, files={}):
+        '''Class constructor.
+
+        @param fields (dict) Form field names and values.
+        @param files (dict) File field names and 3-tuples of file name,
+            content buffer and MIME type.
+
+        @return None
+        '''
+
+        self.boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary=' + self.boundary
+
+        self._parts = []
+        for name, value in fields.items():
+            self._parts.append(self._part_header(name))
+            self._parts.append(str(value).encode('utf-8'))
+            self._parts.append(b'\r\n')
+        for name, (file_name, content, mimetype) in files.items():
+            self._parts.append(self._part_header(name, file_name, mimetype))
+            self._parts.append(content)
+            self._parts.append(b'\r\n')
+        self._parts.append('--{}--\r\n'.format(self.boundary).encode('utf-8'))
+
+
+
+    def __len__(self):
+        return sum(len(p) for p in self._parts)
+
+
+
+    def __iter__(self):
+        return iter(self._parts)
+
+
+
+    def _part_header(self, name, file_name=None, mimetype=None):
+        '''Delimiter and headers of a body part.'''
+
+        disposition = 'form-data; name="{}"'.format(name)
+        if file_name is not None:
+            disposition += '; filename="{}"'.format(file_name.replace('"', ''))
+        header = '--{}\r\nContent-Disposition: {}\r\n'.format(
+                self.boundary, disposition)
+        if mimetype:
+            header += 'Content-Type: {}\r\n'.format(mimetype)
+
+        return (header + '\r\n').encode('utf-8')
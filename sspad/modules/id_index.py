@@ -0,0 +1,241 @@
+import os
+import sqlite3
+import threading
+
+import cherrypy
+
+from sspad.config.local import id_index as id_index_conf
+from sspad.modules.metrics import Metrics
+from sspad.modules.sparql_templates import register
+
+
+class IdIndex():
+    '''@package sspad.modules
+
+    Local persistent index of node identifiers.
+
+    Maps identifier properties and values (aic:uid, aic:legacyUid, CITI
+    primary keys) to node URIs. Since it is written as soon as a node is
+    created, it does not lag behind LAKE like the triplestore index.
+
+    Identifiers which are only unique within a node type, such as CITI
+    primary keys, are stored with that type as their scope.
+    '''
+
+    _schema = '''
+        CREATE TABLE IF NOT EXISTS ident (
+            prop TEXT NOT NULL,
+            scope TEXT NOT NULL,
+            value TEXT NOT NULL,
+            uri TEXT NOT NULL,
+            PRIMARY KEY (prop, scope, value)
+        );
+        CREATE INDEX IF NOT EXISTS ident_uri ON ident (uri);
+    '''
+
+    _q_rebuild = register('id_index.rebuild', '''
+        SELECT ?u ?v WHERE {
+            ?u $prop ?v .
+        }
+        ''')
+
+    _q_rebuild_scoped = register('id_index.rebuild_scoped', '''
+        SELECT ?u ?v WHERE {
+            ?u a $scope .
+            ?u $prop ?v .
+        }
+        ''')
+
+
+    def __init__(self, db_path):
+        '''Class constructor.
+
+        @param db_path (string) SQLite database path.
+
+        @return None
+        '''
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self.hits, self.misses = (0, 0)
+        with self._lock, self._db:
+            self._db.executescript(self._schema)
+
+
+
+    def get(self, prop, value, scope=''):
+        '''Look up a node URI.
+
+        @param prop (string) Identifier property URI.
+        @param value (string) Identifier value.
+        @param scope (string, optional) Node type URI for scoped identifiers.
+
+        @return (string | None) Node URI, or None if not indexed.
+        '''
+
+        with self._lock:
+            row = self._db.execute(
+                'SELECT uri FROM ident WHERE prop = ? AND scope = ? AND value = ?',
+                (str(prop), str(scope), str(value))
+            ).fetchone()
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return row[0] if row else None
+
+
+
+    def put(self, prop, value, uri, scope=''):
+        '''Index a node identifier.
+
+        @param prop (string) Identifier property URI.
+        @param value (string) Identifier value.
+        @param uri (string) Node URI.
+        @param scope (string, optional) Node type URI for scoped identifiers.
+
+        @return None
+        '''
+
+        self.put_many([(prop, scope, value, uri)])
+
+
+
+    def put_many(self, rows):
+        '''Index several node identifiers in one transaction.
+
+        @param rows (iterable) 4-tuples of property, scope, value and URI.
+
+        @return None
+        '''
+
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO ident (prop, scope, value, uri) '
+                'VALUES (?, ?, ?, ?)',
+                [(str(p), str(s), str(v), str(u)) for p, s, v, u in rows]
+            )
+
+
+
+    def remove_uri(self, uri):
+        '''Remove all identifiers of a node.
+
+        @param uri (string) Node URI.
+
+        @return None
+        '''
+
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM ident WHERE uri = ?', (str(uri),))
+
+
+
+    def remove(self, prop, uri, values=None, scope=''):
+        '''Remove identifiers of a node for one property.
+
+        @param prop (string) Identifier property URI.
+        @param uri (string) Node URI.
+        @param values (list, optional) Identifier values to remove. By
+            default, all values of the property are removed.
+        @param scope (string, optional) Node type URI for scoped identifiers.
+
+        @return None
+        '''
+
+        with self._lock, self._db:
+            if values is None:
+                self._db.execute(
+                    'DELETE FROM ident WHERE prop = ? AND scope = ? AND uri = ?',
+                    (str(prop), str(scope), str(uri)))
+            else:
+                self._db.executemany(
+                    'DELETE FROM ident WHERE prop = ? AND scope = ? '
+                    'AND value = ? AND uri = ?',
+                    [(str(prop), str(scope), str(v), str(uri)) for v in values])
+
+
+
+    def rebuild(self, tsconn, prop, scope='', clear=False, batch_size=10000):
+        '''Load all values of an identifier property from the triplestore.
+
+        Results are streamed and written in batches.
+
+        @param tsconn (TstoreConnector) Triplestore connection.
+        @param prop (rdflib.URIRef) Identifier property.
+        @param scope (rdflib.URIRef, optional) Node type for scoped identifiers.
+        @param clear (boolean, optional) Whether to remove existing entries
+            for the property first. Otherwise, entries of nodes which no
+            longer exist are kept.
+        @param batch_size (int, optional) Rows written per transaction.
+
+        @return (int) Number of identifiers indexed.
+        '''
+
+        if clear:
+            with self._lock, self._db:
+                self._db.execute(
+                    'DELETE FROM ident WHERE prop = ? AND scope = ?',
+                    (str(prop), str(scope))
+                )
+
+        q = self._q_rebuild_scoped.render(prop=prop, scope=scope) \
+                if scope else self._q_rebuild.render(prop=prop)
+
+        count = 0
+        batch = []
+        for row in tsconn.query_iter(q):
+            batch.append((prop, scope, row['v'], row['u']))
+            if len(batch) >= batch_size:
+                self.put_many(batch)
+                count += len(batch)
+                batch = []
+        self.put_many(batch)
+        count += len(batch)
+
+        cherrypy.log('Indexed {} values of {}.'.format(count, prop))
+
+        return count
+
+
+
+    def stats(self):
+        '''Index metrics.
+
+        @return dict
+        '''
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries' : self._db.execute(
+                        'SELECT COUNT(*) FROM ident').fetchone()[0],
+                'hits' : self.hits,
+                'misses' : self.misses,
+                'hit_rate' : self.hits / lookups if lookups else 0.0,
+            }
+
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    '''Get the shared identifier index, opening it on first use.
+
+    @return (IdIndex | None) The index, or None if disabled.
+    '''
+
+    global _index
+
+    if not id_index_conf['enabled']:
+        return None
+
+    with _index_lock:
+        if not _index:
+            _index = IdIndex(id_index_conf['db_path'])
+            Metrics.register('id_index', _index.stats)
+
+    return _index
@@ -0,0 +1,379 @@
+import importlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+import cherrypy
+
+from cherrypy.process import plugins
+
+from sspad.config.local import job_queue as queue_conf
+from sspad.modules.file_io import LocalFile
+from sspad.modules.metrics import Metrics
+from sspad.modules.request_context import request_context
+
+
+class SpooledPart():
+    '''@package sspad.modules
+
+    Datastream read back from the spool directory.
+
+    It exposes a 'file' member like the request body parts handed over by
+    CherryPy, so that models can treat it as an uploaded datastream.
+    '''
+
+    def __init__(self, path):
+        self.filename = os.path.basename(path)
+        self.file = open(path, 'rb')
+
+
+
+class JobQueue():
+    '''@package sspad.modules
+
+    Durable ingest job queue.
+
+    Jobs are stored in a local SQLite database and their datastreams are
+    spooled to disk, so that queued jobs survive a restart.
+    '''
+
+    _schema = '''
+        CREATE TABLE IF NOT EXISTS job (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            action TEXT NOT NULL,
+            model TEXT NOT NULL,
+            params TEXT NOT NULL,
+            auth TEXT,
+            result TEXT,
+            created REAL NOT NULL,
+            started REAL,
+            finished REAL
+        );
+        CREATE INDEX IF NOT EXISTS job_status_created ON job (status, created);
+    '''
+
+
+    def __init__(self, db_path, spool_dir):
+        '''Class constructor.
+
+        Opens or creates the queue database. Jobs left running by a previous
+        process are put back in the queue.
+
+        @param db_path (string) SQLite database path.
+        @param spool_dir (string) Spool directory for datastreams.
+
+        @return None
+        '''
+
+        self.spool_dir = spool_dir
+        os.makedirs(spool_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.executescript(self._schema)
+            self._db.execute(
+                'UPDATE job SET status = \'queued\', started = NULL '
+                'WHERE status = \'running\''
+            )
+
+
+
+    def enqueue(self, action, model, params, dstreams, auth=None):
+        '''Spool datastreams and add a job to the queue.
+
+        @param action (string) 'create' or 'create_or_update'.
+        @param model (string) Fully qualified model class name.
+        @param params (dict) JSON-serializable model method arguments.
+            Properties are kept as received in the request, i.e. with
+            namespace-prefixed names.
+        @param dstreams (dict) Datastreams as received by the controller.
+            Reference datastreams (ref_*) and resolved local file paths
+            (path_*) are stored as parameters.
+        @param auth (string, optional) Authorization header to use when
+            running the job.
+
+        @return (string) Job ID.
+        '''
+
+        job_id = str(uuid.uuid4())
+        job_dir = os.path.join(self.spool_dir, job_id)
+        os.makedirs(job_dir)
+
+        refs = {}
+        paths = {}
+        spooled = []
+        for dsname, ds in dstreams.items():
+            if dsname[:4] == 'ref_':
+                refs[dsname] = ds
+                continue
+            if dsname[:5] == 'path_':
+                paths[dsname[5:]] = ds
+                continue
+            with open(os.path.join(job_dir, dsname), 'wb') as fh:
+                if hasattr(ds, 'file'):
+                    ds.file.seek(0)
+                    shutil.copyfileobj(ds.file, fh)
+                else:
+                    fh.write(ds if isinstance(ds, bytes) else ds.read())
+            spooled.append(dsname)
+
+        params = dict(params, refs=refs, paths=paths, spooled=spooled)
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT INTO job (id, status, action, model, params, auth, created) '
+                'VALUES (?, \'queued\', ?, ?, ?, ?, ?)',
+                (job_id, action, model, json.dumps(params), auth, time.time())
+            )
+
+        return job_id
+
+
+
+    def claim(self):
+        '''Take the oldest queued job and mark it as running.
+
+        @return (sqlite3.Row | None) Job row, or None if the queue is empty.
+        '''
+
+        with self._lock, self._db:
+            row = self._db.execute(
+                'SELECT * FROM job WHERE status = \'queued\' '
+                'ORDER BY created LIMIT 1'
+            ).fetchone()
+            if not row:
+                return None
+            self._db.execute(
+                'UPDATE job SET status = \'running\', started = ? WHERE id = ?',
+                (time.time(), row['id'])
+            )
+
+        return row
+
+
+
+    def finish(self, job_id, status, result):
+        '''Record the outcome of a job and remove its spooled data.
+
+        Stored credentials are discarded at this point.
+
+        @param job_id (string) Job ID.
+        @param status (string) 'done' or 'failed'.
+        @param result (dict) Job result or error information.
+
+        @return None
+        '''
+
+        with self._lock, self._db:
+            self._db.execute(
+                'UPDATE job SET status = ?, result = ?, finished = ?, auth = NULL '
+                'WHERE id = ?',
+                (status, json.dumps(result), time.time(), job_id)
+            )
+        shutil.rmtree(os.path.join(self.spool_dir, job_id), ignore_errors=True)
+
+
+
+    def get(self, job_id):
+        '''Get the status of a job.
+
+        @param job_id (string) Job ID.
+
+        @return (dict | None) Job status, or None if no such job exists.
+        '''
+
+        with self._lock:
+            row = self._db.execute(
+                'SELECT id, status, action, result, created, started, finished '
+                'FROM job WHERE id = ?', (job_id,)
+            ).fetchone()
+
+        if not row:
+            return None
+
+        ret = dict(row)
+        ret['result'] = json.loads(ret['result']) if ret['result'] else None
+        if ret['status'] == 'queued':
+            ret['position'] = self._position(row['created'])
+
+        return ret
+
+
+
+    def stats(self):
+        '''Queue depth and lag.
+
+        Lag is the age in seconds of the oldest job still waiting.
+
+        @return dict
+        '''
+
+        with self._lock:
+            counts = dict(self._db.execute(
+                'SELECT status, COUNT(*) FROM job GROUP BY status'
+            ).fetchall())
+            oldest = self._db.execute(
+                'SELECT MIN(created) FROM job WHERE status = \'queued\''
+            ).fetchone()[0]
+
+        return {
+            'depth' : counts.get('queued', 0),
+            'running' : counts.get('running', 0),
+            'done' : counts.get('done', 0),
+            'failed' : counts.get('failed', 0),
+            'lag' : time.time() - oldest if oldest else 0.0,
+        }
+
+
+
+    def _position(self, created):
+        '''Number of queued jobs ahead of a job created at a given time.'''
+
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM job WHERE status = \'queued\' AND created < ?',
+                (created,)
+            ).fetchone()[0]
+
+
+
+class JobWorkerPool(plugins.SimplePlugin):
+    '''@package sspad.modules
+
+    Pool of worker threads processing the ingest job queue.
+
+    It is subscribed to the CherryPy engine so that it starts and stops
+    with the server.
+    '''
+
+    def __init__(self, bus, queue, workers=4, poll_interval=1.0):
+        plugins.SimplePlugin.__init__(self, bus)
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._stop = threading.Event()
+
+
+
+    def start(self):
+        '''Start the worker threads.'''
+
+        self.bus.log('Starting {} ingest job workers.'.format(self.workers))
+        self._stop.clear()
+        for i in range(self.workers):
+            t = threading.Thread(
+                target=self._work, name='sspad-job-worker-{}'.format(i)
+            )
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+    start.priority = 80
+
+
+
+    def stop(self):
+        '''Signal the worker threads to stop and wait for running jobs.'''
+
+        self.bus.log('Stopping ingest job workers.')
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+
+
+    def _work(self):
+        '''Worker loop.'''
+
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if not job:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            try:
+                result = run_job(job, self.queue.spool_dir)
+                self.queue.finish(job['id'], 'done', result)
+            except cherrypy.HTTPError as e:
+                cherrypy.log.error('Job {} failed: {}'.format(job['id'], e))
+                self.queue.finish(job['id'], 'failed', {
+                    'status' : e.code, 'message' : e._message,
+                })
+            except Exception as e:
+                cherrypy.log.error('Job {} failed: {}'.format(job['id'], e))
+                self.queue.finish(job['id'], 'failed', {
+                    'status' : 500, 'message' : str(e),
+                })
+
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_queue():
+    '''Get the shared job queue, creating it on first use.
+
+    @return (JobQueue | None) The job queue, or None if asynchronous
+        ingest is disabled.
+    '''
+
+    global _queue
+
+    if not queue_conf['enabled']:
+        return None
+
+    with _queue_lock:
+        if not _queue:
+            _queue = JobQueue(queue_conf['db_path'], queue_conf['spool_dir'])
+            Metrics.register('job_queue', _queue.stats)
+
+    return _queue
+
+
+
+def run_job(job, spool_dir):
+    '''Run an ingest job.
+
+    @param job (sqlite3.Row) Job row as returned by JobQueue::claim().
+    @param spool_dir (string) Spool directory.
+
+    @return (dict) Job result: HTTP status, resource location and the
+        message the synchronous call would have returned.
+    '''
+
+    params = json.loads(job['params'])
+    module_name, cls_name = job['model'].rsplit('.', 1)
+    model_cls = getattr(importlib.import_module(module_name), cls_name)
+
+    dstreams = dict(params['refs'])
+    for dsname in params['spooled']:
+        dstreams[dsname] = SpooledPart(
+                os.path.join(spool_dir, job['id'], dsname))
+    for dsname, path in params.get('paths', {}).items():
+        dstreams[dsname] = LocalFile(path)
+
+    try:
+        with request_context({'Authorization' : job['auth']}):
+            model = model_cls()
+            props = model.convert_req_propnames(params['props'])
+            if job['action'] == 'create':
+                ret = model.create(params['mid'], props, **dstreams)
+                status = 201
+            else:
+                ret, created = model.create_or_update(
+                    params['uri'], params['uid'], props, **dstreams
+                )
+                status = 201 if created else 204
+    finally:
+        for dsname in params['spooled'] + list(params.get('paths', {})):
+            dstreams[dsname].file.close()
+
+    return {'status' : status, 'location' : model.uri, 'response' : ret}
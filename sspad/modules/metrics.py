@@ -0,0 +1,54 @@
+import threading
+
+import cherrypy
+
+
+class Metrics():
+    '''@package sspad.modules
+
+    Metrics registry.
+
+    Local services register a callable returning a dict of their current
+    figures. All of them are collected on demand by MetricsCtrl.
+    '''
+
+    _providers = {}
+    _lock = threading.Lock()
+
+
+    @classmethod
+    def register(cls, name, provider):
+        '''Register a metrics provider.
+
+        @param name (string) Name of the metrics group, e.g. 'job_queue'.
+        @param provider (callable) Function returning a dict.
+
+        @return None
+        '''
+
+        with cls._lock:
+            cls._providers[name] = provider
+
+
+
+    @classmethod
+    def collect(cls):
+        '''Collect metrics from all registered providers.
+
+        A failing provider does not prevent the others from reporting.
+
+        @return (dict) Metrics keyed by group name.
+        '''
+
+        with cls._lock:
+            providers = dict(cls._providers)
+
+        ret = {}
+        for name, provider in providers.items():
+            try:
+                ret[name] = provider()
+            except Exception as e:
+                cherrypy.log.error('Metrics provider {} failed: {}'.format(name, e))
+                ret[name] = {'error' : str(e)}
+
+        return ret
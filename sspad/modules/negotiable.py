@@ -31,3 +31,21 @@ class Negotiable(metaclass=ABCMeta):
 
 
 
+    def _output_stream(self, items):
+        '''Stream a sequence of items as a chunked response.
+
+        @param items (iterable) Items to be serialized. Generators are
+            consumed while the response is being sent.
+
+        @return (generator) Encoded response chunks.
+        '''
+
+        fmt = cptools.accept(self.out_fmt)
+        cherrypy.log('Output format (streaming): {}'.format(fmt))
+        cherrypy.response.headers['Content-type'] = fmt
+        cherrypy.response.stream = True
+
+        return ContentFilter.filter_output_iter(items, fmt)
+
+
+
@@ -0,0 +1,116 @@
+import re
+import threading
+
+import cherrypy
+
+from sspad.config.local import node_cache as node_cache_conf
+from sspad.modules.cache import TtlCache
+from sspad.modules.metrics import Metrics
+
+
+## Matches the transaction segment of a node URI.
+_tx_re = re.compile(r'/(tx:[^/]+)/')
+
+
+class NodeCache():
+    '''@package sspad.modules
+
+    Node existence cache.
+
+    Remembers which LAKE nodes are known to exist or not, so that
+    repeated existence checks do not cost a HEAD request each. Entries for
+    URIs within a transaction are shared by all threads working on that
+    transaction and dropped when it is committed or rolled back. Entries
+    for other URIs only live as long as the current HTTP request.
+
+    Externally referenced datastreams are tracked separately in a
+    process-wide cache with a short time to live.
+    '''
+
+    _tx_entries = {}
+    _lock = threading.Lock()
+
+    ## Existence of external references.
+    refs = TtlCache(node_cache_conf['ref_ttl'], node_cache_conf['ref_max_entries'])
+
+
+    @classmethod
+    def get(cls, uri):
+        '''Look up whether a node exists.
+
+        @param uri (string) Node URI.
+
+        @return (boolean | None) Whether the node exists, or None if unknown.
+        '''
+
+        tx = cls._tx_id(uri)
+        if tx:
+            with cls._lock:
+                return cls._tx_entries.get(tx, {}).get(uri)
+        else:
+            return cls._request_entries().get(uri)
+
+
+
+    @classmethod
+    def set(cls, uri, exists=True):
+        '''Record whether a node exists.
+
+        @param uri (string) Node URI.
+        @param exists (boolean, optional) Whether the node exists.
+
+        @return None
+        '''
+
+        tx = cls._tx_id(uri)
+        if tx:
+            with cls._lock:
+                cls._tx_entries.setdefault(tx, {})[uri] = exists
+        else:
+            cls._request_entries()[uri] = exists
+
+
+
+    @classmethod
+    def end_tx(cls, tx_uri):
+        '''Drop all entries for a transaction.
+
+        @param tx_uri (string) Transaction URI.
+
+        @return None
+        '''
+
+        tx = cls._tx_id(tx_uri + '/')
+        with cls._lock:
+            cls._tx_entries.pop(tx, None)
+
+
+
+    @classmethod
+    def _tx_id(cls, uri):
+        '''Extract the transaction ID from a URI.
+
+        @return (string | None)
+        '''
+
+        m = _tx_re.search(uri)
+        return m.group(1) if m else None
+
+
+
+    @classmethod
+    def _request_entries(cls):
+        '''Entries bound to the current request.
+
+        @return dict
+        '''
+
+        req = cherrypy.serving.request
+        if not hasattr(req, 'node_cache'):
+            req.node_cache = {}
+
+        return req.node_cache
+
+
+
+Metrics.register('ref_cache', NodeCache.refs.stats)
@@ -0,0 +1,90 @@
+import threading
+import time
+
+
+class RateLimiter():
+    '''@package sspad.modules
+
+    Token-bucket limiter of outgoing HTTP requests per upstream service.
+
+    Each upstream is identified by its base URL. Requests to URLs starting
+    with a limited base URL wait until a token is available, using the
+    longest matching base URL; requests to other URLs are not limited. No
+    upstream is limited unless configured.
+    '''
+
+    _buckets = {}
+    _lock = threading.Lock()
+
+
+    @classmethod
+    def configure(cls, base_url, rate, burst=None):
+        '''Limit the request rate to an upstream service.
+
+        @param base_url (string) Base URL of the service.
+        @param rate (float) Requests per second. 0 removes the limit.
+        @param burst (int, optional) Number of requests which can be sent
+            at once after a pause. Default is one second worth of requests.
+
+        @return None
+        '''
+
+        with cls._lock:
+            if rate > 0:
+                burst = burst or max(1.0, rate)
+                cls._buckets[base_url] = {
+                    'rate' : float(rate),
+                    'burst' : float(burst),
+                    'tokens' : float(burst),
+                    'last' : time.monotonic(),
+                    'waited' : 0.0,
+                }
+            else:
+                cls._buckets.pop(base_url, None)
+
+
+
+    @classmethod
+    def acquire(cls, url):
+        '''Wait until a request to a URL can be sent.
+
+        @param url (string) Request URL.
+
+        @return None
+        '''
+
+        if not cls._buckets:
+            return
+
+        with cls._lock:
+            # Most specific base URL wins.
+            base_url = max((u for u in cls._buckets if url.startswith(u)),
+                    key=len, default=None)
+            if not base_url:
+                return
+            bucket = cls._buckets[base_url]
+            now = time.monotonic()
+            bucket['tokens'] = min(bucket['burst'],
+                    bucket['tokens'] + (now - bucket['last']) * bucket['rate'])
+            bucket['last'] = now
+            # Take the token now and wait for it to become available, so
+            # that concurrent callers queue up behind each other.
+            bucket['tokens'] -= 1
+            wait = -bucket['tokens'] / bucket['rate'] \
+                    if bucket['tokens'] < 0 else 0
+            bucket['waited'] += wait
+
+        if wait:
+            time.sleep(wait)
+
+
+
+    @classmethod
+    def stats(cls):
+        '''Seconds spent waiting per upstream.
+
+        @return dict
+        '''
+
+        with cls._lock:
+            return {u : round(b['waited'], 3) for u, b in cls._buckets.items()}
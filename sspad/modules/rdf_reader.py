@@ -0,0 +1,111 @@
+import re
+
+from rdflib import BNode, Literal, URIRef
+
+
+## Matches an N-Triples statement.
+_triple_re = re.compile(r'''
+    \s*(?:<(?P<s>[^>]*)>|_:(?P<sb>\S+))
+    \s+<(?P<p>[^>]*)>
+    \s+(?:
+        <(?P<o>[^>]*)>
+        |_:(?P<ob>\S+)
+        |"(?P<lit>(?:[^"\\]|\\.)*)"
+            (?:@(?P<lang>[A-Za-z]+(?:-[A-Za-z0-9]+)*)|\^\^<(?P<dt>[^>]*)>)?
+    )
+    \s*\.\s*(?:\#.*)?$
+''', re.VERBOSE)
+
+## Matches an escape sequence.
+_escape_re = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+
+_escapes = {
+    't' : '\t',
+    'b' : '\b',
+    'n' : '\n',
+    'r' : '\r',
+    'f' : '\f',
+    '"' : '"',
+    '\'' : '\'',
+    '\\' : '\\',
+}
+
+
+def _unescape(text):
+    '''Resolve N-Triples escape sequences.
+
+    @throw ValueError if an escape sequence is invalid.
+    '''
+
+    if '\\' not in text:
+        return text
+
+    return _escape_re.sub(_unescape_match, text)
+
+
+
+def _unescape_match(m):
+    '''Resolve an escape sequence matched by #_escape_re.'''
+
+    if m.group(3) is None:
+        return chr(int(m.group(1) or m.group(2), 16))
+
+    char = _escapes.get(m.group(3))
+    if char is None:
+        raise ValueError('Invalid escape sequence: {}'.format(m.group(0)))
+
+    return char
+
+
+
+def parse_ntriple(line):
+    '''Parse one line of an N-Triples document.
+
+    @param line (string) N-Triples line.
+
+    @return (tuple | None) Subject, predicate and object as rdflib terms,
+        or None if the line is blank or a comment.
+
+    @throw ValueError if the line is not a valid statement.
+    '''
+
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+
+    m = _triple_re.match(line)
+    if not m:
+        raise ValueError('Invalid N-Triples statement: {}'.format(line))
+
+    s = URIRef(_unescape(m.group('s'))) if m.group('s') is not None \
+            else BNode(m.group('sb'))
+    p = URIRef(_unescape(m.group('p')))
+    if m.group('o') is not None:
+        o = URIRef(_unescape(m.group('o')))
+    elif m.group('ob') is not None:
+        o = BNode(m.group('ob'))
+    else:
+        o = Literal(
+            _unescape(m.group('lit')),
+            lang = m.group('lang'),
+            datatype = URIRef(_unescape(m.group('dt'))) if m.group('dt') else None
+        )
+
+    return s, p, o
+
+
+
+def iter_ntriples(lines):
+    '''Parse an N-Triples document incrementally.
+
+    @param lines (iterable) Lines of the document, as strings or bytes.
+
+    @return (generator) Subject, predicate, object 3-tuples of rdflib terms.
+    '''
+
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        triple = parse_ntriple(line)
+        if triple:
+            yield triple
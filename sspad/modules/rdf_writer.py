@@ -0,0 +1,98 @@
+import re
+
+from rdflib import BNode, Literal, URIRef, Variable
+
+
+## Characters not allowed in an IRI reference.
+_iri_escape_re = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+
+## Characters to be escaped in a quoted literal.
+_literal_escapes = {
+    '\\' : '\\\\',
+    '"' : '\\"',
+    '\n' : '\\n',
+    '\r' : '\\r',
+    '\t' : '\\t',
+}
+_literal_escape_re = re.compile(r'[\\"\n\r\t]')
+
+## Characters not allowed in a SPARQL variable name.
+_var_escape_re = re.compile(r'[^A-Za-z0-9_]')
+
+
+def term_n3(term):
+    '''Serialize an RDF term in N-Triples/Turtle/SPARQL syntax.
+
+    @param term (rdflib.URIRef | rdflib.Literal | rdflib.Variable | rdflib.BNode)
+        RDF term.
+
+    @return string
+    '''
+
+    if isinstance(term, Literal):
+        ret = '"' + _literal_escape_re.sub(
+                lambda m: _literal_escapes[m.group(0)], str(term)) + '"'
+        if term.language:
+            ret += '@' + term.language
+        elif term.datatype:
+            ret += '^^' + iri_n3(term.datatype)
+        return ret
+    elif isinstance(term, Variable):
+        return '?' + _var_escape_re.sub('_', str(term))
+    elif isinstance(term, BNode):
+        return '_:' + str(term)
+    else:
+        return iri_n3(term)
+
+
+
+def iri_n3(iri):
+    '''Serialize an IRI reference, escaping characters that are not allowed.
+
+    @param iri (string) IRI.
+
+    @return string
+    '''
+
+    return '<' + _iri_escape_re.sub(
+            lambda m: '\\u{:04X}'.format(ord(m.group(0))), str(iri)) + '>'
+
+
+
+def turtle_body(tuples):
+    '''Build a Turtle document describing the node being written.
+
+    The subject is the relative IRI <>, which LAKE resolves to the node
+    URI.
+
+    @param tuples (list) Predicate-object 2-tuples of rdflib terms.
+
+    @return string
+    '''
+
+    return ''.join(['<> {} {} .\n'.format(term_n3(p), term_n3(o)) \
+            for p, o in tuples])
+
+
+
+def sparql_update_body(delete_tuples=[], insert_tuples=[], where_tuples=[]):
+    '''Build a SPARQL Update request for the node being written.
+
+    Where tuples are connected by UNION.
+
+    @param delete_tuples (list) Predicate-object 2-tuples to delete.
+    @param insert_tuples (list) Predicate-object 2-tuples to insert.
+    @param where_tuples (list) Predicate-object 2-tuples for the WHERE clause.
+
+    @return string
+    '''
+
+    delete_triples = ''.join(['\n\t<> {} {} .'.format(term_n3(p), term_n3(o)) \
+            for p, o in delete_tuples])
+    insert_triples = ''.join(['\n\t<> {} {} .'.format(term_n3(p), term_n3(o)) \
+            for p, o in insert_tuples])
+    where_triples = '\n\tUNION'.join(['\n\t{{<> {} {}}}'.format(
+            term_n3(p), term_n3(o)) for p, o in where_tuples])
+
+    return 'DELETE {{{}\n}} INSERT {{{}\n}} WHERE {{{}\n}}'\
+        .format(delete_triples, insert_triples, where_triples)
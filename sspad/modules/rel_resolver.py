@@ -0,0 +1,110 @@
+import cherrypy
+
+from sspad.config.local import rel_cache as rel_cache_conf
+from sspad.modules.cache import TtlCache
+from sspad.modules.id_index import get_index
+from sspad.modules.metrics import Metrics
+from sspad.modules.rdf_writer import term_n3
+from sspad.modules.sparql_templates import Raw, register
+
+
+class RelResolver():
+    '''@package sspad.modules
+
+    Resolves external identifiers, such as CITI primary keys, to node URIs.
+
+    Keys are looked up in the local identifier index and in a process-wide
+    cache first; the remaining ones are resolved in bulk with a single
+    VALUES query per batch.
+
+    A key is a 3-tuple of rdflib terms: the RDF type of the referenced
+    node, the identifier property, and the identifier value.
+    '''
+
+    cache = TtlCache(rel_cache_conf['ttl'], rel_cache_conf['max_entries'])
+
+    _q_resolve = register('rel_resolver.resolve', '''
+        SELECT ?type ?prop ?key ?u WHERE {
+            VALUES (?type ?prop ?key) {$values
+            }
+            ?u a ?type .
+            ?u ?prop ?key .
+        }
+        ''')
+
+
+    def __init__(self, tsconn):
+        '''Class constructor.
+
+        @param tsconn (TstoreConnector) Triplestore connection.
+
+        @return None
+        '''
+
+        self.tsconn = tsconn
+
+
+
+    def resolve(self, keys):
+        '''Resolve a set of keys to node URIs.
+
+        Keys not found in the cache are resolved with one query per
+        batch of up to 'batch_size' keys. Keys with no matching node are
+        not included in the result.
+
+        @param keys (iterable) Keys to resolve.
+
+        @return (dict) Node URIs keyed by key.
+        '''
+
+        ret = {}
+        missing = []
+        index = get_index()
+        for key in set(keys):
+            uri = self.cache.get(key) \
+                    or (index and index.get(key[1], key[2], scope=key[0]))
+            if uri:
+                ret[key] = uri
+            else:
+                missing.append(key)
+
+        batch_size = rel_cache_conf['batch_size']
+        for i in range(0, len(missing), batch_size):
+            ret.update(self._query(missing[i:i + batch_size]))
+
+        return ret
+
+
+
+    def _query(self, keys):
+        '''Resolve a batch of keys with one query and cache the results.
+
+        @param keys (list) Keys to resolve.
+
+        @return (dict) Node URIs keyed by key.
+        '''
+
+        cherrypy.log('Resolving {} external keys.'.format(len(keys)))
+        values = ''.join(['\n                ({} {} {})'.format(
+            term_n3(t), term_n3(p), term_n3(v)) for t, p, v in keys])
+        q = self._q_resolve.render(values=Raw(values))
+
+        # Map results back to the requested keys by their string values,
+        # since the result bindings are untyped.
+        lookup = {(str(t), str(p), str(v)) : (t, p, v) for t, p, v in keys}
+        ret = {}
+        for row in self.tsconn.query(q):
+            key = lookup.get((row['type'], row['prop'], row['key']))
+            if key:
+                ret[key] = row['u']
+                self.cache.set(key, row['u'])
+
+        index = get_index()
+        if index and ret:
+            index.put_many([(p, t, v, uri) for (t, p, v), uri in ret.items()])
+
+        return ret
+
+
+
+Metrics.register('rel_cache', RelResolver.cache.stats)
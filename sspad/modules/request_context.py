@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+
+import cherrypy
+
+from cherrypy import _cprequest
+from cherrypy.lib import httputil
+
+
+@contextmanager
+def request_context(headers=None):
+    '''Bind a detached request to the current thread.
+
+    Connectors read credentials from the incoming request headers. Code
+    running outside of a HTTP request (background workers, command line
+    tools) uses this context manager to provide such headers, so that
+    models can be instantiated as they would be in a controller.
+
+    @param headers (dict, optional) Request headers, e.g. Authorization.
+
+    @return None
+    '''
+
+    req = _cprequest.Request(
+        httputil.Host('127.0.0.1', 80), httputil.Host('127.0.0.1', 1111)
+    )
+    req.headers = httputil.HeaderMap()
+    for k, v in (headers or {}).items():
+        if v is not None:
+            req.headers[k] = v
+
+    cherrypy.serving.load(req, _cprequest.Response())
+    try:
+        yield req
+    finally:
+        cherrypy.serving.clear()
+
+
+
+def current_headers(names=('Authorization',)):
+    '''Copy selected headers of the current request.
+
+    Used to carry credentials over to other threads.
+
+    @param names (tuple, optional) Header names to copy.
+
+    @return dict
+    '''
+
+    return {n : cherrypy.request.headers[n] for n in names \
+            if n in cherrypy.request.headers}
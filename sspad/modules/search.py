@@ -1,9 +1,20 @@
+import json
+
 from collections import OrderedDict
+from string import Template
 
 import cherrypy
 
+from rdflib import URIRef, Literal
+
+from sspad.config.local import facet_cache as facet_cache_conf
 from sspad.connectors.tstore_connector import TstoreConnector
-from sspad.resources.rdf_lexicon import ns_collection as nsc, ns_pfx_sparql
+from sspad.modules.cache import TtlCache
+from sspad.modules.conditional import ContentVersion
+from sspad.modules.metrics import Metrics
+from sspad.modules.rdf_writer import term_n3
+from sspad.modules.sparql_templates import Raw, register
+from sspad.resources.rdf_lexicon import ns_collection as nsc
 
 class Search():
     '''@package sspad.modules
@@ -60,42 +71,187 @@ class Search():
 
     @property
     def comp_expressions(self):
+        '''SPARQL fragments for each comparator.
+
+        Placeholders are $subj (the variable holding the property),
+        $prop (the property URI) and $value (the compared value), which
+        are bound by #query().
+
+        @return dict
+        '''
+
         return {
             'contains' :\
-		'{} <{}> ?p .\nFILTER(contains(?p, "{}"))',
+		'$subj $prop ?p .\nFILTER(contains(?p, $value))',
             'not_contains' :\
-		'{} <{}> ?p .\nFILTER NOT EXISTS{{FILTER(contains(?p, "{}"))}}',
+		'$subj $prop ?p .\nFILTER NOT EXISTS{FILTER(contains(?p, $value))}',
             'starts_with' :\
-		'{} <{}> ?p .\nFILTER(strStarts(?p, "{}"))',
+		'$subj $prop ?p .\nFILTER(strStarts(?p, $value))',
             'not_starts_with' :\
-		'{} <{}> ?p .\nFILTER NOT EXISTS{{FILTER(strStarts(?p, "{}"))}}',
+		'$subj $prop ?p .\nFILTER NOT EXISTS{FILTER(strStarts(?p, $value))}',
             'ends_with' :\
-		'{} <{}> ?p .\nFILTER(strEnds(?p, "{}"))',
+		'$subj $prop ?p .\nFILTER(strEnds(?p, $value))',
             'not_ends_with' :\
-		'{} <{}> ?p .\nFILTER NOT EXISTS{{FILTER(strEnds(?p, "{}"))}}',
+		'$subj $prop ?p .\nFILTER NOT EXISTS{FILTER(strEnds(?p, $value))}',
             'str_matches' :\
-		'{} <{}> ?p .\nFILTER(?p="{}")',
+		'$subj $prop ?p .\nFILTER(?p=$value)',
             'eq' :\
-		'{} <{}> ?p .\nFILTER(?p="{}")',
+		'$subj $prop ?p .\nFILTER(?p=$value)',
             'ne' :\
-		'{} <{}> ?p .\nFILTER NOT EXSITS{FILTER(?p="{}")}',
+		'$subj $prop ?p .\nFILTER NOT EXISTS{FILTER(?p=$value)}',
             'lt' :\
-		'{} <{}> ?p .\nFILTER(?p<"{}")',
+		'$subj $prop ?p .\nFILTER(?p<$value)',
             'lte' :\
-		'{} <{}> ?p .\nFILTER(?p<="{}")',
+		'$subj $prop ?p .\nFILTER(?p<=$value)',
             'gt' :\
-		'{} <{}> ?p .\nFILTER(?p>"{}")',
+		'$subj $prop ?p .\nFILTER(?p>$value)',
             'gte' :\
-		'{} <{}> ?p .\nFILTER(?p>="{}")',
+		'$subj $prop ?p .\nFILTER(?p>=$value)',
             'before' :\
-		'{} <{}> ?p .\nFILTER(?p<"{}"^^xsd:dateTime)',
+		'$subj $prop ?p .\nFILTER(?p<$value)',
             'after' :\
-		'{} <{}> ?p .\nFILTER(?p>"{}"^^xsd:dateTime)',
+		'$subj $prop ?p .\nFILTER(?p>$value)',
             'date_matches' :\
-		'{} <{}> ?p .\nFILTER(?p="{}"^^xsd:date)',
+		'$subj $prop ?p .\nFILTER(?p=$value)',
             'uri' :\
-		'{} <{}> <{}>',
+		'$subj $prop $value',
+        }
+
+
+
+    @property
+    def comp_datatypes(self):
+        '''Data types of compared values for comparators not using plain
+        literals.
+
+        @return dict
+        '''
+
+        return {
+            'before' : nsc['xsd'].dateTime,
+            'after' : nsc['xsd'].dateTime,
+            'date_matches' : nsc['xsd'].date,
+        }
+
+
+
+    ## Query templates.
+
+    _q_comparators = register('search.comparators', '''
+        SELECT DISTINCT ?dtype WHERE {
+            $prop rdfs:range ?dtype .
+        }
+        ''')
+
+    _q_properties = register('search.properties', '''
+        SELECT DISTINCT ?prop ?label WHERE {
+            $ent lakeschema:hasQuerySubject ?qs .
+            ?qs lakeschema:id $subj .
+            ?qs lakeschema:class/rdfs:subClassOf ?qsclass .
+            ?pcont lakeschema:hasVProperty ?vprop .
+            ?vprop lakeschema:subjClass ?qsclass .
+            {
+                ?vprop lakeschema:property ?prop .
+                ?prop skos:prefLabel ?label .
+            } UNION  {
+                ?vprop lakeschema:compoundProperty ?cprop .
+                ?cprop lakeschema:property ?prop .
+                ?cprop skos:prefLabel ?label .
+            }
+
+        }
+        ORDER BY ?label
+        ''')
+
+    _q_subjects = register('search.subjects', '''
+        SELECT DISTINCT ?id ?label WHERE {
+            $ent lakeschema:hasQuerySubject ?qp .
+            ?qp skos:prefLabel ?label .
+            ?qp lakeschema:id ?id .
+            ?qp lakeschema:order ?o
+        }
+        ORDER BY ?o
+        ''')
+
+    _q_entities = register('search.entities', '''
+        SELECT DISTINCT ?ent ?label WHERE {
+            ?ent lakeschema:hasQuerySubject ?qs .
+            ?ent skos:prefLabel ?label .
         }
+        ORDER BY ?label
+        ''')
+
+    _q_paths = register('search.paths', '''
+        SELECT DISTINCT ?sp ?sc ?pp WHERE {
+            $ent lakeschema:hasQuerySubject ?qs .
+            ?qs lakeschema:id $subj .
+            ?qs lakeschema:class ?sc .
+            OPTIONAL {
+              ?qs lakeschema:subjectPath ?sp .
+            } OPTIONAL {
+              ?vp lakeschema:property $prop ;
+                lakeschema:path ?pp .
+            } OPTIONAL {
+              ?vp lakeschema:compoundProperty/lakeschema:property $prop ;
+                lakeschema:path ?pp .
+            }
+        }
+        ''')
+
+    _q_items = register('search.items', '''
+        SELECT DISTINCT ?ent WHERE {
+            $where
+        }
+        ''')
+
+    _q_items_projected = register('search.items_projected', '''
+        SELECT ?ent $projection WHERE {
+            {
+                SELECT DISTINCT ?ent WHERE {
+                    $where
+                }
+            }
+            $optionals
+        } GROUP BY ?ent
+        ''')
+
+    _q_items_facets = register('search.items_facets', '''
+        SELECT * WHERE {
+            {
+                SELECT ?ent $projection WHERE {
+                    {
+                        SELECT DISTINCT ?ent WHERE {
+                            $where
+                        }
+                    }
+                    $optionals
+                } GROUP BY ?ent
+            } UNION {
+                SELECT ?facet ?fvalue (COUNT(DISTINCT ?ent) AS ?count) WHERE {
+                    $where
+                    VALUES ?facet { $facets }
+                    ?ent ?facet ?fvalue .
+                } GROUP BY ?facet ?fvalue
+            }
+        }
+        ''')
+
+    ## Fields which can be projected on search results.
+    #
+    #  Values are the property linking the entity to the field value and
+    #  whether the field is multi-valued.
+    projection_fields = OrderedDict((
+        ('label', ('skos:prefLabel', False)),
+        ('title', ('dc:title', False)),
+        ('uid', ('aic:uid', False)),
+        ('created', ('aic:created', False)),
+        ('type', ('rdf:type', True)),
+        ('tags', ('aic:hasTag', True)),
+        ('master', ('aic:hasMasterInstance', False)),
+    ))
+
+    ## Facet counts of recent queries.
+    facet_cache = TtlCache(facet_cache_conf['ttl'], facet_cache_conf['max_entries'])
 
 
 
@@ -104,10 +260,7 @@ class Search():
 
         if ent and subj and prop:
             # Get comparators
-            q = '''{}\nSELECT DISTINCT ?dtype WHERE {{
-            <{}> rdfs:range ?dtype .
-            }}
-            '''.format('\n'.join(ns_pfx_sparql.values()), prop)
+            q = self._q_comparators.render(prop=URIRef(prop))
             dtype = self.tsconn.query(q)[0]['dtype']
 
             #cherrypy.log('Data type comps: {}'.format(self.comp_list))
@@ -133,50 +286,21 @@ class Search():
 
         elif ent and subj:
             # Get property list
-            q = '''{}\nSELECT DISTINCT ?prop ?label WHERE {{
-                <{}> lakeschema:hasQuerySubject ?qs .
-                ?qs lakeschema:id "{}" .
-                ?qs lakeschema:class/rdfs:subClassOf ?qsclass .
-                ?pcont lakeschema:hasVProperty ?vprop .
-                ?vprop lakeschema:subjClass ?qsclass .
-                {{
-                    ?vprop lakeschema:property ?prop .
-                    ?prop skos:prefLabel ?label .
-                }} UNION  {{
-                    ?vprop lakeschema:compoundProperty ?cprop .
-                    ?cprop lakeschema:property ?prop .
-                    ?cprop skos:prefLabel ?label .
-                }}
-
-            }}
-            ORDER BY ?label
-            '''.format('\n'.join(ns_pfx_sparql.values()), ent, subj)
+            q = self._q_properties.render(ent=URIRef(ent), subj=subj)
             res = self.tsconn.query(q)
 
             return [{'label' : x['label'], 'id' : x['prop']}  for x in res]
 
         elif ent:
             # Get subject list
-            q = '''{}\n SELECT DISTINCT ?id ?label WHERE {{
-                <{}> lakeschema:hasQuerySubject ?qp .
-                ?qp skos:prefLabel ?label .
-                ?qp lakeschema:id ?id .
-                ?qp lakeschema:order ?o
-            }}
-            ORDER BY ?o
-            '''.format('\n'.join(ns_pfx_sparql.values()), ent)
+            q = self._q_subjects.render(ent=URIRef(ent))
             res = self.tsconn.query(q)
 
             return [{'label' : x['label'], 'id' : x['id']}  for x in res]
 
         else:
             # Get entity list
-            q = '''{}\n SELECT DISTINCT ?ent ?label WHERE {{
-                ?ent lakeschema:hasQuerySubject ?qs .
-                ?ent skos:prefLabel ?label .
-            }}
-            ORDER BY ?label
-            '''.format('\n'.join(ns_pfx_sparql.values()), ent)
+            q = self._q_entities.render()
             res = self.tsconn.query(q)
 
             return [{'label' : x['label'], 'id' : x['ent']}  for x in res]
@@ -184,28 +308,149 @@ class Search():
 
 
 
-    def query(self, ent, conditions):
+    def query(self, ent, conditions, facets=[], projection=[]):
+        '''Find entities matching a set of conditions.
+
+        If facets are requested, the number of matching entities for each
+        value of each facet property is computed in the same query as the
+        entities. Facet counts are cached for identical conditions until
+        the content changes or the cache entry expires; in that case only
+        the entities are queried.
+
+        If projection fields are requested, they are fetched in the same
+        query by optional joins, grouped by entity.
+
+        @param ent (string) Entity type URI.
+        @param conditions (list) Condition lines. @sa SearchCtrl::GET()
+        @param facets (list, optional) Facet property URIs or namespace
+            prefixed names, e.g. 'rdf:type' or 'aic:hasTag'.
+        @param projection (list, optional) Names of fields to return for
+            each entity, among #projection_fields.
+
+        @return (generator | dict) If no facets are requested, a generator
+            of dicts with entity URIs and projected fields. Otherwise, a
+            dict with the entity list under 'items' and counts keyed by
+            facet and value under 'facets'.
+        '''
+
+        where = self._items_where(ent, conditions)
+        proj_params = self._projection(projection)
+        if projection:
+            items_q = self._q_items_projected.render(where=where, **proj_params)
+        else:
+            items_q = self._q_items.render(where=where)
+
+        if not facets:
+            return self._hydrate(self.tsconn.query_iter(items_q), projection)
+
+        facet_uris = [self._facet_uri(f) for f in facets]
+        cache_key = (
+            ContentVersion.current()[0], ent,
+            json.dumps(conditions, sort_keys=True),
+            tuple(sorted(facet_uris)),
+        )
+        facet_counts = self.facet_cache.get(cache_key)
+        if facet_counts is not None:
+            return {
+                'items' : list(self._hydrate(
+                        self.tsconn.query_iter(items_q), projection)),
+                'facets' : facet_counts,
+            }
+
+        q = self._q_items_facets.render(
+            where = where,
+            facets = Raw(' '.join([term_n3(f) for f in facet_uris])),
+            **proj_params
+        )
+        rows = []
+        facet_counts = {str(f) : {} for f in facet_uris}
+        for row in self.tsconn.query_iter(q):
+            if 'ent' in row:
+                rows.append(row)
+            elif 'facet' in row:
+                facet_counts.setdefault(row['facet'], {})[row.get('fvalue')] = \
+                        int(row['count'])
+        self.facet_cache.set(cache_key, facet_counts)
+
+        return {
+            'items' : list(self._hydrate(rows, projection)),
+            'facets' : facet_counts,
+        }
+
+
+
+    def _projection(self, projection):
+        '''Build the SPARQL fragments fetching projected fields.
+
+        @param projection (list) Field names.
+
+        @return (dict) Projected variables and optional patterns as Raw
+            fragments, bound to $projection and $optionals.
+        '''
+
+        select = []
+        optionals = []
+        for name in projection:
+            if name not in self.projection_fields:
+                raise cherrypy.HTTPError(
+                    '400 Bad Request',
+                    'Field \'{}\' cannot be projected.'.format(name)
+                )
+            prop, multi = self.projection_fields[name]
+            if multi:
+                # URIs cannot contain spaces.
+                select.append('(GROUP_CONCAT(DISTINCT STR(?{0}_); separator=" ") AS ?{0})'\
+                        .format(name))
+            else:
+                select.append('(SAMPLE(?{0}_) AS ?{0})'.format(name))
+            optionals.append('OPTIONAL {{ ?ent {} ?{}_ . }}'.format(prop, name))
+
+        return {
+            'projection' : Raw(' '.join(select)),
+            'optionals' : Raw('\n'.join(optionals)),
+        }
+
+
+
+    def _hydrate(self, rows, projection):
+        '''Shape result rows according to the projection.
+
+        Multi-valued fields are split into lists, and the master instance
+        is replaced by the URL of its content.
+
+        @param rows (iterable) Result rows.
+        @param projection (list) Field names.
+
+        @return (generator) Result dicts.
+        '''
+
+        for row in rows:
+            ret = {'ent' : row['ent']}
+            for name in projection:
+                value = row.get(name)
+                if self.projection_fields[name][1]:
+                    value = value.split() if value else []
+                elif name == 'master' and value:
+                    value = value + '/aic:content'
+                ret[name] = value
+            yield ret
+
+
+
+    def _items_where(self, ent, conditions):
+        '''Build the graph pattern matching entities for a set of conditions.
+
+        @param ent (string) Entity type URI.
+        @param conditions (list) Condition lines. @sa SearchCtrl::GET()
+
+        @return (Raw) SPARQL graph pattern binding ?ent.
+        '''
+
         cherrypy.log('Query conditions: {}'.format(conditions))
-        pq = '''{}\nSELECT DISTINCT ?sp ?sc ?pp WHERE {{
-            <{}> lakeschema:hasQuerySubject ?qs .
-            ?qs lakeschema:id "{}" .
-            ?qs lakeschema:class ?sc .
-            OPTIONAL {{
-              ?qs lakeschema:subjectPath ?sp .
-            }} OPTIONAL {{
-              ?vp lakeschema:property <{}> ;
-                lakeschema:path ?pp .
-            }} OPTIONAL {{
-              ?vp lakeschema:compoundProperty/lakeschema:property <{}> ;
-                lakeschema:path ?pp .
-            }}
-        }}
-        '''.format(
-            '\n'.join(ns_pfx_sparql.values()),
-            ent,
-            conditions[0]['subj'],
-            conditions[0]['prop'],
-            conditions[0]['prop']
+        pq = self._q_paths.render(
+            ent=URIRef(ent),
+            subj=conditions[0]['subj'],
+            prop=URIRef(conditions[0]['prop'])
         )
         p_res = self.tsconn.query(pq)
 
@@ -215,25 +460,61 @@ class Search():
         subj_var = '?subj' if has_sp else '?ent'
         prop_cont_var = '?pCont' if has_pp else '?subj'
 
-        q = '''{}\nSELECT DISTINCT ?ent WHERE {{
-                ?ent a <{}> .
-                {}{}{} .{}
-            }}
-            '''.format(
-                '\n'.join(ns_pfx_sparql.values()),
-                ent if has_sp else p_res[0]['sc'],
-                (p_res[0]['sp'] + '\n') \
-                        if has_sp else '',
-                (p_res[0]['pp'] + '\n') \
-                        if has_pp else '',
-                self.comp_expressions[conditions[0]['comp']].format(
-                    prop_cont_var,
-                    conditions[0]['prop'],
-                    conditions[0]['value']
-                ),
-                '\nFILTER(?subj=?ent) .' if not has_sp else ''
+        # Property paths come from the schema and are trusted.
+        return Raw('?ent a {} .\n{}{}{} .{}'.format(
+            term_n3(URIRef(ent if has_sp else p_res[0]['sc'])),
+            (p_res[0]['sp'] + '\n') if has_sp else '',
+            (p_res[0]['pp'] + '\n') if has_pp else '',
+            self._condition(conditions[0], prop_cont_var),
+            '\nFILTER(?subj=?ent) .' if not has_sp else ''
+        ))
+
+
+
+    def _facet_uri(self, facet):
+        '''Expand a facet property name to a URI.
+
+        @param facet (string) Property URI or namespace prefixed name.
+
+        @return rdflib.URIRef
+        '''
+
+        pfx, _, name = facet.partition(':')
+        if pfx in nsc and not name.startswith('//'):
+            return URIRef(nsc[pfx][name])
+
+        return URIRef(facet)
+
+
+
+    def _condition(self, condition, subj_var):
+        '''Build the SPARQL fragment for a condition line.
+
+        @param condition (dict) Condition line. @sa SearchCtrl::GET()
+        @param subj_var (string) Variable holding the compared property.
+
+        @return string
+        '''
+
+        comp = condition['comp']
+        if comp not in self.comp_expressions:
+            raise cherrypy.HTTPError(
+                '400 Bad Request',
+                'Comparator \'{}\' is not supported.'.format(comp)
             )
-        cherrypy.log('Query string: {}'.format(q))
 
-        return self.tsconn.query(q)
+        if comp == 'uri':
+            value = URIRef(condition['value'])
+        else:
+            value = Literal(condition['value'],
+                    datatype=self.comp_datatypes.get(comp))
+
+        return Template(self.comp_expressions[comp]).substitute(
+            subj = subj_var,
+            prop = term_n3(URIRef(condition['prop'])),
+            value = term_n3(value)
+        )
+
+
 
+Metrics.register('facet_cache', Search.facet_cache.stats)
@@ -0,0 +1,114 @@
+import re
+
+from string import Template
+
+from rdflib import Literal, URIRef, Variable
+
+from sspad.modules.rdf_writer import term_n3
+from sspad.resources.rdf_lexicon import ns_pfx_sparql
+
+
+## Matches IRIs and string literals, which are skipped when looking for prefixes.
+_skip_re = re.compile(r'<[^<>\s]*>|"(?:[^"\\]|\\.)*"')
+
+## Matches prefixed names.
+_pfx_re = re.compile(r'(?<![\w\-.:?$])([A-Za-z][\w\-]*):')
+
+
+class Raw(str):
+    '''@package sspad.modules
+
+    Trusted SPARQL fragment.
+
+    Values wrapped in this class are bound into a template verbatim.
+    Use it only for fragments which do not come from user input.
+    '''
+
+    pass
+
+
+
+class QueryTemplate():
+    '''@package sspad.modules
+
+    Precompiled SPARQL query template.
+
+    The template body uses $name placeholders. At compile time, the
+    prefixes actually used in the body are determined so that only those
+    are declared in the rendered query. Bound values are serialized as
+    SPARQL terms with proper escaping.
+    '''
+
+    def __init__(self, body):
+        '''Compile a query template.
+
+        @param body (string) SPARQL query body without prefix declarations.
+
+        @return None
+        '''
+
+        self.prefixes = used_prefixes(body)
+        self.template = Template(body)
+        self.prologue = '\n'.join([ns_pfx_sparql[p] for p in self.prefixes])
+
+
+
+    def render(self, **params):
+        '''Bind parameters and return the query string.
+
+        @param **params Values to bind. rdflib terms are serialized in
+            SPARQL syntax; Raw values are inserted verbatim; any other value
+            is bound as a plain string literal.
+
+        @return string
+        '''
+
+        bound = {}
+        extra_pfx = set()
+        for k, v in params.items():
+            if isinstance(v, Raw):
+                bound[k] = v
+                extra_pfx.update(used_prefixes(v))
+            elif isinstance(v, (URIRef, Literal, Variable)):
+                bound[k] = term_n3(v)
+            else:
+                bound[k] = term_n3(Literal(str(v)))
+
+        prologue = self.prologue
+        extra_pfx = extra_pfx.difference(self.prefixes)
+        if extra_pfx:
+            prologue = '\n'.join([prologue] \
+                    + [ns_pfx_sparql[p] for p in sorted(extra_pfx)])
+
+        return '{}\n{}'.format(prologue, self.template.substitute(bound))
+
+
+
+def used_prefixes(text):
+    '''Find the known namespace prefixes used in a SPARQL fragment.
+
+    @param text (string) SPARQL fragment.
+
+    @return (list) Sorted prefix names.
+    '''
+
+    text = _skip_re.sub(' ', text)
+    return sorted({p for p in _pfx_re.findall(text) if p in ns_pfx_sparql})
+
+
+
+## Registry of compiled query templates.
+templates = {}
+
+def register(name, body):
+    '''Compile a query template and add it to the registry.
+
+    @param name (string) Template name, e.g. 'search.entities'.
+    @param body (string) SPARQL query body. @sa QueryTemplate
+
+    @return (QueryTemplate) The compiled template.
+    '''
+
+    templates[name] = QueryTemplate(body)
+
+    return templates[name]
@@ -0,0 +1,383 @@
+import collections
+import importlib
+import json
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import cherrypy
+
+from cherrypy.process import plugins
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+from sspad.modules.file_io import LocalFile
+from sspad.modules.metrics import Metrics
+from sspad.modules.request_context import request_context
+
+
+class WatchFolder(plugins.SimplePlugin):
+    '''@package sspad.modules
+
+    Watch-folder ingest.
+
+    Files dropped in the watched directories are ingested as the original
+    datastream of a new asset. Asset properties are read from an optional
+    sidecar JSON file with the same base name, e.g. 'img001.json' for
+    'img001.tif', in the same format as the 'props' parameter of AssetCtrl::POST().
+
+    A file is ingested once its size and modification time have not
+    changed for a settle time, so that files still being copied are left
+    alone. Ingested files and their sidecars are moved to a 'done'
+    subdirectory; files failing after all retries are moved to an 'error'
+    subdirectory along with a '.error' file holding the error message.
+
+    Directories are watched with inotify if pyinotify is installed, and
+    scanned periodically in any case.
+    '''
+
+    ## Suffixes of files which are never ingested.
+    skip_suffixes = ('.json', '.error', '.part', '.tmp')
+
+
+    def __init__(self, bus, conf):
+        '''Class constructor.
+
+        @param bus (cherrypy.process.wspbus.Bus) CherryPy engine.
+        @param conf (dict) Watch-folder configuration.
+            @sa sspad.config.local.watch_folder
+
+        @return None
+        '''
+
+        plugins.SimplePlugin.__init__(self, bus)
+        self.conf = conf
+        self.dirs = [d.strip() for d in conf['dirs'].split(',') if d.strip()]
+        module_name, cls_name = conf['model'].rsplit('.', 1)
+        self.model_cls = getattr(importlib.import_module(module_name), cls_name)
+
+        self._lock = threading.Lock()
+        # Files not yet settled, with their last observed size and mtime.
+        self._candidates = {}
+        # Files submitted to the worker pool.
+        self._inflight = set()
+        self._running = 0
+        self._done_times = collections.deque()
+        self.ingested, self.failed, self.retried = (0, 0, 0)
+        Metrics.register('watch_folder', self.stats)
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+
+
+
+    def start(self):
+        '''Start the watcher thread and the worker pool.'''
+
+        self.bus.log('Watching {} for ingest with {} workers.'.format(
+                ', '.join(self.dirs), self.conf['workers']))
+        for d in self.dirs:
+            for sub in (self.conf['done_dir'], self.conf['error_dir']):
+                os.makedirs(os.path.join(d, sub), exist_ok=True)
+
+        self._stop.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.conf['workers'])
+        self._thread = threading.Thread(target=self._watch, name='sspad-watch-folder')
+        self._thread.daemon = True
+        self._thread.start()
+    start.priority = 80
+
+
+
+    def stop(self):
+        '''Stop watching and wait for running ingests.'''
+
+        self.bus.log('Stopping watch-folder ingest.')
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self._pool:
+            self._pool.shutdown(wait=True)
+        self._thread, self._pool = (None, None)
+
+
+
+    def stats(self):
+        '''Watch-folder metrics.
+
+        @return dict
+        '''
+
+        with self._lock:
+            now = time.time()
+            while self._done_times and self._done_times[0] < now - 60:
+                self._done_times.popleft()
+            return {
+                'backlog' : len(self._candidates) + len(self._inflight),
+                'settling' : len(self._candidates),
+                'queued' : len(self._inflight) - self._running,
+                'running' : self._running,
+                'ingested' : self.ingested,
+                'failed' : self.failed,
+                'retried' : self.retried,
+                'per_minute' : len(self._done_times),
+            }
+
+
+
+    def _watch(self):
+        '''Watcher loop.
+
+        With inotify, files closed after writing or moved into the watched
+        directories are picked up as soon as they settle, and the
+        directories are rescanned every rescan_interval seconds to catch
+        lost events. Without inotify, they are rescanned every
+        poll_interval seconds.
+        '''
+
+        notifier = self._notifier()
+        last_scan = 0
+
+        while not self._stop.is_set():
+            interval = self.conf['rescan_interval'] if notifier \
+                    else self.conf['poll_interval']
+            if time.time() - last_scan >= interval:
+                self._scan()
+                last_scan = time.time()
+
+            if notifier:
+                if notifier.check_events(int(self.conf['poll_interval'] * 1000)):
+                    notifier.read_events()
+                    notifier.process_events()
+            else:
+                self._stop.wait(self.conf['poll_interval'])
+
+            self._submit_settled()
+
+        if notifier:
+            notifier.stop()
+
+
+
+    def _notifier(self):
+        '''Set up inotify watches on the watched directories.
+
+        @return (pyinotify.Notifier | None) Notifier, or None if inotify is
+            not available.
+        '''
+
+        if not pyinotify:
+            self.bus.log('pyinotify is not installed. Polling watched directories.')
+            return None
+
+        watcher = self
+
+        class Handler(pyinotify.ProcessEvent):
+            def process_default(self, event):
+                if not event.dir:
+                    watcher._add_candidate(event.pathname)
+
+        wm = pyinotify.WatchManager()
+        for d in self.dirs:
+            wm.add_watch(d, pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO)
+
+        return pyinotify.Notifier(wm, Handler())
+
+
+
+    def _scan(self):
+        '''Add all files in the watched directories to the candidates.'''
+
+        for d in self.dirs:
+            try:
+                with os.scandir(d) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            self._add_candidate(entry.path)
+            except OSError as e:
+                cherrypy.log.error('Cannot scan watched directory {}: {}'.format(d, e))
+
+
+
+    def _add_candidate(self, path):
+        '''Start tracking a file until it settles.'''
+
+        name = os.path.basename(path)
+        if name.startswith('.') or name.endswith(self.skip_suffixes):
+            return
+
+        with self._lock:
+            if path not in self._inflight and path not in self._candidates:
+                self._candidates[path] = None
+
+
+
+    def _submit_settled(self):
+        '''Submit files which have settled to the worker pool.'''
+
+        now = time.time()
+        with self._lock:
+            candidates = list(self._candidates.items())
+
+        for path, last in candidates:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                with self._lock:
+                    self._candidates.pop(path, None)
+                continue
+
+            sidecar = self._sidecar_path(path)
+            sidecar_mtime = os.stat(sidecar).st_mtime \
+                    if os.path.exists(sidecar) else 0
+            current = (st.st_size, st.st_mtime, sidecar_mtime)
+            settled = current == last and \
+                    now - max(st.st_mtime, sidecar_mtime) >= self.conf['settle_time']
+
+            with self._lock:
+                if settled:
+                    del self._candidates[path]
+                    self._inflight.add(path)
+                else:
+                    self._candidates[path] = current
+
+            if settled:
+                self._pool.submit(self._process, path)
+
+
+
+    def _process(self, path):
+        '''Ingest a file with retries and move it out of the watched directory.
+
+        Server errors and connection errors are retried with exponential
+        backoff; client errors, e.g. a legacy UID conflict, are not.
+
+        The UID is minted once, and all attempts create the asset with it,
+        so that an attempt which failed after the asset was created is not
+        ingested twice.
+        '''
+
+        with self._lock:
+            self._running += 1
+
+        error = None
+        uid = None
+        try:
+            for attempt in range(self.conf['retries'] + 1):
+                if attempt:
+                    with self._lock:
+                        self.retried += 1
+                    self._stop.wait(self.conf['retry_delay'] * 2 ** (attempt - 1))
+                try:
+                    if not uid:
+                        uid = self._mint_uid()
+                    uri = self._ingest(path, uid, check=attempt > 0)
+                    error = None
+                    break
+                except cherrypy.HTTPError as e:
+                    error = '{} {}'.format(e.code, e._message)
+                    if e.code < 500:
+                        break
+                except Exception as e:
+                    error = str(e)
+                cherrypy.log.error('Ingest of {} failed: {}'.format(path, error))
+
+            if error:
+                self._move(path, self.conf['error_dir'])
+                with open(os.path.join(os.path.dirname(path), self.conf['error_dir'],
+                        os.path.basename(path) + '.error'), 'w') as fh:
+                    fh.write(error + '\n')
+            else:
+                self._move(path, self.conf['done_dir'])
+                cherrypy.log('Ingested {} as {}.'.format(path, uri))
+        except Exception as e:
+            cherrypy.log.error('Cannot move {}: {}'.format(path, e))
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._inflight.discard(path)
+                if error:
+                    self.failed += 1
+                else:
+                    self.ingested += 1
+                    self._done_times.append(time.time())
+
+
+
+    def _mint_uid(self):
+        '''Mint a UID for a new asset.
+
+        @return (string) UID.
+        '''
+
+        with request_context({'Authorization' : self.conf['auth'] or None}):
+            return self.model_cls().mint_uid(self.conf['mid'])
+
+
+
+    def _ingest(self, path, uid, check=False):
+        '''Create an asset from a file and its sidecar properties.
+
+        @param path (string) File path.
+        @param uid (string) UID of the new asset.
+        @param check (boolean) Whether to check first if an asset with
+            @p uid exists, i.e. was created by a previous attempt.
+
+        @return (string) Asset URI.
+
+        @throw cherrypy.HTTPError 400 Bad Request if the sidecar file is not
+            valid JSON.
+        '''
+
+        sidecar = self._sidecar_path(path)
+        props = {}
+        if os.path.exists(sidecar):
+            with open(sidecar) as fh:
+                try:
+                    props = json.load(fh)
+                except ValueError as e:
+                    # Not worth retrying, like other client errors.
+                    raise cherrypy.HTTPError('400 Bad Request',
+                            'Invalid sidecar file {}: {}'.format(sidecar, e))
+
+        with request_context({'Authorization' : self.conf['auth'] or None}):
+            model = self.model_cls()
+            if check and model.set_uri(uid=uid):
+                return model.uri
+
+            original = LocalFile(path)
+            try:
+                model.create(
+                    self.conf['mid'],
+                    model.convert_req_propnames(props),
+                    uid = uid,
+                    original = original
+                )
+            finally:
+                original.file.close()
+
+        return model.uri
+
+
+
+    def _move(self, path, subdir):
+        '''Move a file and its sidecar to a subdirectory of its directory.'''
+
+        for p in (path, self._sidecar_path(path)):
+            if os.path.exists(p):
+                os.replace(p, os.path.join(
+                        os.path.dirname(p), subdir, os.path.basename(p)))
+
+
+
+    def _sidecar_path(self, path):
+        '''Path of the sidecar property file of a datastream file.'''
+
+        return os.path.splitext(path)[0] + '.json'
+
@@ -0,0 +1,192 @@
+import threading
+
+import cherrypy
+
+from sspad.config.local import write_batcher as batcher_conf
+from sspad.connectors.lake_connector import LakeConnector
+from sspad.modules.metrics import Metrics
+from sspad.modules.request_context import current_headers
+
+
+class WriteBatcher():
+    '''@package sspad.modules
+
+    Group commit of small LAKE writes.
+
+    Writes submitted by concurrent requests with the same credentials
+    within a short window are applied in one shared transaction, so that
+    the cost of opening and committing a transaction is paid once per
+    batch instead of once per write.
+
+    The first write of a batch waits for the window to elapse, or for the
+    batch to fill up, and then applies all writes of the batch in the
+    calling thread. Each caller gets the result or the exception of its
+    own write. If a write fails, the transaction is rolled back and the
+    other writes are applied again in a new one; if the commit fails, each
+    write is applied again in a transaction of its own.
+    '''
+
+    def __init__(self, window, max_batch):
+        '''Class constructor.
+
+        @param window (float) Seconds a batch waits for further writes.
+        @param max_batch (int) Maximum number of writes per transaction.
+
+        @return None
+        '''
+
+        self.window = window
+        self.max_batch = max_batch
+        self._groups = {}
+        self._cond = threading.Condition()
+        self.batches, self.writes, self.retries = (0, 0, 0)
+
+
+
+    def submit(self, op):
+        '''Apply a write in a shared transaction.
+
+        @param op (callable) Function performing the write. It is passed
+            the transaction URI and must only write to nodes within that
+            transaction. It may be called more than once.
+
+        @return The return value of @p op.
+
+        @throw The exception raised by @p op or by the transaction.
+        '''
+
+        headers = current_headers()
+        key = headers.get('Authorization')
+        item = {
+            'op' : op,
+            'result' : None,
+            'error' : None,
+            'done' : threading.Event(),
+        }
+
+        with self._cond:
+            batch = self._groups.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._groups[key] = []
+            batch.append(item)
+            if len(batch) >= self.max_batch:
+                self._cond.notify_all()
+
+        if leader:
+            with self._cond:
+                self._cond.wait_for(
+                        lambda: len(batch) >= self.max_batch, self.window)
+                del self._groups[key]
+            self._run(batch)
+        else:
+            item['done'].wait()
+
+        if item['error']:
+            raise item['error']
+
+        return item['result']
+
+
+
+    def stats(self):
+        '''Write batcher metrics.
+
+        @return dict
+        '''
+
+        with self._cond:
+            return {
+                'batches' : self.batches,
+                'writes' : self.writes,
+                'retries' : self.retries,
+                'avg_batch_size' : round(self.writes / self.batches, 2) \
+                        if self.batches else 0,
+                'pending' : sum(len(b) for b in self._groups.values()),
+            }
+
+
+
+    def _run(self, batch):
+        '''Apply a batch of writes and report their outcome to the callers.
+
+        @param batch (list) Pending write items.
+
+        @return None
+        '''
+
+        lconn = LakeConnector()
+        pending = list(batch)
+        try:
+            while pending:
+                with self._cond:
+                    self.batches += 1
+                    self.writes += len(pending)
+
+                try:
+                    tx_uri = lconn.open_transaction()
+                except Exception as e:
+                    for item in pending:
+                        item['error'] = e
+                    break
+
+                failed = None
+                for item in pending:
+                    try:
+                        item['result'] = item['op'](tx_uri)
+                    except Exception as e:
+                        item['error'] = failed = e
+                        break
+
+                if failed:
+                    cherrypy.log.error('Write failed in batch of {}: {}'.format(
+                            len(pending), failed))
+                    try:
+                        lconn.rollback_transaction(tx_uri)
+                    except Exception as e:
+                        cherrypy.log.error('Cannot roll back {}: {}'.format(tx_uri, e))
+                    pending = [i for i in pending if not i['error']]
+                    with self._cond:
+                        self.retries += len(pending)
+                    continue
+
+                try:
+                    lconn.commit_transaction(tx_uri)
+                except Exception as e:
+                    if len(pending) == 1:
+                        pending[0]['error'] = e
+                    else:
+                        cherrypy.log.error('Commit of batch of {} failed: {}. '
+                                'Retrying writes one by one.'.format(len(pending), e))
+                        with self._cond:
+                            self.retries += len(pending)
+                        for item in pending:
+                            self._run([item])
+                break
+        finally:
+            for item in batch:
+                item['done'].set()
+
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    '''Get the shared write batcher, creating it on first use.
+
+    @return (WriteBatcher | None) The write batcher, or None if group
+        commit is disabled.
+    '''
+
+    global _batcher
+
+    if not batcher_conf['enabled']:
+        return None
+
+    with _batcher_lock:
+        if not _batcher:
+            _batcher = WriteBatcher(batcher_conf['window'], batcher_conf['max_batch'])
+            Metrics.register('write_batcher', _batcher.stats)
+
+    return _batcher
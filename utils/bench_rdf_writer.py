@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+## Microbenchmark of LAKE request body serialization.
+#
+#  Compares the rdflib Graph + Turtle serializer path formerly used by
+#  LakeConnector::create_or_update_node with sspad.modules.rdf_writer, on
+#  nodes with a growing number of properties.
+#
+#  Usage: python3 utils/bench_rdf_writer.py [-n ITERATIONS]
+
+import argparse
+import os
+import sys
+import timeit
+
+from rdflib import Graph, Literal, Namespace, URIRef, XSD
+from rdflib.namespace import NamespaceManager
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from sspad.modules.rdf_writer import turtle_body
+
+aic = Namespace('http://definitions.artic.edu/ontology/1.0/')
+
+
+def build_tuples(n):
+    '''Build n property tuples mixing literals and URIs.'''
+
+    ret = []
+    for i in range(n):
+        if i % 2:
+            ret.append((aic['prop{}'.format(i % 20)],
+                    Literal('Value "{}"\nwith escapes'.format(i), datatype=XSD.string)))
+        else:
+            ret.append((aic.represents,
+                    URIRef('http://localhost:8180/fcrepo/rest/objects/{}'.format(i))))
+    return ret
+
+
+
+def rdflib_body(tuples, ns_mgr):
+    g = Graph(namespace_manager = ns_mgr)
+    for t in tuples:
+        g.add((URIRef(''), t[0], t[1]))
+    return g.serialize(format='turtle')
+
+
+
+def writer_body(tuples):
+    return turtle_body(tuples).encode('utf-8')
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='RDF body serialization benchmark.')
+    parser.add_argument('-n', '--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    ns_mgr = NamespaceManager(Graph())
+    ns_mgr.bind('aic', aic)
+
+    print('{:>8} {:>14} {:>14} {:>8}'.format('props', 'rdflib (ms)', 'writer (ms)', 'speedup'))
+    for n in (10, 100, 300, 1000):
+        tuples = build_tuples(n)
+        t_rdflib = timeit.timeit(lambda: rdflib_body(tuples, ns_mgr),
+                number=args.iterations) / args.iterations * 1000
+        t_writer = timeit.timeit(lambda: writer_body(tuples),
+                number=args.iterations) / args.iterations * 1000
+        print('{:>8} {:>14.3f} {:>14.3f} {:>7.1f}x'.format(
+            n, t_rdflib, t_writer, t_rdflib / t_writer))
+
+        # Both bodies must describe the same graph.
+        g1 = Graph().parse(data=rdflib_body(tuples, ns_mgr), format='turtle')
+        g2 = Graph().parse(data=writer_body(tuples), format='turtle')
+        assert set(g1) == set(g2), 'Serializations differ for {} props.'.format(n)